@@ -0,0 +1,128 @@
+"""
+ADK session service over a conversation's message log (services/conversation_service).
+
+Imports google.adk at module level, so it is only imported once an agent
+actually runs a conversation turn.
+"""
+import json
+import time
+from typing import Any, Optional
+
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService, Session as AdkSession
+from google.adk.sessions.base_session_service import GetSessionConfig, ListSessionsResponse
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from .. import models
+from ..services import conversation_service
+
+Message = models.ConversationMessage
+_TEXT_LIMIT = 2000
+
+
+def _clip(text: str, limit: int = _TEXT_LIMIT) -> str:
+    return text if len(text) <= limit else text[:limit] + "…"
+
+
+def _describe(event: Event) -> tuple[str, str]:
+    """(role, readable text) of an event, as listed by the API and fed to the summarizer."""
+    parts = (event.content.parts if event.content else None) or []
+    lines, tool = [], False
+    for part in parts:
+        if part.text:
+            lines.append(part.text)
+        elif part.function_call:
+            args = json.dumps(part.function_call.args or {}, default=str)
+            lines.append(f"{part.function_call.name}({_clip(args)})")
+        elif part.function_response:
+            tool = True
+            response = json.dumps(part.function_response.response, default=str)
+            lines.append(f"{part.function_response.name} -> {_clip(response)}")
+    role = "user" if event.author == "user" else "tool" if tool else "model"
+    return role, "\n".join(lines)
+
+
+class ConversationSessions(BaseSessionService):
+    """The session of one conversation: history comes from its log, new events are appended to it."""
+
+    def __init__(self, db: Session, conversation: models.Conversation):
+        self.db = db
+        self.conversation = conversation
+        # What get_session() sent to the model, for the turn's response
+        self.window = {"messages": 0, "tokens": 0, "summarized_through": conversation.summary_seq}
+        self.appended: list[models.ConversationMessage] = []
+
+    def _session(self, user_id: str, events: list) -> AdkSession:
+        return AdkSession(
+            id=str(self.conversation.id),
+            app_name=conversation_service.APP_NAME,
+            user_id=user_id,
+            state=dict(self.conversation.state or {}),
+            events=events,
+            last_update_time=time.time(),
+        )
+
+    async def create_session(
+        self, *, app_name: str, user_id: str, state: Optional[dict[str, Any]] = None, session_id: Optional[str] = None
+    ) -> AdkSession:
+        # Conversations are created by conversation_service.create(); this one already exists
+        return self._session(user_id, [])
+
+    async def get_session(
+        self, *, app_name: str, user_id: str, session_id: str, config: Optional[GetSessionConfig] = None
+    ) -> Optional[AdkSession]:
+        if session_id != str(self.conversation.id):
+            return None
+        start, tokens = conversation_service.window_start(self.db, self.conversation)
+        rows = (
+            self.db.query(Message.event)
+            .filter(Message.conversation_id == self.conversation.id, Message.seq >= start)
+            .order_by(Message.seq)
+            .all()
+        )
+        self.window = {"messages": len(rows), "tokens": tokens, "summarized_through": self.conversation.summary_seq}
+        return self._session(user_id, [Event.model_validate(row.event) for row in rows])
+
+    async def list_sessions(self, *, app_name: str, user_id: str) -> ListSessionsResponse:
+        return ListSessionsResponse(sessions=[self._session(user_id, [])])
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        conversation_service.delete_conversations(self.db, [self.conversation.id])
+        self.db.commit()
+
+    async def append_event(self, session: AdkSession, event: Event) -> Event:
+        if event.partial:
+            return event
+        event = await super().append_event(session, event)
+
+        conversation = self.conversation
+        data = event.model_dump(mode="json", exclude_none=True)
+        role, text = _describe(event)
+        # Allocated in the database: two turns of one conversation running at once
+        # each get their own seq instead of both writing message_count + 1
+        table = models.Conversation.__table__
+        seq = self.db.connection().execute(
+            update(table)
+            .where(table.c.id == conversation.id)
+            .values(message_count=table.c.message_count + 1)
+            .returning(table.c.message_count)
+        ).scalar_one()
+        set_committed_value(conversation, "message_count", seq)
+        message = Message(
+            conversation_id=conversation.id,
+            seq=seq,
+            role=role,
+            author=event.author,
+            content=text,
+            event=data,
+            tokens=conversation_service.estimate_tokens(json.dumps(data.get("content") or {})),
+        )
+        self.db.add(message)
+        if event.actions and event.actions.state_delta:
+            conversation.state = dict(session.state)
+        # One commit per event, so what was said survives a turn that fails halfway
+        self.db.commit()
+        self.appended.append(message)
+        return event
@@ -1,15 +1,22 @@
-from google.adk.agents import Agent
-from google.adk.models.lite_llm import LiteLlm
-from google.adk.runners import Runner, RunConfig, InMemorySessionService
+from functools import lru_cache
+
+# google.adk / LiteLlm take seconds to import, so nothing here is imported or
+# built until the first request that actually talks to the model.
+
+TOOL_RUNNER_MODEL = "gpt-4o-mini"
+
 
 def create_tool_runner_agent():
     """
     Creates an agent that simulates/explains tool behavior.
     Uses description instead of instructions (ADK requirement).
     """
+    from google.adk.agents import Agent
+    from google.adk.models.lite_llm import LiteLlm
+
     agent = Agent(
         name="tool_runner",
-        model=LiteLlm(model="gpt-4o-mini"),
+        model=LiteLlm(model=TOOL_RUNNER_MODEL),
         description=(
             "You are a helpful assistant that simulates and explains how tools work. "
             "When given code for a tool, you should:\n"
@@ -21,15 +28,25 @@ def create_tool_runner_agent():
         )
     )
     return agent
-tool_runner_agent = create_tool_runner_agent()
 
-session_service = InMemorySessionService()
 
-# Create the runner bound to this agent
-runner = Runner(
-    app_name="AgentHub",
-    agent=tool_runner_agent,
-    session_service=session_service
-)
+@lru_cache(maxsize=None)
+def get_runner():
+    """Return the shared (runner, session_service) pair, building it on first use."""
+    from google.adk.runners import Runner, InMemorySessionService
+
+    session_service = InMemorySessionService()
+
+    # Create the runner bound to this agent
+    runner = Runner(
+        app_name="AgentHub",
+        agent=create_tool_runner_agent(),
+        session_service=session_service
+    )
+    return runner, session_service
+
 
+def new_run_config():
+    from google.adk.runners import RunConfig
 
+    return RunConfig()
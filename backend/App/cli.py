@@ -0,0 +1,333 @@
+# Maintenance commands. Run from the backend directory:
+#   python -m App.cli <command> [options]
+import argparse
+import logging
+import sys
+
+from .database import SessionLocal, engine
+
+
+def reconcile_stats(args):
+    from .services import stats_service
+
+    db = SessionLocal()
+    try:
+        count = stats_service.reconcile_all(db, batch_size=args.batch_size)
+    finally:
+        db.close()
+    print(f"Reconciled stats for {count} users")
+
+
+def migrate(args):
+    from . import migrations
+
+    if args.action == "upgrade":
+        done = migrations.upgrade(engine, target=args.to)
+        print(f"Applied {len(done)} migration(s)" + (f": {', '.join(done)}" if done else ""))
+    elif args.action == "current":
+        print(migrations.current(engine) or "(none)")
+    elif args.action == "history":
+        applied = migrations.applied_revisions(engine)
+        for module in migrations.load_revisions():
+            when = applied.get(module.revision)
+            status = f"applied {when:%Y-%m-%d %H:%M}" if when else "pending"
+            print(f"{module.revision}  {status:<24}  {module.description}")
+
+
+def export(args):
+    from .services import export_service
+
+    entities = export_service.ENTITIES if args.entity == "all" else (args.entity,)
+    compress = args.gzip or args.output.endswith(".gz")
+    out = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+    written = 0
+    try:
+        for chunk in export_service.stream_ndjson(
+            entities, created_by=args.user_id, compress=compress, batch_size=args.batch_size
+        ):
+            out.write(chunk)
+            written += len(chunk)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+    if args.output != "-":
+        print(f"Wrote {written} bytes to {args.output}")
+
+
+def import_items(args):
+    from . import models
+    from .services import import_service
+
+    db = SessionLocal()
+    try:
+        user = db.get(models.User, args.user_id)
+        if user is None:
+            raise SystemExit(f"No user with id {args.user_id}")
+
+        gz = args.input.endswith(".gz")
+        decoder = import_service.ItemDecoder(gzip=gz)
+        importer = import_service.BulkImporter(
+            db, user, default_type=args.type, dedupe=not args.no_dedupe, chunk_size=args.chunk_size
+        )
+        src = sys.stdin.buffer if args.input == "-" else open(args.input, "rb")
+        try:
+            while chunk := src.read(1 << 16):
+                importer.add_many(decoder.feed(chunk))
+        finally:
+            if src is not sys.stdin.buffer:
+                src.close()
+        importer.add_many(decoder.feed(b"", final=True))
+        report = importer.finish()
+    finally:
+        db.close()
+
+    created = ", ".join(f"{n} {entity}" for entity, n in report["created"].items())
+    print(f"Processed {report['processed']} items: created {created}; "
+          f"skipped {report['skipped']} duplicates; {report['failed']} failed")
+    for error in report["errors"]:
+        print(f"  item {error['index']}: {error['error']}")
+
+
+def similarity(args):
+    from .services import similarity_service
+
+    entities = list(similarity_service.FIELDS) if args.entity == "all" else [args.entity]
+    db = SessionLocal()
+    try:
+        for entity in entities:
+            if args.action == "rebuild":
+                count = similarity_service.rebuild(db, entity, batch_size=args.batch_size)
+            else:
+                count = similarity_service.catch_up(db, entity, batch_size=args.batch_size)
+            print(f"Embedded {count} {entity}")
+    finally:
+        db.close()
+
+
+def duplicates(args):
+    from .services import duplicate_service
+
+    entities = list(duplicate_service.MODELS) if args.entity == "all" else [args.entity]
+    db = SessionLocal()
+    try:
+        for entity in entities:
+            if args.action == "cluster":
+                clusters, flagged = duplicate_service.cluster(db, entity, batch_size=args.batch_size)
+                print(f"{entity}: {flagged} near-duplicates in {clusters} clusters")
+            else:
+                count = duplicate_service.index_missing(db, entity, batch_size=args.batch_size)
+                print(f"Indexed {count} {entity}")
+    finally:
+        db.close()
+
+
+def fuzzy(args):
+    from .services import fuzzy_service
+
+    entities = list(fuzzy_service.FIELDS) if args.entity == "all" else [args.entity]
+    db = SessionLocal()
+    try:
+        for entity in entities:
+            count = fuzzy_service.rebuild(db, entity, batch_size=args.batch_size)
+            print(f"Indexed trigrams of {count} {entity}")
+    finally:
+        db.close()
+
+
+def trending(args):
+    import time
+    from .services import trending_service
+
+    entities = list(trending_service.SOURCES) if args.entity == "all" else [args.entity]
+    while True:
+        db = SessionLocal()
+        try:
+            for entity in entities:
+                count = trending_service.refresh(db, entity)
+                print(f"Ranked {count} trending {entity}")
+        finally:
+            db.close()
+        if not args.every:
+            return
+        time.sleep(args.every)
+
+
+def recommendations(args):
+    from .services import recommendation_service
+
+    entities = list(recommendation_service.ENTITIES) if args.entity == "all" else [args.entity]
+    db = SessionLocal()
+    try:
+        for entity in entities:
+            if args.action == "rebuild":
+                count = recommendation_service.rebuild(db, entity, batch_size=args.batch_size)
+            else:
+                count = recommendation_service.refresh(db, entity, batch_size=args.batch_size)
+            print(f"Recomputed neighbors of {count} {entity}")
+    finally:
+        db.close()
+
+
+def suggest(args):
+    from .services import suggest_service
+
+    db = SessionLocal()
+    try:
+        index = suggest_service.SuggestIndex()
+        suggest_service.sync(db, index, force=True)
+    finally:
+        db.close()
+    path = suggest_service.write_snapshot(index, args.output)
+    print(f"Wrote suggestion snapshot to {path}")
+
+
+def evaluate(args):
+    import asyncio
+    import json
+    from . import models, schemas
+    from .core.responses import dumps
+    from .services import agent_service, eval_service, import_service
+
+    decoder = import_service.ItemDecoder(gzip=args.dataset.endswith(".gz"))
+    src = sys.stdin.buffer if args.dataset == "-" else open(args.dataset, "rb")
+    items = []
+    try:
+        while chunk := src.read(1 << 16):
+            items += decoder.feed(chunk)
+    finally:
+        if src is not sys.stdin.buffer:
+            src.close()
+    items += decoder.feed(b"", final=True)
+    try:
+        config, cases = eval_service.parse_dataset(items, default_match=args.match)
+    except eval_service.DatasetError as exc:
+        for error in exc.errors:
+            print(f"  record {error['index']}: {error['error']}", file=sys.stderr)
+        raise SystemExit("Invalid dataset")
+
+    db = SessionLocal()
+    try:
+        if args.config:
+            with open(args.config) as f:
+                config = schemas.AgentCreate.model_validate(json.load(f))
+        if args.agent_id is not None:
+            agent = db.get(models.Agent, args.agent_id)
+            if agent is None:
+                raise SystemExit(f"No agent with id {args.agent_id}")
+            resolved = agent_service.resolve_agent(agent)
+        elif config is not None:
+            resolved = agent_service.resolve_config(db, config)
+        else:
+            raise SystemExit("Pass --agent-id, --config or a config record in the dataset")
+    finally:
+        db.close()
+
+    async def run():
+        out = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+        try:
+            async for record in eval_service.run(
+                resolved, cases, concurrency=args.concurrency, rate=args.rate, user_id=args.user_id,
+                timeout=args.timeout or eval_service.CASE_TIMEOUT_SECONDS,
+            ):
+                out.write(dumps(record) + b"\n")
+                out.flush()
+        finally:
+            if out is not sys.stdout.buffer:
+                out.close()
+        return record
+
+    summary = asyncio.run(run())
+    pass_rate = f"{summary['pass_rate']:.1%}" if summary["pass_rate"] is not None else "n/a"
+    print(f"{summary['cases']} cases: {summary['errors']} errors, passed {summary['passed']}/{summary['scored']} "
+          f"({pass_rate}); p50 {summary['latency_ms']['p50']}ms, p95 {summary['latency_ms']['p95']}ms; "
+          f"{summary['usage']['total_tokens']} tokens, ${summary['usage']['cost_usd']:.4f}", file=sys.stderr)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m App.cli")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("reconcile-stats", help="Rebuild user_stats from the content tables")
+    p.add_argument("--batch-size", type=int, default=500)
+    p.set_defaults(func=reconcile_stats)
+
+    p = sub.add_parser("export", help="Stream a library to NDJSON (gzip with --gzip or a .gz name)")
+    p.add_argument("entity", choices=["prompts", "tools", "agents", "all"])
+    p.add_argument("-o", "--output", default="-", help="File to write, - for stdout")
+    p.add_argument("--gzip", action="store_true")
+    p.add_argument("--user-id", type=int, help="Only content created by this user")
+    p.add_argument("--batch-size", type=int, default=500)
+    p.set_defaults(func=export)
+
+    p = sub.add_parser("import", help="Bulk import NDJSON or a JSON array (.gz ok) as a user")
+    p.add_argument("input", help="File to read, - for stdin")
+    p.add_argument("--user-id", type=int, required=True, help="Owner of the imported content")
+    p.add_argument("--type", choices=["prompt", "tool", "agent"], help="For items without a type field")
+    p.add_argument("--no-dedupe", action="store_true")
+    p.add_argument("--chunk-size", type=int, default=500)
+    p.set_defaults(func=import_items)
+
+    p = sub.add_parser("similarity", help="Build the similar-items vector index")
+    p.add_argument("action", choices=["rebuild", "catch-up"])
+    p.add_argument("entity", nargs="?", default="all", choices=["prompts", "tools", "agents", "all"])
+    p.add_argument("--batch-size", type=int, default=500)
+    p.set_defaults(func=similarity)
+
+    p = sub.add_parser("duplicates", help="Index bodies for near-duplicate detection, or cluster the library")
+    p.add_argument("action", choices=["cluster", "index"])
+    p.add_argument("entity", nargs="?", default="all", choices=["prompts", "tools", "all"])
+    p.add_argument("--batch-size", type=int, default=500)
+    p.set_defaults(func=duplicates)
+
+    p = sub.add_parser("fuzzy", help="Rebuild the trigram postings for fuzzy search (no-op on Postgres)")
+    p.add_argument("action", choices=["rebuild"])
+    p.add_argument("entity", nargs="?", default="all", choices=["prompts", "tools", "agents", "all"])
+    p.add_argument("--batch-size", type=int, default=500)
+    p.set_defaults(func=fuzzy)
+
+    p = sub.add_parser("trending", help="Roll up likes/views and recompute the trending rankings")
+    p.add_argument("action", choices=["refresh"])
+    p.add_argument("entity", nargs="?", default="all", choices=["prompts", "tools", "agents", "all"])
+    p.add_argument("--every", type=int, metavar="SECONDS", help="Keep running, refreshing at this interval")
+    p.set_defaults(func=trending)
+
+    p = sub.add_parser("recommendations", help="Recompute item neighbors for /users/me/recommendations")
+    p.add_argument("action", choices=["refresh", "rebuild"])
+    p.add_argument("entity", nargs="?", default="all", choices=["prompts", "tools", "agents", "all"])
+    p.add_argument("--batch-size", type=int, default=500)
+    p.set_defaults(func=recommendations)
+
+    p = sub.add_parser("suggest", help="Write the /search/suggest startup snapshot from the database")
+    p.add_argument("action", choices=["snapshot"])
+    p.add_argument("-o", "--output", help="Defaults to SUGGEST_SNAPSHOT or suggest_snapshot.json.gz")
+    p.set_defaults(func=suggest)
+
+    p = sub.add_parser("eval", help="Run an agent over an NDJSON dataset; results as NDJSON, summary last")
+    p.add_argument("dataset", help="NDJSON or JSON array (.gz ok), - for stdin")
+    p.add_argument("--agent-id", type=int)
+    p.add_argument("--config", help="AgentCreate JSON file to evaluate instead of a saved agent")
+    p.add_argument("-o", "--output", default="-", help="File to write, - for stdout")
+    p.add_argument("--concurrency", type=int, default=4, help="Cases in flight at once (at most 16)")
+    p.add_argument("--rate", type=float, metavar="PER_MINUTE", help="Most cases started per minute")
+    p.add_argument("--match", choices=["contains", "exact", "regex"], default="contains",
+                   help="Scoring for cases with an expected output and no match of their own")
+    p.add_argument("--timeout", type=float, help="Seconds per case (default EVAL_CASE_TIMEOUT_SECONDS or 120)")
+    p.add_argument("--user-id", type=int, help="Attribute the model calls to this user")
+    p.set_defaults(func=evaluate)
+
+    p = sub.add_parser("migrate", help="Apply or inspect schema migrations")
+    p.add_argument("action", choices=["upgrade", "current", "history"])
+    p.add_argument("--to", help="Stop after this revision (upgrade only)")
+    p.set_defaults(func=migrate)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,5 @@
+import os
+from typing import Optional
 from jose import jwt, JWTError
 from datetime import datetime,timedelta
 from fastapi.security import OAuth2PasswordBearer
@@ -12,6 +14,7 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 50
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login", auto_error=False)
 
 def generate_token(data:dict):
     to_encode = data.copy()
@@ -39,4 +42,33 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     if user is None:
         raise credentials_exception
 
-    return user
\ No newline at end of file
+    return user
+
+
+def admin_user_ids() -> set[int]:
+    # Read on each call so it follows the environment loaded by load_dotenv()
+    raw = os.getenv("ADMIN_USER_IDS", "")
+    return {int(part) for part in raw.split(",") if part.strip().isdigit()}
+
+
+def user_id_from_token(token: str) -> Optional[int]:
+    """Subject of a valid access token, without touching the database."""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        return int(payload["sub"])
+    except (JWTError, KeyError, TypeError, ValueError):
+        return None
+
+
+def get_optional_user(token: Optional[str] = Depends(optional_oauth2_scheme), db: Session = Depends(get_db)):
+    """The caller if a valid token was sent, else None (for endpoints open to everyone)."""
+    user_id = user_id_from_token(token) if token else None
+    if user_id is None:
+        return None
+    return db.query(models.User).filter(models.User.id == user_id).first()
+
+
+def get_admin_user(current_user: models.User = Depends(get_current_user)):
+    if current_user.id not in admin_user_ids():
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin permission required")
+    return current_user
@@ -0,0 +1,102 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import Request, Response
+
+# Detail pages revalidate on every load (cheap 304s); lists and filters may be
+# served from browser / proxy caches for a short while.
+DETAIL_CACHE_CONTROL = "public, no-cache"
+PRIVATE_DETAIL_CACHE_CONTROL = "private, no-cache"
+LIST_CACHE_CONTROL = "public, max-age=30"
+FILTERS_CACHE_CONTROL = "public, max-age=300"
+
+
+def make_etag(*parts) -> str:
+    digest = hashlib.sha1("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+    # Weak: the same representation may be re-encoded byte-differently
+    return f'W/"{digest[:32]}"'
+
+
+def row_etag(row, *extra) -> str:
+    """ETag for a catalog row from its id, row version and live counters."""
+    version = getattr(row, "updated_at", None) or getattr(row, "created_at", None)
+    return make_etag(type(row).__name__, row.id, version, row.likes, row.views, *extra)
+
+
+def list_etag(request: Request, entity: str, version: int) -> str:
+    """ETag for a list / filter response from the table version and the query string."""
+    return make_etag(entity, version, request.url.path, str(request.query_params))
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(
+        candidate.strip().removeprefix("W/") == opaque
+        for candidate in if_none_match.split(",")
+    )
+
+
+def _as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _http_date(value: datetime) -> str:
+    return format_datetime(_as_utc(value), usegmt=True)
+
+
+def _unmodified_since(header: str, last_modified: datetime) -> bool:
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    # HTTP dates have whole-second resolution
+    return _as_utc(last_modified).replace(microsecond=0) <= _as_utc(since)
+
+
+def validators(etag: str, cache_control: str, last_modified: Optional[datetime] = None) -> dict:
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if last_modified is not None:
+        headers["Last-Modified"] = _http_date(last_modified)
+    return headers
+
+
+def not_modified(
+    request: Request,
+    etag: str,
+    cache_control: str,
+    last_modified: Optional[datetime] = None,
+) -> Optional[Response]:
+    """
+    Return a 304 response if the client's If-None-Match already matches, else None.
+
+    If-Modified-Since is only consulted when the request carries no
+    If-None-Match, as RFC 9110 requires.
+    """
+    headers = validators(etag, cache_control, last_modified)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if _etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+        return None
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None and _unmodified_since(if_modified_since, last_modified):
+        return Response(status_code=304, headers=headers)
+
+    return None
+
+
+def set_validators(
+    response: Response,
+    etag: str,
+    cache_control: str,
+    last_modified: Optional[datetime] = None,
+) -> None:
+    response.headers.update(validators(etag, cache_control, last_modified))
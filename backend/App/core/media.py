@@ -0,0 +1,241 @@
+"""
+Content-addressed media storage (profile images).
+
+Uploads are keyed by the SHA-256 of their bytes, so the same image uploaded
+twice is stored once and a key never changes content: /media/{key} is served
+with an immutable, year-long Cache-Control. Thumbnails are written next to
+the original at upload time when Pillow is installed; without it the
+original is served in their place.
+
+Rows keep a short reference ("media:<key>") instead of the image; url_for()
+turns it into the public URL. Anything else (an external URL, "") is passed
+through untouched.
+
+Files live under MEDIA_ROOT on local disk. The store only needs put / exists
+/ path, so an object-store backed one can replace LocalMediaStore.
+"""
+import base64
+import binascii
+import hashlib
+import io
+import os
+import re
+import tempfile
+from functools import lru_cache
+from typing import Optional
+
+MEDIA_PREFIX = "media:"
+MEDIA_URL_PREFIX = "/media/"
+MAX_IMAGE_BYTES = 5 * 1024 * 1024
+# Checked against the header before decoding: a few MB of PNG can inflate
+# to gigabytes of pixels
+MAX_IMAGE_PIXELS = 4096 * 4096
+# users.profile_image is a String(256): references and external URLs must fit
+MAX_REF_LENGTH = 256
+THUMBNAIL_SIZES = (64, 256)
+MEDIA_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+CONTENT_TYPES = {"png": "image/png", "jpg": "image/jpeg", "gif": "image/gif", "webp": "image/webp"}
+# Pillow format names; GIF thumbnails are written as PNG (first frame only)
+_PIL_FORMATS = {"png": "PNG", "jpg": "JPEG", "webp": "WEBP"}
+
+_KEY_RE = re.compile(r"^(?P<hash>[0-9a-f]{64})(?:-(?P<size>\d+))?\.(?P<ext>png|jpg|gif|webp)$")
+_DATA_URL_RE = re.compile(r"^data:image/[\w.+-]+;base64,", re.IGNORECASE)
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+class ImageTooLarge(InvalidImage):
+    pass
+
+
+class LocalMediaStore:
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, key: str) -> str:
+        # Two-character fan-out keeps directories small
+        return os.path.join(self.root, key[:2], key)
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.path(key))
+
+    def put(self, key: str, data: bytes) -> None:
+        target = self.path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # Write then rename, so a reader never sees half a file
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(target), prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, target)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+
+@lru_cache(maxsize=1)
+def get_store() -> LocalMediaStore:
+    return LocalMediaStore(os.getenv("MEDIA_ROOT", "media"))
+
+
+def sniff(data: bytes) -> Optional[str]:
+    """File extension from the magic bytes; the client's Content-Type isn't trusted."""
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if data.startswith(b"\xff\xd8\xff"):
+        return "jpg"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def thumbnail_key(key: str, size: int) -> str:
+    match = _KEY_RE.match(key)
+    ext = match["ext"] if match["ext"] in _PIL_FORMATS else "png"
+    return f"{match['hash']}-{size}.{ext}"
+
+
+@lru_cache(maxsize=1)
+def _pillow():
+    # Optional, and imported on first upload rather than at startup
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:  # no thumbnails, originals are served instead
+        return None
+    return Image, ImageOps
+
+
+def _render_thumbnail(data: bytes, size: int, ext: str) -> bytes:
+    Image, ImageOps = _pillow()
+    with Image.open(io.BytesIO(data)) as img:
+        img = ImageOps.exif_transpose(img)
+        if ext == "jpg" and img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        img.thumbnail((size, size))
+        out = io.BytesIO()
+        img.save(out, format=_PIL_FORMATS[ext])
+        return out.getvalue()
+
+
+def _write_thumbnails(store: LocalMediaStore, key: str, data: bytes) -> None:
+    pillow = _pillow()
+    if pillow is None:
+        return
+    Image, _ = pillow
+    # Pillow's errors for truncated, malformed or oversized files
+    decode_errors = (OSError, SyntaxError, ValueError, Image.DecompressionBombError)
+    try:
+        # open() only parses the header; pixels are decoded on first use
+        with Image.open(io.BytesIO(data)) as img:
+            width, height = img.size
+    except decode_errors as exc:
+        raise InvalidImage("Image could not be decoded") from exc
+    if width * height > MAX_IMAGE_PIXELS:
+        raise ImageTooLarge(f"Images are limited to {MAX_IMAGE_PIXELS:,} pixels")
+
+    for size in THUMBNAIL_SIZES:
+        thumb = thumbnail_key(key, size)
+        if store.exists(thumb):
+            continue
+        try:
+            store.put(thumb, _render_thumbnail(data, size, thumb.rsplit(".", 1)[1]))
+        except decode_errors as exc:
+            raise InvalidImage("Image could not be decoded") from exc
+
+
+def save_image(data: bytes) -> str:
+    """Store an uploaded image (and its thumbnails); returns the reference for the row."""
+    if len(data) > MAX_IMAGE_BYTES:
+        raise ImageTooLarge(f"Images are limited to {MAX_IMAGE_BYTES // (1024 * 1024)} MB")
+    ext = sniff(data)
+    if ext is None:
+        raise InvalidImage("Only PNG, JPEG, GIF and WebP images are supported")
+
+    key = f"{hashlib.sha256(data).hexdigest()}.{ext}"
+    store = get_store()
+    # Thumbnails first: a file that doesn't decode is rejected before it's kept
+    _write_thumbnails(store, key, data)
+    if not store.exists(key):
+        store.put(key, data)
+    return MEDIA_PREFIX + key
+
+
+def is_data_url(value: Optional[str]) -> bool:
+    return bool(value) and _DATA_URL_RE.match(value) is not None
+
+
+def save_data_url(value: str) -> str:
+    try:
+        data = base64.b64decode(value.split(",", 1)[1], validate=True)
+    except (binascii.Error, ValueError) as exc:
+        raise InvalidImage("Malformed image data URL") from exc
+    return save_image(data)
+
+
+def to_ref(value: Optional[str]) -> Optional[str]:
+    """
+    What to store for a client-supplied image value: data URLs are saved to
+    the store, our own /media/ URLs (sent back from a profile form) become
+    references again, external http(s) URLs are kept and "" clears the image.
+    Anything else raises InvalidImage.
+    """
+    if not value:
+        return value
+    if is_data_url(value):
+        return save_data_url(value)
+    if MEDIA_URL_PREFIX in value:
+        key = value.rsplit(MEDIA_URL_PREFIX, 1)[1]
+        match = _KEY_RE.match(key)
+        if match and match["size"] is None:
+            return MEDIA_PREFIX + key
+    if value.startswith(("http://", "https://")):
+        if len(value) > MAX_REF_LENGTH:
+            raise InvalidImage(f"Image URLs are limited to {MAX_REF_LENGTH} characters")
+        return value
+    raise InvalidImage("A profile image must be an image upload or an http(s) URL")
+
+
+def url_for(ref: Optional[str], size: Optional[int] = None) -> Optional[str]:
+    if not ref or not ref.startswith(MEDIA_PREFIX):
+        return ref
+    key = ref[len(MEDIA_PREFIX):]
+    return MEDIA_URL_PREFIX + (thumbnail_key(key, size) if size else key)
+
+
+def resolve(key: str) -> Optional[str]:
+    """
+    Key of the file to serve for a /media/ request, or None if unknown.
+    Missing thumbnails (uploaded while Pillow wasn't installed) are rendered
+    on first request when possible, otherwise the original is served.
+    """
+    match = _KEY_RE.match(key)
+    if match is None:
+        return None
+    store = get_store()
+    if store.exists(key):
+        return key
+    if match["size"] is None:
+        return None
+
+    original = next(
+        (f"{match['hash']}.{ext}" for ext in CONTENT_TYPES if store.exists(f"{match['hash']}.{ext}")),
+        None,
+    )
+    if original is None or int(match["size"]) not in THUMBNAIL_SIZES:
+        return original
+    try:
+        with open(store.path(original), "rb") as f:
+            _write_thumbnails(store, original, f.read())
+    except InvalidImage:
+        return original
+    return key if store.exists(key) else original
+
+
+def content_type(key: str) -> str:
+    return CONTENT_TYPES[key.rsplit(".", 1)[1]]
@@ -0,0 +1,253 @@
+"""
+Per-request performance counters, exposed in Prometheus text format at /metrics.
+
+MetricsMiddleware opens a RequestStats for every HTTP request. SQLAlchemy
+engine/session hooks and llm_timer() add to it from wherever the request's
+work runs (sync handlers run in the threadpool, which copies the context), and
+the totals are folded into per-route histograms and counters when the response
+is done. Metrics are per process: with several workers, scrape each of them.
+
+Set SERVER_TIMING=1 to also return a Server-Timing header, which browsers
+show in the network panel, e.g.
+    Server-Timing: app;dur=41.2, db;dur=30.7;desc="12 queries, 480 rows", llm;dur=0.0
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from starlette.datastructures import MutableHeaders
+
+# Seconds; wide enough for LLM-backed handlers
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...]):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: tuple, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...], buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # labels -> [per-bucket counts, sum, count]
+        self._values: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple, value: float) -> None:
+        with self._lock:
+            item = self._values.get(labels)
+            if item is None:
+                item = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    item[0][i] += 1
+                    break
+            item[1] += value
+            item[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labelnames + ("le",)
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets, counts):
+                    cumulative += n
+                    lines.append(f"{self.name}_bucket{_labels(names, labels + (f'{bound:g}',))} {cumulative}")
+                lines.append(f"{self.name}_bucket{_labels(names, labels + ('+Inf',))} {count}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total:g}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+def _labels(names: tuple[str, ...], values: tuple) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+ROUTE_LABELS = ("method", "route")
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Wall time per request", ROUTE_LABELS + ("status",)
+)
+DB_SECONDS = Histogram("http_request_db_seconds", "Time spent in SQL per request", ROUTE_LABELS)
+LLM_SECONDS = Histogram("http_request_llm_seconds", "Time spent waiting on the model per request", ROUTE_LABELS)
+DB_STATEMENTS = Counter("http_db_statements_total", "SQL statements executed", ROUTE_LABELS)
+DB_ROWS = Counter("http_db_rows_total", "Rows fetched by ORM queries", ROUTE_LABELS)
+RESPONSE_BYTES = Counter("http_response_bytes_total", "Response body bytes sent", ROUTE_LABELS)
+LLM_CALL_SECONDS = Histogram("llm_call_duration_seconds", "Duration of one model run", ("source",))
+
+# Filled by services/llm_telemetry; per agent / user breakdowns live in the
+# llm_calls table instead, those labels would be unbounded here
+LLM_CALLS = Counter("llm_calls_total", "Model runs", ("model", "source", "status"))
+LLM_TOKENS = Counter("llm_tokens_total", "Tokens used", ("model", "kind"))
+LLM_COST = Counter("llm_cost_usd_total", "Estimated spend in USD", ("model",))
+LLM_TTFT_SECONDS = Histogram("llm_time_to_first_token_seconds", "Time to the first model output", ("model",))
+
+# Filled by core/sandbox
+TOOL_CALLS = Counter("tool_calls_total", "Tool code runs in the sandbox", ("status",))
+TOOL_CALL_SECONDS = Histogram("tool_call_duration_seconds", "Wall time of one sandboxed tool run", ())
+
+REGISTRY = (
+    REQUEST_SECONDS, DB_SECONDS, LLM_SECONDS, DB_STATEMENTS, DB_ROWS, RESPONSE_BYTES, LLM_CALL_SECONDS,
+    LLM_CALLS, LLM_TOKENS, LLM_COST, LLM_TTFT_SECONDS, TOOL_CALLS, TOOL_CALL_SECONDS,
+)
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+@dataclass
+class RequestStats:
+    db_time: float = 0.0
+    statements: int = 0
+    rows: int = 0
+    llm_time: float = 0.0
+    bytes_out: int = 0
+
+    def server_timing(self, wall: float) -> str:
+        return (
+            f"app;dur={wall * 1000:.1f}, "
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.statements} queries, {self.rows} rows", '
+            f"llm;dur={self.llm_time * 1000:.1f}"
+        )
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current() -> Optional[RequestStats]:
+    return _current.get()
+
+
+# ---- SQLAlchemy hooks: no-ops outside a request ----
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    starts = conn.info.get("metrics_query_start")
+    if stats is None or not starts:
+        return
+    stats.db_time += time.perf_counter() - starts.pop()
+    stats.statements += 1
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _count_rows(state):
+    stats = _current.get()
+    if stats is None or not state.is_select:
+        return None
+    options = state.execution_options
+    if options.get("yield_per") or options.get("stream_results"):
+        # Streaming queries must not be buffered just to count them
+        return None
+
+    # Buffer the rows once to count them, then hand back an equivalent result
+    frozen = state.invoke_statement().freeze()
+    stats.rows += len(frozen.data)
+    return frozen()
+
+
+@contextmanager
+def llm_timer(source: str):
+    """Time one model run, e.g. an `async for ... in runner.run_async(...)` loop."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        LLM_CALL_SECONDS.observe((source,), elapsed)
+        stats = _current.get()
+        if stats is not None:
+            stats.llm_time += elapsed
+
+
+class MetricsMiddleware:
+    """Plain ASGI middleware, so streaming bodies are counted as they go out."""
+
+    def __init__(self, app, exclude_paths: tuple[str, ...] = ("/metrics",)):
+        self.app = app
+        self.exclude_paths = exclude_paths
+        # Read here rather than at import: the stack is built after load_dotenv()
+        self.server_timing = os.getenv("SERVER_TIMING", "").lower() in ("1", "true", "yes")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    headers = MutableHeaders(scope=message)
+                    headers.append("Server-Timing", stats.server_timing(time.perf_counter() - start))
+            elif message["type"] == "http.response.body":
+                stats.bytes_out += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            _record(scope, status, time.perf_counter() - start, stats)
+
+
+def _record(scope, status: int, wall: float, stats: RequestStats) -> None:
+    route = scope.get("route")
+    # Unmatched paths share one label so 404 scans can't blow up cardinality
+    labels = (scope["method"], getattr(route, "path", "unmatched"))
+
+    REQUEST_SECONDS.observe(labels + (str(status),), wall)
+    DB_SECONDS.observe(labels, stats.db_time)
+    if stats.llm_time:
+        LLM_SECONDS.observe(labels, stats.llm_time)
+    DB_STATEMENTS.inc(labels, stats.statements)
+    DB_ROWS.inc(labels, stats.rows)
+    RESPONSE_BYTES.inc(labels, stats.bytes_out)
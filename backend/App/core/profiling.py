@@ -0,0 +1,274 @@
+"""
+Admin-only tools for looking inside a live worker (routers/admin.py).
+
+- SamplingProfiler: a background thread that snapshots every thread's stack
+  via sys._current_frames() for N seconds and returns collapsed stacks
+  ("frame;frame;frame count" per line), ready for flamegraph.pl or speedscope.
+- RequestProfilerMiddleware: `?profile=1` from an admin runs that one request
+  under cProfile and answers with the pstats summary instead of the body.
+- task_dump(): every asyncio task with the chain of coroutines it is awaiting
+  in, e.g. to find requests stuck in runner.run_async or idle websockets.
+
+Nothing runs while idle: no sampler thread exists until started, and the
+middleware and endpoint wrapper only look at a query string / context var.
+"""
+import asyncio
+import cProfile
+import functools
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+from urllib.parse import parse_qs
+
+from starlette.responses import PlainTextResponse
+
+from .auth import admin_user_ids, user_id_from_token
+
+MAX_PROFILE_SECONDS = 300
+PROFILE_STATS_LIMIT = 60
+# From 3.12 cProfile is built on sys.monitoring: a single profiler for the whole
+# process, which already sees the threadpool, and enabling a second one raises
+# ValueError ("Another profiling tool is already active")
+_PROCESS_WIDE_PROFILER = sys.version_info >= (3, 12)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """One profiling session at a time per worker process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._counts: Counter[str] = Counter()
+        self.samples = 0
+        self.started_at: Optional[float] = None
+        self.seconds = 0.0
+        self.interval = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds: float, interval: float) -> bool:
+        with self._lock:
+            if self.running:
+                return False
+            self._counts = Counter()
+            self.samples = 0
+            self.started_at = time.time()
+            self.seconds = seconds
+            self.interval = interval
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self) -> str:
+        self._stop.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join()
+        return self.collapsed()
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self._counts.most_common())
+
+    def status(self) -> dict:
+        return {
+            "running": self.running,
+            "started_at": self.started_at,
+            "seconds": self.seconds,
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+        }
+
+    def _run(self):
+        own = threading.get_ident()
+        deadline = time.monotonic() + self.seconds
+        while time.monotonic() < deadline and not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self._counts[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+
+sampler = SamplingProfiler()
+
+
+# ---- per-request cProfile ----
+
+# Set while a ?profile=1 request is running; sync endpoints run in the
+# threadpool, which cProfile can't follow before 3.12, so they add their own
+# profile here.
+_request_profiles: ContextVar[Optional[list]] = ContextVar("request_profiles", default=None)
+
+
+def instrument_routes(app) -> None:
+    """Let ?profile=1 see into sync endpoints; call once after routers are included."""
+    _instrument(app.routes)
+
+
+def _instrument(routes) -> None:
+    for route in routes:
+        # Newer FastAPI keeps included routers nested and rebuilds their routes
+        # from route.endpoint on first use, so wrap the originals as well
+        included = getattr(route, "original_router", None)
+        if included is not None:
+            _instrument(included.routes)
+            continue
+
+        endpoint = getattr(route, "endpoint", None)
+        dependant = getattr(route, "dependant", None)
+        if dependant is None or endpoint is None or asyncio.iscoroutinefunction(endpoint):
+            continue
+        if getattr(endpoint, "_profiled", False):
+            continue
+        route.endpoint = dependant.call = _profiled(endpoint)
+
+
+def _profiled(fn):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        profiles = _request_profiles.get()
+        if profiles is None or _PROCESS_WIDE_PROFILER:
+            return fn(*args, **kwargs)
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Someone else is profiling; the request still runs, just unprofiled
+            return fn(*args, **kwargs)
+        profiles.append(profile)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profile.disable()
+
+    wrapper._profiled = True
+    return wrapper
+
+
+def _wants_profile(scope) -> bool:
+    query = scope.get("query_string", b"")
+    if b"profile=" not in query:
+        return False
+    if parse_qs(query.decode("latin-1")).get("profile") != ["1"]:
+        return False
+
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer":
+                return user_id_from_token(token) in admin_user_ids()
+    return False
+
+
+class RequestProfilerMiddleware:
+    """
+    Replaces the response of an admin's `?profile=1` request with a cProfile
+    summary (sorted by cumulative time). For everyone else the parameter is
+    ignored. Async work of other requests on the same loop can show up in the
+    summary, so profile on a quiet worker when possible.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        # cProfile can only have one active profiler per thread (per process from 3.12)
+        self.busy = False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.busy or not _wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        size = 0
+
+        async def capture(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+
+        loop_profile = cProfile.Profile()
+        try:
+            loop_profile.enable()
+        except ValueError:
+            # Another profiling tool holds the interpreter's profiler: serve the request as usual
+            await self.app(scope, receive, send)
+            return
+
+        profiles = []
+        token = _request_profiles.set(profiles)
+        self.busy = True
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, capture)
+        finally:
+            loop_profile.disable()
+            self.busy = False
+            _request_profiles.reset(token)
+        elapsed = time.perf_counter() - start
+
+        out = io.StringIO()
+        stats = pstats.Stats(loop_profile, stream=out)
+        for profile in profiles:
+            stats.add(profile)
+        stats.sort_stats("cumulative").print_stats(PROFILE_STATS_LIMIT)
+
+        header = (
+            f"{scope['method']} {scope['path']} -> {status}, {size} bytes, "
+            f"{elapsed * 1000:.1f} ms\n"
+        )
+        response = PlainTextResponse(header + out.getvalue(), headers={"Cache-Control": "no-store"})
+        await response(scope, receive, send)
+
+
+# ---- asyncio task dump ----
+
+def _await_chain(coro, limit: int) -> list[str]:
+    frames = []
+    obj = coro
+    while obj is not None and len(frames) < limit:
+        frame = getattr(obj, "cr_frame", None) or getattr(obj, "ag_frame", None) or getattr(obj, "gi_frame", None)
+        if frame is None:
+            frames.append(f"<{type(obj).__name__}>")
+            break
+        code = frame.f_code
+        frames.append(f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        obj = getattr(obj, "cr_await", None) or getattr(obj, "ag_await", None) or getattr(obj, "gi_yieldfrom", None)
+    return frames
+
+
+def task_dump(contains: Optional[str] = None, limit: int = 30) -> list[dict]:
+    """Must be called on the event loop thread (i.e. from an async endpoint)."""
+    current = asyncio.current_task()
+    tasks = []
+    for task in asyncio.all_tasks():
+        if task is current:
+            continue
+        stack = _await_chain(task.get_coro(), limit)
+        if contains and not any(contains in line for line in stack) and contains not in task.get_name():
+            continue
+        tasks.append({"name": task.get_name(), "done": task.done(), "stack": stack})
+    tasks.sort(key=lambda t: t["name"])
+    return tasks
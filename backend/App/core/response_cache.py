@@ -0,0 +1,198 @@
+"""
+Keyed response cache for the anonymous catalog list endpoints.
+
+Entries live in an in-process LRU and, when RESPONSE_CACHE_URL points at a
+Redis server, in that shared backend too. Keys embed a per-entity generation
+counter, so a write never has to find and delete entries: bumping the
+generation (services/version_service does this after every commit that
+touches prompts/tools/agents) makes every older key unreachable.
+
+Without a shared backend each worker only sees its own bumps, so the TTL
+bounds how long another worker can serve a stale page.
+"""
+import functools
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from fastapi import Request, Response
+
+from . import http_cache
+
+CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "60"))
+CACHE_URL = os.getenv("RESPONSE_CACHE_URL")
+
+# Only these headers are replayed from a cached entry
+_STORED_HEADERS = ("etag", "cache-control", "last-modified")
+
+
+class LRUCache:
+    def __init__(self, maxsize: int, ttl: int):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+class _LocalGenerations:
+    def __init__(self):
+        self._counters: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, entity: str) -> int:
+        return self._counters.get(entity, 0)
+
+    def bump(self, entity: str) -> None:
+        with self._lock:
+            self._counters[entity] = self._counters.get(entity, 0) + 1
+
+
+class _RedisBackend:
+    """Shared entries + generations. Any Redis error degrades to a cache miss."""
+
+    def __init__(self, url: str, ttl: int):
+        import redis  # optional dependency, only needed with RESPONSE_CACHE_URL
+
+        self.client = redis.Redis.from_url(url, socket_timeout=0.05)
+        self.ttl = ttl
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            return self.client.get(f"rc:{key}")
+        except Exception:
+            return None
+
+    def set(self, key: str, value: bytes) -> None:
+        try:
+            self.client.set(f"rc:{key}", value, ex=self.ttl)
+        except Exception:
+            pass
+
+    def generation(self, entity: str) -> Optional[int]:
+        try:
+            return int(self.client.get(f"rc-gen:{entity}") or 0)
+        except Exception:
+            return None
+
+    def bump(self, entity: str) -> None:
+        try:
+            self.client.incr(f"rc-gen:{entity}")
+        except Exception:
+            pass
+
+
+local = LRUCache(CACHE_SIZE, CACHE_TTL)
+_generations = _LocalGenerations()
+shared = _RedisBackend(CACHE_URL, CACHE_TTL) if CACHE_URL else None
+
+
+def generation(entity: str) -> Optional[int]:
+    if shared is not None:
+        # None means the shared backend is unreachable: don't cache at all
+        return shared.generation(entity)
+    return _generations.get(entity)
+
+
+def bump_generation(*entities: str) -> None:
+    for entity in entities:
+        _generations.bump(entity)
+        if shared is not None:
+            shared.bump(entity)
+
+
+def _key(entity: str, gen: int, request: Request) -> str:
+    params = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+    return f"{entity}:{gen}:{request.url.path}?{params}"
+
+
+def _lookup(key: str) -> Optional[bytes]:
+    value = local.get(key)
+    if value is None and shared is not None:
+        value = shared.get(key)
+        if value is not None:
+            local.set(key, value)
+    return value
+
+
+def _store(key: str, response: Response) -> None:
+    headers = {h: response.headers[h] for h in _STORED_HEADERS if h in response.headers}
+    value = json.dumps({
+        "media_type": response.media_type,
+        "headers": headers,
+        "body": response.body.decode("utf-8"),
+    }).encode("utf-8")
+    local.set(key, value)
+    if shared is not None:
+        shared.set(key, value)
+
+
+def _replay(request: Request, value: bytes) -> Response:
+    entry = json.loads(value)
+    headers = entry["headers"]
+    etag = headers.get("etag")
+
+    if etag:
+        hit = http_cache.not_modified(request, etag, headers.get("cache-control", ""))
+        if hit is not None:
+            return hit
+
+    return Response(content=entry["body"], media_type=entry["media_type"], headers=headers)
+
+
+def cached(entity: str):
+    """
+    Serve a list endpoint from the cache, keyed by path + sorted query string.
+
+    The wrapped handler must take `request: Request` and must not depend on
+    who is calling; only 200 responses are stored.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            request: Request = kwargs["request"]
+            gen = generation(entity) if CACHE_SIZE > 0 else None
+            if gen is None:
+                return fn(*args, **kwargs)
+
+            key = _key(entity, gen, request)
+            value = _lookup(key)
+            if value is not None:
+                return _replay(request, value)
+
+            response = fn(*args, **kwargs)
+            if isinstance(response, Response) and response.status_code == 200:
+                _store(key, response)
+            return response
+
+        return wrapper
+
+    return decorator
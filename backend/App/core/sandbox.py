@@ -0,0 +1,663 @@
+"""
+Runs user tool code (Python) in a pool of pre-started, locked-down worker processes.
+
+Workers are forked from a "zygote", a separate interpreter that has only
+imported this module, so starting one costs a fork, not an interpreter boot
+(and never copies the API process). The zygote gets a minimal environment
+(none of the API's settings or keys) and an empty scratch directory as its
+working directory. SANDBOX_WORKERS workers are kept idle and waiting. Each
+one, before it takes any call:
+- moves into its own network and mount namespaces and pivot_roots into a
+  tmpfs that holds only read-only binds of the Python installation and
+  system libraries, with the host's root detached: the app's code, .env,
+  database and /proc are not there;
+- runs as another user: nobody when the API runs as root; otherwise the
+  zygote owns a user namespace and the API maps its first subordinate uid
+  and gid into it with newuidmap/newgidmap (without those the worker keeps
+  the API's uid, with a warning, and relies on the mount namespace);
+- drops every capability (bounding set included), sets no_new_privs and
+  installs a seccomp filter refusing chroot, mount, pivot_root, unshare,
+  setns, ptrace and process_vm_*.
+  If any of this fails, the worker fails every call, unless
+  SANDBOX_REQUIRE_ISOLATION=0;
+- gets an audit hook that refuses sockets, subprocesses, fork/exec, signals
+  to other processes and ctypes;
+- is capped at SANDBOX_MEMORY_MB of address space, small files and no core
+  dumps.
+Every call also gets SANDBOX_CPU_SECONDS of CPU time (SIGXCPU, raised in the
+tool as CpuLimitExceeded) and SANDBOX_TIMEOUT_SECONDS of wall time, after
+which the worker is killed. A worker serves SANDBOX_MAX_CALLS calls (default
+1, so one user's tool never sees what another left behind in the process)
+and is then replaced in the background.
+
+Source is compiled once in the API process and the code object is cached by
+content hash (the same sha256 as content_blobs); workers only unmarshal it.
+Results come back as JSON, never pickle: a tool must not be able to make the
+API process execute anything.
+"""
+import asyncio
+import contextlib
+import hashlib
+import io
+import json
+import logging
+import marshal
+import os
+import queue
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+CODE_CACHE_SIZE = 256
+MAX_STDOUT_CHARS = 10_000
+MAX_RESPONSE_BYTES = 1_000_000
+
+# Audit events a tool may never raise (prefix match)
+_BLOCKED_EVENTS = (
+    "socket.", "subprocess.", "os.system", "os.exec", "os.posix_spawn", "os.spawn", "os.fork", "os.forkpty",
+    "os.kill", "os.killpg", "pty.", "ctypes.", "resource.setrlimit", "resource.prlimit",
+)
+_CLONE_NEWNS = 0x00020000
+_CLONE_NEWUSER = 0x10000000
+_CLONE_NEWNET = 0x40000000
+_MS_RDONLY, _MS_NOSUID, _MS_NODEV, _MS_REMOUNT, _MS_BIND, _MS_REC, _MS_PRIVATE = 1, 2, 4, 32, 4096, 16384, 1 << 18
+_MNT_DETACH = 2
+_PR_CAPBSET_DROP, _PR_SET_NO_NEW_PRIVS, _PR_SET_SECCOMP, _PR_CAP_AMBIENT = 24, 38, 22, 47
+_PR_CAP_AMBIENT_CLEAR_ALL, _SECCOMP_MODE_FILTER = 4, 2
+_NOBODY = 65534
+# Ids inside the zygote's user namespace that map to the API user and to its subordinate id
+_NS_OWNER, _NS_SANDBOX = 0, 1
+# Syscall numbers, and what workers may never call once confined (denied with EPERM by seccomp)
+_ARCHES = {
+    "x86_64": {
+        "audit_arch": 0xC000003E,
+        "pivot_root": 155,
+        "capset": 126,
+        "denied": (161, 165, 166, 155, 272, 308, 101, 310, 311),
+    },
+    "aarch64": {
+        "audit_arch": 0xC00000B7,
+        "pivot_root": 41,
+        "capset": 91,
+        "denied": (51, 40, 39, 41, 97, 268, 117, 270, 271),
+    },
+}
+# chroot, mount, umount2, pivot_root, unshare, setns, ptrace, process_vm_readv/writev above;
+# open_tree, move_mount, fsopen, fsconfig, fsmount, fspick and mount_setattr share numbers
+_NEW_MOUNT_API = (428, 429, 430, 431, 432, 433, 442)
+# Where the app lives; hidden from workers even if it sits under a read-only root
+_APP_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class SandboxError(Exception):
+    """The tool could not be run, or failed; str() is safe to show to the user."""
+
+
+class SandboxTimeout(SandboxError):
+    pass
+
+
+class CpuLimitExceeded(BaseException):
+    # BaseException, so a tool's `except Exception` doesn't swallow it
+    pass
+
+
+@dataclass(frozen=True)
+class Limits:
+    cpu_seconds: int = int(os.getenv("SANDBOX_CPU_SECONDS", "5"))
+    memory_mb: int = int(os.getenv("SANDBOX_MEMORY_MB", "512"))
+    timeout_seconds: float = float(os.getenv("SANDBOX_TIMEOUT_SECONDS", "10"))
+    max_file_mb: int = 10
+    scratch_mb: int = 16
+    require_isolation: bool = os.getenv("SANDBOX_REQUIRE_ISOLATION", "1") != "0"
+
+
+# ---- compiled code, cached in the API process ----
+
+_code_cache: "OrderedDict[str, bytes]" = OrderedDict()
+_code_cache_lock = threading.Lock()
+
+
+def digest(source: str) -> str:
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+
+def compiled(source: str, code_hash: Optional[str] = None) -> bytes:
+    """Marshalled code object of `source`; raises SandboxError on a syntax error."""
+    code_hash = code_hash or digest(source)
+    with _code_cache_lock:
+        code = _code_cache.get(code_hash)
+        if code is not None:
+            _code_cache.move_to_end(code_hash)
+            return code
+    try:
+        code = marshal.dumps(compile(source, f"<tool {code_hash[:12]}>", "exec"))
+    except (SyntaxError, ValueError, RecursionError, MemoryError) as exc:
+        raise SandboxError(f"Tool code does not compile: {exc}") from None
+    with _code_cache_lock:
+        _code_cache[code_hash] = code
+        while len(_code_cache) > CODE_CACHE_SIZE:
+            _code_cache.popitem(last=False)
+    return code
+
+
+# ---- inside a worker ----
+
+def _read_only_roots() -> list[str]:
+    """The Python installation and system libraries; parents sort before children."""
+    import site
+
+    paths = {sys.prefix, sys.base_prefix, sys.exec_prefix, "/usr", "/lib", "/lib64", "/lib32", "/etc/ld.so.cache"}
+    paths.update(site.getsitepackages())
+    return sorted(p for p in paths if os.path.lexists(p))
+
+
+def _libc():
+    import ctypes
+
+    return ctypes.CDLL(None, use_errno=True)
+
+
+def _check(result: int, what: str) -> None:
+    import ctypes
+
+    if result != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, f"{what}: {os.strerror(errno)}")
+
+
+def _enter_user_namespace() -> bool:
+    """In the zygote when not root: a user namespace its workers can build their jail in."""
+    return _libc().unshare(_CLONE_NEWUSER) == 0
+
+
+def _map_self(uid: int, gid: int) -> None:
+    """Map the API user (ids from before unshare) to root of the zygote's user namespace."""
+    with open("/proc/self/setgroups", "w") as f:
+        f.write("deny")
+    with open("/proc/self/uid_map", "w") as f:
+        f.write(f"{_NS_OWNER} {uid} 1")
+    with open("/proc/self/gid_map", "w") as f:
+        f.write(f"{_NS_OWNER} {gid} 1")
+
+
+def _seccomp_program(arch: dict):
+    """BPF filter: EPERM for the escape syscalls (and any foreign ABI), allow the rest."""
+    import ctypes
+    import struct
+
+    ld_abs, jeq, jge, ret = 0x20, 0x15, 0x35, 0x06
+    allow, deny = 0x7FFF0000, 0x00050000 | 1  # SECCOMP_RET_ALLOW, SECCOMP_RET_ERRNO | EPERM
+    program = [(ld_abs, 0, 0, 4), (jeq, 1, 0, arch["audit_arch"]), (ret, 0, 0, deny), (ld_abs, 0, 0, 0)]
+    if arch["audit_arch"] == _ARCHES["x86_64"]["audit_arch"]:
+        program += [(jge, 0, 1, 0x40000000), (ret, 0, 0, deny)]  # x32 syscalls
+    for nr in arch["denied"] + _NEW_MOUNT_API:
+        program += [(jeq, 0, 1, nr), (ret, 0, 0, deny)]
+    program.append((ret, 0, 0, allow))
+    filters = ctypes.create_string_buffer(b"".join(struct.pack("HBBI", *insn) for insn in program))
+    # struct sock_fprog {unsigned short len; struct sock_filter *filter;}
+    fprog = ctypes.create_string_buffer(struct.pack("HxxxxxxP", len(program), ctypes.addressof(filters)))
+    return fprog, filters
+
+
+def _confine(limits: Limits, ids: Optional[tuple[int, int]]) -> None:
+    """
+    Own network and mount namespaces; pivot_root into a read-only view of
+    Python with the host's root detached; switch to `ids` (uid, gid) if
+    given; then no capabilities, no new privileges and a seccomp filter
+    against chroot/mount/unshare/setns and friends.
+    """
+    import ctypes
+    import platform
+
+    arch = _ARCHES.get(platform.machine())
+    if arch is None:
+        raise OSError(0, f"unsupported architecture {platform.machine()}")
+    libc = _libc()
+
+    def mount(source, target, fstype, flags, data=None):
+        _check(libc.mount(source and source.encode(), target.encode(), fstype and fstype.encode(), flags,
+                          data and data.encode()), f"mount {target}")
+
+    # As root, or as the owner of the zygote's user namespace
+    _check(libc.unshare(_CLONE_NEWNET | _CLONE_NEWNS), "unshare")
+
+    # The zygote's (empty) working directory becomes this worker's private root
+    root = os.getcwd()
+    mount(None, "/", None, _MS_REC | _MS_PRIVATE)
+    mount("tmpfs", root, "tmpfs", _MS_NOSUID | _MS_NODEV, f"size={limits.scratch_mb}m,mode=0755")
+    for path in _read_only_roots():
+        target = root + path
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if os.path.islink(path):
+            os.symlink(os.readlink(path), target)
+            continue
+        if os.path.isdir(path):
+            os.makedirs(target, exist_ok=True)
+        else:
+            open(target, "w").close()
+        mount(path, target, None, _MS_BIND | _MS_REC)
+        try:
+            mount(None, target, None, _MS_BIND | _MS_REMOUNT | _MS_RDONLY | _MS_NOSUID | _MS_NODEV)
+        except OSError:
+            pass  # locked mount flags in a user namespace; not writable by the worker's uid anyway
+        if _APP_DIR.startswith(path.rstrip("/") + "/"):
+            mount("tmpfs", root + _APP_DIR, "tmpfs", _MS_NOSUID | _MS_NODEV, "size=1m,mode=0755")
+    os.makedirs(root + "/tmp", exist_ok=True)
+    os.chmod(root + "/tmp", 0o1777)
+    os.makedirs(root + "/dev", exist_ok=True)
+    open(root + "/dev/null", "w").close()
+    mount("/dev/null", root + "/dev/null", None, _MS_BIND)
+
+    # pivot_root, not chroot: once the old root is detached there is no way back to it
+    os.makedirs(root + "/.old")
+    _check(libc.syscall(arch["pivot_root"], root.encode(), (root + "/.old").encode()), "pivot_root")
+    os.chdir("/")
+    _check(libc.umount2(b"/.old", _MNT_DETACH), "umount /.old")
+    os.rmdir("/.old")
+    os.chdir("/tmp")
+
+    for cap in range(64):
+        if libc.prctl(_PR_CAPBSET_DROP, cap, 0, 0, 0) != 0:
+            break  # past the last capability this kernel knows
+    libc.prctl(_PR_CAP_AMBIENT, _PR_CAP_AMBIENT_CLEAR_ALL, 0, 0, 0)
+    if ids is not None:
+        uid, gid = ids
+        os.setgroups([])
+        os.setresgid(gid, gid, gid)
+        os.setresuid(uid, uid, uid)
+    # struct __user_cap_header_struct {version 3, pid 0} and two empty data structs
+    header = (ctypes.c_uint32 * 2)(0x20080522, 0)
+    _check(libc.syscall(arch["capset"], header, (ctypes.c_uint32 * 6)()), "capset")
+    _check(libc.prctl(_PR_SET_NO_NEW_PRIVS, 1, 0, 0, 0), "no_new_privs")
+    fprog, _filters = _seccomp_program(arch)
+    _check(libc.prctl(_PR_SET_SECCOMP, _SECCOMP_MODE_FILTER, fprog, 0, 0), "seccomp")
+
+
+def _lock_down(limits: Limits, ids: Optional[tuple[int, int]]):
+    """Apply the per-process limits; returns set_cpu_limit(seconds), the only way left to change rlimits."""
+    import resource
+    import signal
+
+    try:
+        _confine(limits, ids)
+    except OSError as exc:
+        if limits.require_isolation:
+            raise SandboxError(f"The tool sandbox could not isolate the worker ({exc})") from None
+    mb = 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limits.memory_mb * mb, limits.memory_mb * mb))
+    resource.setrlimit(resource.RLIMIT_FSIZE, (limits.max_file_mb * mb, limits.max_file_mb * mb))
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+
+    def on_xcpu(signum, frame):
+        raise CpuLimitExceeded()
+
+    signal.signal(signal.SIGXCPU, on_xcpu)
+
+    trusted = [False]
+
+    def audit(event, args):
+        if trusted[0] and event.startswith("resource."):
+            return
+        if event.startswith(_BLOCKED_EVENTS):
+            raise PermissionError(f"{event} is not allowed in tools")
+
+    def set_cpu_limit(seconds: int) -> None:
+        # A tool that digs this out of the heap can lift its CPU limit, not the wall-time one
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        trusted[0] = True
+        try:
+            resource.setrlimit(resource.RLIMIT_CPU, (int(usage.ru_utime + usage.ru_stime) + seconds, hard))
+        finally:
+            trusted[0] = False
+
+    sys.addaudithook(audit)
+    return set_cpu_limit
+
+
+def _jsonable(value):
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    return str(value)
+
+
+def _call(request: dict):
+    namespace = {"__name__": "__tool__", "__builtins__": __builtins__}
+    stdout = io.StringIO()
+    with contextlib.redirect_stdout(stdout):
+        exec(marshal.loads(request["code"]), namespace)
+        function = namespace.get(request["entrypoint"])
+        if not callable(function):
+            raise NameError(f"the tool defines no function {request['entrypoint']!r}")
+        result = function(**request["kwargs"])
+        if asyncio.iscoroutine(result):
+            result = asyncio.run(result)
+    return result, stdout.getvalue()[:MAX_STDOUT_CHARS]
+
+
+def _worker_main(conn, limits: Limits, ids: Optional[tuple[int, int]]) -> None:
+    try:
+        set_cpu_limit = _lock_down(limits, ids)
+        failure = None
+    except SandboxError as exc:
+        # Answer every call with the reason rather than run tools unconfined
+        failure = {"ok": False, "error": str(exc), "stdout": "", "cpu_seconds": 0}
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, OSError):
+            os._exit(0)
+        if failure:
+            conn.send_bytes(json.dumps(failure).encode("utf-8"))
+            continue
+        started = time.process_time()
+        try:
+            set_cpu_limit(request["cpu_seconds"])
+            result, stdout = _call(request)
+            response = {"ok": True, "result": result, "stdout": stdout}
+        except CpuLimitExceeded:
+            response = {"ok": False, "error": f"CPU time limit exceeded ({request['cpu_seconds']}s)", "stdout": ""}
+        except MemoryError:
+            response = {"ok": False, "error": "Memory limit exceeded", "stdout": ""}
+        except BaseException as exc:
+            response = {"ok": False, "error": f"{type(exc).__name__}: {exc}", "stdout": ""}
+        response["cpu_seconds"] = round(time.process_time() - started, 4)
+        try:
+            payload = json.dumps(response, default=_jsonable)
+        except (TypeError, ValueError):
+            response["result"] = str(response.get("result"))
+            payload = json.dumps(response, default=str)
+        conn.send_bytes(payload.encode("utf-8"))
+
+
+# ---- the zygote: a clean process the workers are forked from ----
+
+def _zygote_main(control_fd: int, limits: Limits) -> None:
+    """Fork a worker for every socket received on the control socket; answer with its pid."""
+    import signal
+    import socket
+    from multiprocessing.connection import Connection
+
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)  # workers are reaped by the kernel
+    control = socket.socket(fileno=control_fd)
+
+    # Who the workers run as: nobody when started as root. Otherwise the zygote
+    # creates a user namespace and the API maps a subordinate id into it
+    # (newuidmap); failing that the workers keep the API's uid.
+    ids = (_NOBODY, _NOBODY)
+    if os.getuid() != 0:
+        ids, uid, gid = None, os.getuid(), os.getgid()
+        control.sendall(b"userns\n" if _enter_user_namespace() else b"none\n")
+        reply = control.recv(16)
+        if reply == b"mapped":
+            ids = (_NS_SANDBOX, _NS_SANDBOX)
+        elif reply == b"self":
+            _map_self(uid, gid)
+        # Nothing else is sent until this, so the reply can't run into the first fork request
+        control.sendall(b"ready\n")
+
+    while True:
+        try:
+            _, fds, _, _ = socket.recv_fds(control, 16, 1)
+        except OSError:
+            os._exit(0)
+        if not fds:
+            os._exit(0)  # the API process went away
+        pid = os.fork()
+        if pid == 0:
+            control.close()
+            os.setsid()
+            _worker_main(Connection(fds[0]), limits, ids)
+        os.close(fds[0])
+        control.sendall(f"{pid}\n".encode())
+
+
+def _subordinate_id(path: str, name: str, own_id: int) -> Optional[int]:
+    """First id of the user's range in /etc/subuid or /etc/subgid."""
+    try:
+        with open(path) as f:
+            for line in f:
+                owner, _, rest = line.strip().partition(":")
+                if owner in (name, str(own_id)):
+                    return int(rest.split(":")[0])
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+class _Zygote:
+    def __init__(self, limits: Limits):
+        import socket
+        import subprocess
+        import tempfile
+
+        self._socket, theirs = socket.socketpair()
+        self.scratch = tempfile.mkdtemp(prefix="tool-sandbox-")
+        # A fresh interpreter that imports nothing but this module, not a fork of the API process.
+        # Nothing from the API's environment (keys, DATABASE_URL...) is passed on.
+        env = {"PATH": os.defpath, "LANG": "C.UTF-8", "PYTHONPATH": _APP_DIR, "PYTHONDONTWRITEBYTECODE": "1"}
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", __name__, str(theirs.fileno()), json.dumps(limits.__dict__)],
+            cwd=self.scratch,
+            env=env,
+            pass_fds=(theirs.fileno(),),
+            stdin=subprocess.DEVNULL,
+        )
+        theirs.close()
+        self._reader = self._socket.makefile("rb")
+        self._lock = threading.Lock()
+        if os.getuid() != 0:
+            if self._reader.readline() == b"userns\n":
+                self._socket.sendall(b"mapped" if self._map_subordinate_ids() else b"self")
+            else:
+                self._socket.sendall(b"none")  # workers will fail to isolate (or run unconfined if allowed)
+            self._reader.readline()
+
+    def _map_subordinate_ids(self) -> bool:
+        """Map the API user and its first subordinate uid/gid into the zygote's user namespace."""
+        import pwd
+        import shutil
+        import subprocess
+
+        name = pwd.getpwuid(os.getuid()).pw_name
+        uid = _subordinate_id("/etc/subuid", name, os.getuid())
+        gid = _subordinate_id("/etc/subgid", name, os.getgid())
+        helpers = shutil.which("newuidmap"), shutil.which("newgidmap")
+        if uid is not None and gid is not None and all(helpers):
+            pid = str(self.process.pid)
+            try:
+                subprocess.run([helpers[0], pid, str(_NS_OWNER), str(os.getuid()), "1", str(_NS_SANDBOX), str(uid), "1"],
+                               check=True, capture_output=True)
+                subprocess.run([helpers[1], pid, str(_NS_OWNER), str(os.getgid()), "1", str(_NS_SANDBOX), str(gid), "1"],
+                               check=True, capture_output=True)
+                return True
+            except (OSError, subprocess.CalledProcessError) as exc:
+                logger.warning("Could not map subordinate ids for the tool sandbox: %s", exc)
+        logger.warning(
+            "Tool workers run under the API's uid: give %s a range in /etc/subuid and /etc/subgid "
+            "and install newuidmap/newgidmap (uidmap) to run them as a separate user",
+            name,
+        )
+        return False
+
+    def fork(self) -> tuple[int, "object"]:
+        """Start a worker; returns (pid, connection to it)."""
+        import socket
+        from multiprocessing.connection import Connection
+
+        ours, theirs = socket.socketpair()
+        with self._lock:
+            socket.send_fds(self._socket, [b"w"], [theirs.fileno()])
+            theirs.close()
+            line = self._reader.readline()
+        if not line:
+            ours.close()
+            raise SandboxError("The tool sandbox is not running")
+        return int(line), Connection(ours.detach())
+
+    def stop(self) -> None:
+        import shutil
+        import subprocess
+
+        # Both hold the socket's fd: the zygote only sees EOF once neither is open
+        self._reader.close()
+        self._socket.close()
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        shutil.rmtree(self.scratch, ignore_errors=True)
+
+
+# ---- the pool, in the API process ----
+
+class _Worker:
+    def __init__(self, zygote: _Zygote):
+        self.pid, self.conn = zygote.fork()
+        self.calls = 0
+
+    def stop(self) -> None:
+        try:
+            os.kill(self.pid, 9)
+        except ProcessLookupError:
+            pass
+        self.conn.close()
+
+
+class SandboxPool:
+    def __init__(self, size: int, limits: Limits = Limits(), max_calls: int = 1):
+        self.size = size
+        self.limits = limits
+        self.max_calls = max_calls
+        self._zygote = _Zygote(limits)
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._closed = False
+        # Background replacements still starting workers; close() waits for them
+        self._replacing: set[threading.Thread] = set()
+        self._replacing_lock = threading.Lock()
+        for _ in range(size):
+            self._idle.put(_Worker(self._zygote))
+
+    def _replace(self, worker: _Worker) -> None:
+        try:
+            worker.stop()
+            if self._closed:
+                return
+            try:
+                self._idle.put(_Worker(self._zygote))
+            except Exception:
+                logger.exception("Could not start a tool sandbox worker")
+        finally:
+            with self._replacing_lock:
+                self._replacing.discard(threading.current_thread())
+
+    def _retire(self, worker: _Worker) -> None:
+        with self._replacing_lock:
+            if self._closed:
+                worker.stop()
+                return
+            thread = threading.Thread(target=self._replace, args=(worker,), daemon=True)
+            self._replacing.add(thread)
+            thread.start()
+
+    def run(self, source: str, entrypoint: str, kwargs: dict, code_hash: Optional[str] = None) -> dict:
+        """
+        Call `entrypoint(**kwargs)` from `source` in a worker. Returns
+        {"result", "stdout", "cpu_seconds", "duration_ms"}; raises SandboxError
+        if the tool raised, hit a limit or no worker freed up in time.
+        """
+        code = compiled(source, code_hash)
+        try:
+            json.dumps(kwargs)
+        except (TypeError, ValueError) as exc:
+            raise SandboxError(f"Tool arguments must be JSON: {exc}") from None
+
+        try:
+            worker = self._idle.get(timeout=self.limits.timeout_seconds)
+        except queue.Empty:
+            raise SandboxTimeout("All tool workers are busy, try again") from None
+
+        started = time.perf_counter()
+        healthy = False
+        status = "died"
+        try:
+            worker.conn.send({
+                "code": code, "entrypoint": entrypoint, "kwargs": kwargs, "cpu_seconds": self.limits.cpu_seconds,
+            })
+            if not worker.conn.poll(self.limits.timeout_seconds):
+                status = "timeout"
+                raise SandboxTimeout(f"Tool timed out after {self.limits.timeout_seconds:g}s")
+            response = json.loads(worker.conn.recv_bytes(MAX_RESPONSE_BYTES))
+            healthy = True
+            status = "ok" if response.get("ok") else "error"
+        except (EOFError, ConnectionError):
+            raise SandboxError("Tool process died") from None
+        except OSError:
+            status = "error"
+            raise SandboxError("Tool output is too large") from None
+        finally:
+            metrics.TOOL_CALLS.inc((status,))
+            metrics.TOOL_CALL_SECONDS.observe((), time.perf_counter() - started)
+            worker.calls += 1
+            if healthy and worker.calls < self.max_calls and not self._closed:
+                self._idle.put(worker)
+            else:
+                self._retire(worker)
+
+        if not response.get("ok"):
+            raise SandboxError(response.get("error") or "Tool failed")
+        return {
+            "result": response.get("result"),
+            "stdout": response.get("stdout", ""),
+            "cpu_seconds": response.get("cpu_seconds"),
+            "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+
+    async def run_async(self, source: str, entrypoint: str, kwargs: dict, code_hash: Optional[str] = None) -> dict:
+        # The wait happens on a thread, so concurrent calls use several workers at once
+        return await asyncio.to_thread(self.run, source, entrypoint, kwargs, code_hash)
+
+    def close(self) -> None:
+        with self._replacing_lock:
+            self._closed = True
+            replacing = list(self._replacing)
+        # A replacement that is mid-fork finishes (and is stopped below) before the zygote goes away
+        for thread in replacing:
+            thread.join(timeout=5)
+        while True:
+            try:
+                self._idle.get_nowait().stop()
+            except queue.Empty:
+                break
+        self._zygote.stop()
+
+
+_pool: Optional[SandboxPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> SandboxPool:
+    """The process-wide pool, started (and its workers pre-forked) on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SandboxPool(
+                size=int(os.getenv("SANDBOX_WORKERS", "4")),
+                max_calls=int(os.getenv("SANDBOX_MAX_CALLS", "1")),
+            )
+        return _pool
+
+
+if __name__ == "__main__":
+    _zygote_main(int(sys.argv[1]), Limits(**json.loads(sys.argv[2])))
@@ -3,18 +3,18 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.openapi.utils import get_openapi
 from passlib.context import CryptContext
 from dotenv import load_dotenv
-import os
-import firebase_admin
-from firebase_admin import credentials, initialize_app
-from . import models, database
+from .core.metrics import MetricsMiddleware
+from .core.profiling import RequestProfilerMiddleware, instrument_routes
+from .core.responses import FastJSONResponse
 from .routers import (
-    login, register, prompt, tools, profile,stats,ai,agent,community,group_chat
+    login, register, prompt, tools, profile,stats,ai,agent,community,group_chat,metrics,admin,export,bulk_import,media,
+    recommendations, search, conversation,
 )
 
 # ✅ load environment variables early
 load_dotenv()
 
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse)
 
 # CORS settings
 origins = [
@@ -32,20 +32,10 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-
-# ✅ Initialize Firebase ONCE
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))  # Directory of main.py
-cred_path = os.path.join(BASE_DIR, "firebase-service-account.json")
-
-if os.path.exists(cred_path):
-    cred = credentials.Certificate(cred_path)
-    try:
-        firebase_admin.initialize_app(cred)
-    except ValueError:
-        # Avoid "default app already exists" error when server reloads
-        pass
-else:
-    print(f"WARNING: Firebase credentials not found at {cred_path}. Firebase features will not work.")
+# ?profile=1 for admins; inside metrics so profiled requests are still counted
+app.add_middleware(RequestProfilerMiddleware)
+# Outermost, so timings include CORS and every other middleware
+app.add_middleware(MetricsMiddleware)
 
 # Password hashing context
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -86,10 +76,20 @@ app.include_router(login.router)
 app.include_router(prompt.router)
 app.include_router(tools.router)
 app.include_router(agent.router)
-app.include_router(profile.router)
+app.include_router(conversation.router)
+# stats and recommendations before profile: /users/stats must win over /users/{user_id}
 app.include_router(stats.router)
+app.include_router(recommendations.router)
+app.include_router(profile.router)
 app.include_router(ai.router)
 app.include_router(community.router)
 app.include_router(group_chat.router)
-# ✅ Create DB tables if not exist
-models.Base.metadata.create_all(bind=database.engine)
\ No newline at end of file
+app.include_router(export.router)
+app.include_router(bulk_import.router)
+app.include_router(media.router)
+app.include_router(search.router)
+app.include_router(metrics.router)
+app.include_router(admin.router)
+# After all routers: lets ?profile=1 follow sync endpoints into the threadpool
+instrument_routes(app)
+# Schema changes are applied out of band: python -m App.cli migrate upgrade
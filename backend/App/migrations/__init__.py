@@ -0,0 +1 @@
+from .runner import MigrationContext, current, pending, upgrade, load_revisions, applied_revisions
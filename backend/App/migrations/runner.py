@@ -0,0 +1,208 @@
+"""
+Ordered, recorded schema migrations.
+
+Each module in migrations/versions defines `revision`, `description` and
+`upgrade(ctx)`. Modules run in file-name order and every applied revision is
+recorded in the schema_migrations table, so `upgrade()` only runs what a
+database hasn't seen yet. The app itself never runs DDL: deploys run
+`python -m App.cli migrate upgrade` before starting the new code.
+
+The helpers on MigrationContext are idempotent, so a revision that failed
+half-way (or a database that was created by the old create_all() at import)
+can simply be upgraded again.
+
+A revision is frozen once it ships: it declares the tables it creates with
+its own Core Table definitions and carries its own copy of any backfill,
+never importing models or services. Those keep changing, and a database
+upgraded from scratch next year must go through the same steps as one
+upgraded today.
+"""
+import importlib
+import logging
+import pkgutil
+from datetime import datetime
+from types import ModuleType
+from typing import Optional, Union
+
+from sqlalchemy import Column, DateTime, MetaData, String, Table, inspect, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import sort_tables
+from sqlalchemy.types import TypeEngine
+
+from . import versions
+
+logger = logging.getLogger(__name__)
+
+# Kept out of models.Base.metadata so create_all() never touches it
+_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    _metadata,
+    Column("revision", String(32), primary_key=True),
+    Column("description", String(256)),
+    Column("applied_at", DateTime(timezone=True)),
+)
+
+
+class MigrationContext:
+    """The operations a revision is allowed to use."""
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        self.dialect = engine.dialect.name
+
+    # ---- introspection (fresh inspector each call, the schema is changing) ----
+
+    def has_table(self, table: str) -> bool:
+        return inspect(self.engine).has_table(table)
+
+    def has_column(self, table: str, column: str) -> bool:
+        return column in {c["name"] for c in inspect(self.engine).get_columns(table)}
+
+    def has_index(self, table: str, name: str) -> bool:
+        return name in {i["name"] for i in inspect(self.engine).get_indexes(table)}
+
+    # ---- DDL ----
+
+    def execute(self, sql: str, **params) -> None:
+        with self.engine.begin() as conn:
+            conn.execute(text(sql), params)
+
+    def create_tables(self, *tables: Table) -> None:
+        """Create the revision's tables (and their declared indexes) that don't exist yet."""
+        # Referenced tables first; Postgres checks foreign keys at CREATE TABLE
+        for table in sort_tables(tables):
+            table.create(self.engine, checkfirst=True)
+
+    def add_column(self, table: str, column: str, ddl_type: Union[str, TypeEngine]) -> None:
+        """
+        Add a nullable column without a default. On Postgres that is a catalog
+        only change (no table rewrite); fill it afterwards with backfill().
+        """
+        if self.has_column(table, column):
+            return
+        if isinstance(ddl_type, TypeEngine):
+            ddl_type = ddl_type.compile(dialect=self.engine.dialect)
+        logger.info("Adding %s.%s", table, column)
+        self.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}")
+
+    def create_index(
+        self, name: str, table: str, columns: list[str], unique: bool = False, using: Optional[str] = None
+    ) -> None:
+        """
+        Build an index without blocking writes where the database supports it.
+        `columns` may hold expressions and operator classes; `using` picks the
+        index method (e.g. "gin") and is Postgres only.
+
+        Postgres uses CREATE INDEX CONCURRENTLY, which cannot run inside a
+        transaction and leaves an INVALID index behind if it fails; such an
+        index is dropped and rebuilt instead of being skipped.
+        """
+        unique_sql = "UNIQUE " if unique else ""
+        using_sql = f"USING {using} " if using else ""
+        cols = ", ".join(columns)
+
+        if self.dialect == "postgresql":
+            with self.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                valid = conn.execute(
+                    text(
+                        "SELECT i.indisvalid FROM pg_index i "
+                        "JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name"
+                    ),
+                    {"name": name},
+                ).scalar()
+                if valid:
+                    return
+                if valid is not None:
+                    logger.warning("Rebuilding invalid index %s", name)
+                    conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+                logger.info("Creating index %s concurrently", name)
+                conn.execute(text(f"CREATE {unique_sql}INDEX CONCURRENTLY {name} ON {table} {using_sql}({cols})"))
+            return
+
+        if self.has_index(table, name):
+            return
+        logger.info("Creating index %s", name)
+        self.execute(f"CREATE {unique_sql}INDEX IF NOT EXISTS {name} ON {table} ({cols})")
+
+    def backfill(self, table: str, assignments: str, where: str, batch_size: int = 1000) -> int:
+        """
+        UPDATE `table` SET `assignments` for rows matching `where`, one short
+        transaction per batch so row locks are never held across the table.
+        `assignments` must make `where` false for the updated rows, or this
+        never finishes.
+        """
+        total = 0
+        while True:
+            with self.engine.begin() as conn:
+                result = conn.execute(text(
+                    f"UPDATE {table} SET {assignments} WHERE id IN "
+                    f"(SELECT id FROM {table} WHERE {where} LIMIT {int(batch_size)})"
+                ))
+            if result.rowcount <= 0:
+                break
+            total += result.rowcount
+            logger.info("Backfilled %d rows of %s", total, table)
+        return total
+
+
+def load_revisions() -> list[ModuleType]:
+    modules = [
+        importlib.import_module(f"{versions.__name__}.{info.name}")
+        for info in sorted(pkgutil.iter_modules(versions.__path__), key=lambda i: i.name)
+    ]
+    seen = set()
+    for module in modules:
+        if module.revision in seen:
+            raise RuntimeError(f"Duplicate migration revision {module.revision} in {module.__name__}")
+        seen.add(module.revision)
+    return modules
+
+
+def applied_revisions(engine: Engine) -> dict[str, datetime]:
+    if not inspect(engine).has_table(schema_migrations.name):
+        return {}
+    with engine.connect() as conn:
+        rows = conn.execute(select(schema_migrations.c.revision, schema_migrations.c.applied_at))
+        return {row.revision: row.applied_at for row in rows}
+
+
+def current(engine: Engine) -> Optional[str]:
+    """The newest applied revision, in history order."""
+    applied = applied_revisions(engine)
+    latest = None
+    for module in load_revisions():
+        if module.revision in applied:
+            latest = module.revision
+    return latest
+
+
+def pending(engine: Engine) -> list[ModuleType]:
+    applied = applied_revisions(engine)
+    return [m for m in load_revisions() if m.revision not in applied]
+
+
+def upgrade(engine: Engine, target: Optional[str] = None) -> list[str]:
+    """Apply pending revisions in order, stopping after `target` if given."""
+    revisions = [m.revision for m in load_revisions()]
+    if target is not None and target not in revisions:
+        raise ValueError(f"Unknown revision {target!r}")
+
+    _metadata.create_all(engine, checkfirst=True)
+    ctx = MigrationContext(engine)
+    done = []
+
+    for module in pending(engine):
+        if target is not None and revisions.index(module.revision) > revisions.index(target):
+            break
+        logger.info("Applying %s: %s", module.revision, module.description)
+        module.upgrade(ctx)
+        with engine.begin() as conn:
+            conn.execute(schema_migrations.insert().values(
+                revision=module.revision,
+                description=module.description,
+                applied_at=datetime.utcnow(),
+            ))
+        done.append(module.revision)
+
+    return done
@@ -0,0 +1,2 @@
+# Revisions run in file-name order: rNNNN_<slug>.py, never renumber or edit
+# one that has shipped, add a new revision instead.
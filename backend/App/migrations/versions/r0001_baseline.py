@@ -0,0 +1,197 @@
+"""Baseline: the tables the app created with create_all() at import."""
+from sqlalchemy import (
+    JSON, Boolean, Column, DateTime, Float, ForeignKey, Integer, MetaData, String, Table, Text,
+    UniqueConstraint, func,
+)
+
+revision = "0001"
+description = "baseline schema"
+
+# The models as they were when this revision was written
+metadata = MetaData()
+
+
+def _created_at(name="created_at"):
+    return Column(name, DateTime(timezone=True), server_default=func.now())
+
+
+users = Table(
+    "users", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("full_name", String(256), nullable=False),
+    Column("email", String(256), nullable=False),
+    Column("hashed_password", String, nullable=False),
+    Column("phone", String(16)),
+    Column("bio", String),
+    Column("website", String),
+    _created_at("joined_date"),
+    Column("profile_image", String),
+)
+
+prompts = Table(
+    "prompts", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("title", String(256), nullable=False),
+    Column("description", Text),
+    Column("content", Text, nullable=False),
+    Column("tags", JSON),
+    Column("category", String(128)),
+    Column("recommended_model", String),
+    Column("likes", Integer),
+    Column("views", Integer),
+    Column("downloads", String(64)),
+    _created_at(),
+    Column("created_by", Integer, ForeignKey("users.id"), nullable=False),
+    Column("creator_name", String(256)),
+)
+
+tools = Table(
+    "tools", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("title", String(256), nullable=False, index=True),
+    Column("description", Text),
+    Column("tags", JSON),
+    Column("recommended_model", String),
+    Column("content", Text),
+    Column("language", String(64)),
+    Column("version", String(64)),
+    Column("downloads", String(64)),
+    Column("likes", Integer),
+    Column("views", Integer),
+    Column("instructions", JSON),
+    _created_at(),
+    Column("created_by", Integer, ForeignKey("users.id"), nullable=False),
+    Column("creator_name", String(256)),
+)
+
+agents = Table(
+    "agents", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("title", String(256), nullable=False),
+    Column("description", Text),
+    Column("system_prompt", Text),
+    Column("tags", JSON),
+    Column("model", String(128)),
+    Column("temperature", Float),
+    Column("max_tokens", Integer),
+    Column("instructions", Text),
+    Column("visibility", String(32)),
+    Column("likes", Integer),
+    Column("views", Integer),
+    _created_at(),
+    Column("created_by", Integer, ForeignKey("users.id"), nullable=False),
+    Column("creator_name", String(256)),
+)
+
+
+def _user_item(name, item_table, item_column, at_column):
+    """liked_* and *_views: (user, item, when)."""
+    return Table(
+        name, metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+        Column(item_column, Integer, ForeignKey(f"{item_table}.id"), nullable=False),
+        _created_at(at_column),
+    )
+
+
+liked_prompts = _user_item("liked_prompts", "prompts", "prompt_id", "liked_at")
+liked_tools = _user_item("liked_tools", "tools", "tool_id", "liked_at")
+prompt_views = _user_item("prompt_views", "prompts", "prompt_id", "viewed_at")
+tool_views = _user_item("tool_views", "tools", "tool_id", "viewed_at")
+liked_agents = _user_item("liked_agents", "agents", "agent_id", "liked_at")
+agent_views = _user_item("agent_views", "agents", "agent_id", "viewed_at")
+
+agent_tools = Table(
+    "agent_tools", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("agent_id", Integer, ForeignKey("agents.id"), nullable=False),
+    Column("name", String(256), nullable=False),
+    Column("description", Text),
+    Column("code", Text),
+    Column("enabled", Boolean),
+    Column("tool_id", Integer, ForeignKey("tools.id")),
+    Column("config", JSON),
+)
+
+agent_prompts = Table(
+    "agent_prompts", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("agent_id", Integer, ForeignKey("agents.id"), nullable=False),
+    Column("order", Integer),
+    Column("content", Text),
+    Column("prompt_id", Integer, ForeignKey("prompts.id")),
+    Column("role", String(64)),
+)
+
+agent_runs = Table(
+    "agent_runs", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("agent_id", Integer, ForeignKey("agents.id"), nullable=False),
+    Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+    Column("input", Text),
+    Column("output", Text),
+    Column("status", String(32)),
+    _created_at(),
+)
+
+community_discussions = Table(
+    "community_discussions", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("title", String(256), nullable=False),
+    Column("content", Text, nullable=False),
+    Column("category", String(32), nullable=False),
+    Column("tags", JSON),
+    Column("likes", Integer),
+    Column("comments_count", Integer),
+    _created_at(),
+    Column("created_by", Integer, ForeignKey("users.id"), nullable=False),
+)
+
+community_comments = Table(
+    "community_comments", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("discussion_id", Integer, ForeignKey("community_discussions.id")),
+    Column("user_id", Integer, ForeignKey("users.id")),
+    Column("content", Text, nullable=False),
+    _created_at(),
+)
+
+community_groups = Table(
+    "community_groups", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("name", String(256), nullable=False),
+    Column("description", Text),
+    Column("category", String(32), nullable=False),
+    Column("owner_id", Integer, ForeignKey("users.id"), nullable=False),
+)
+
+community_group_members = Table(
+    "community_group_members", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("group_id", Integer, ForeignKey("community_groups.id"), nullable=False),
+    Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+    Column("role", String(20)),
+    _created_at("joined_at"),
+    UniqueConstraint("group_id", "user_id", name="uq_group_user"),
+)
+
+community_likes = Table(
+    "community_likes", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("user_id", Integer, ForeignKey("users.id")),
+    Column("discussion_id", Integer, ForeignKey("community_discussions.id")),
+)
+
+community_group_messages = Table(
+    "community_group_messages", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("group_id", Integer, ForeignKey("community_groups.id"), nullable=False),
+    Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+    Column("content", Text, nullable=False),
+    _created_at(),
+)
+
+
+def upgrade(ctx):
+    ctx.create_tables(*metadata.tables.values())
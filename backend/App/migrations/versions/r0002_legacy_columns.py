@@ -0,0 +1,10 @@
+"""Columns the old migrate_db*.py / migrate_new.py scripts added by hand."""
+revision = "0002"
+description = "agents/tools instructions, community group owner and discussion group"
+
+
+def upgrade(ctx):
+    ctx.add_column("agents", "instructions", "TEXT")
+    ctx.add_column("tools", "instructions", "TEXT")
+    ctx.add_column("community_groups", "owner_id", "INTEGER")
+    ctx.add_column("community_discussions", "group_id", "INTEGER")
@@ -0,0 +1,7 @@
+"""Keyset pagination index for group chat history."""
+revision = "0003"
+description = "index community_group_messages (group_id, id)"
+
+
+def upgrade(ctx):
+    ctx.create_index("ix_group_messages_group_id_id", "community_group_messages", ["group_id", "id"])
@@ -0,0 +1,26 @@
+"""
+Denormalized per-user counters. Rows are built lazily on first read, or all
+at once with `python -m App.cli reconcile-stats`.
+"""
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, MetaData, Table, func
+
+revision = "0004"
+description = "user_stats table"
+
+metadata = MetaData()
+Table("users", metadata, Column("id", Integer, primary_key=True))
+
+user_stats = Table(
+    "user_stats", metadata,
+    Column("user_id", Integer, ForeignKey("users.id"), primary_key=True),
+    Column("total_prompts", Integer, nullable=False),
+    Column("total_tools", Integer, nullable=False),
+    Column("total_agents", Integer, nullable=False),
+    Column("total_likes", Integer, nullable=False),
+    Column("total_views", Integer, nullable=False),
+    Column("updated_at", DateTime(timezone=True), server_default=func.now()),
+)
+
+
+def upgrade(ctx):
+    ctx.create_tables(user_stats)
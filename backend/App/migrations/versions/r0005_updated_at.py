@@ -0,0 +1,13 @@
+"""updated_at on catalog rows (ETag / Last-Modified), backfilled from created_at."""
+from sqlalchemy import DateTime
+
+revision = "0005"
+description = "prompts/tools/agents updated_at"
+
+TABLES = ("prompts", "tools", "agents")
+
+
+def upgrade(ctx):
+    for table in TABLES:
+        ctx.add_column(table, "updated_at", DateTime(timezone=True))
+        ctx.backfill(table, "updated_at = COALESCE(created_at, CURRENT_TIMESTAMP)", "updated_at IS NULL")
@@ -0,0 +1,24 @@
+"""Per-entity version counters used for list ETags and cache keys."""
+from sqlalchemy import Column, Integer, MetaData, String, Table
+
+revision = "0006"
+description = "entity_versions table"
+
+ENTITIES = ("prompts", "tools", "agents")
+
+metadata = MetaData()
+entity_versions = Table(
+    "entity_versions", metadata,
+    Column("entity", String(32), primary_key=True),
+    Column("version", Integer, nullable=False),
+)
+
+
+def upgrade(ctx):
+    ctx.create_tables(entity_versions)
+    for entity in ENTITIES:
+        ctx.execute(
+            "INSERT INTO entity_versions (entity, version) SELECT :entity, 1 "
+            "WHERE NOT EXISTS (SELECT 1 FROM entity_versions WHERE entity = :entity)",
+            entity=entity,
+        )
@@ -0,0 +1,33 @@
+"""Per-call model telemetry (tokens, latency, cost), linked to agent_runs."""
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Integer, MetaData, String, Table, func
+
+revision = "0007"
+description = "llm_calls table"
+
+metadata = MetaData()
+for referenced in ("agent_runs", "agents", "users"):
+    Table(referenced, metadata, Column("id", Integer, primary_key=True))
+
+llm_calls = Table(
+    "llm_calls", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("agent_run_id", Integer, ForeignKey("agent_runs.id"), index=True),
+    Column("agent_id", Integer, ForeignKey("agents.id"), index=True),
+    Column("user_id", Integer, ForeignKey("users.id"), index=True),
+    Column("source", String(64), nullable=False),
+    Column("model", String(128), nullable=False),
+    Column("prompt_tokens", Integer),
+    Column("completion_tokens", Integer),
+    Column("total_tokens", Integer),
+    Column("cost_usd", Float),
+    Column("ttft_ms", Float),
+    Column("latency_ms", Float, nullable=False),
+    Column("retries", Integer),
+    Column("status", String(16)),
+    Column("error_class", String(128)),
+    Column("created_at", DateTime(timezone=True), server_default=func.now(), index=True),
+)
+
+
+def upgrade(ctx):
+    ctx.create_tables(llm_calls)
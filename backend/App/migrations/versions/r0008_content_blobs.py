@@ -0,0 +1,91 @@
+"""Content-addressed bodies: content_blobs plus hash references from prompts, tools and agent children."""
+import hashlib
+import zlib
+from collections import Counter
+
+from sqlalchemy import (
+    Column, DateTime, Integer, LargeBinary, MetaData, String, Table, bindparam, func, select, text, update,
+)
+
+revision = "0008"
+description = "content_blobs table and *_hash references"
+
+# table, text column, hash column, whether the inline text is emptied
+REFERENCES = (
+    ("prompts", "content", "content_hash", False),
+    ("tools", "content", "content_hash", False),
+    ("agent_tools", "code", "code_hash", True),
+    ("agent_prompts", "content", "content_hash", True),
+)
+BATCH_SIZE = 500
+# Bodies shorter than this are stored as-is (zlib barely helps)
+COMPRESS_MIN_BYTES = 256
+
+metadata = MetaData()
+content_blobs = Table(
+    "content_blobs", metadata,
+    Column("hash", String(64), primary_key=True),
+    Column("size", Integer, nullable=False),
+    Column("compression", String(16)),
+    Column("data", LargeBinary, nullable=False),
+    Column("refcount", Integer, nullable=False),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+)
+
+
+def _encode(raw: bytes):
+    if len(raw) >= COMPRESS_MIN_BYTES:
+        packed = zlib.compress(raw, 6)
+        if len(packed) < len(raw):
+            return packed, "zlib"
+    return raw, None
+
+
+def _acquire(conn, texts):
+    """Store the bodies (one blob per distinct body) and add a reference per text; returns the hashes."""
+    hashes = [hashlib.sha256(body.encode("utf-8")).hexdigest() for body in texts]
+    refs = Counter(hashes)
+    existing = set(conn.execute(
+        select(content_blobs.c.hash).where(content_blobs.c.hash.in_(list(refs)))
+    ).scalars())
+    new = {}
+    for h, body in zip(hashes, texts):
+        if h not in existing and h not in new:
+            raw = body.encode("utf-8")
+            data, compression = _encode(raw)
+            new[h] = {"hash": h, "size": len(raw), "compression": compression, "data": data, "refcount": 0}
+    if new:
+        conn.execute(content_blobs.insert(), list(new.values()))
+    conn.execute(
+        update(content_blobs)
+        .where(content_blobs.c.hash == bindparam("b_hash"))
+        .values(refcount=content_blobs.c.refcount + bindparam("b_refs")),
+        [{"b_hash": h, "b_refs": n} for h, n in refs.items()],
+    )
+    return hashes
+
+
+def _move_bodies(ctx, table, text_column, hash_column, move):
+    assignments = f"{hash_column} = :hash" + (f", {text_column} = NULL" if move else "")
+    while True:
+        # One short transaction per batch, like MigrationContext.backfill()
+        with ctx.engine.begin() as conn:
+            rows = conn.execute(text(
+                f"SELECT id, {text_column} FROM {table} "
+                f"WHERE {hash_column} IS NULL AND {text_column} IS NOT NULL LIMIT {BATCH_SIZE}"
+            )).all()
+            if not rows:
+                return
+            hashes = _acquire(conn, [row[1] for row in rows])
+            conn.execute(
+                text(f"UPDATE {table} SET {assignments} WHERE id = :id"),
+                [{"hash": h, "id": row[0]} for h, row in zip(hashes, rows)],
+            )
+
+
+def upgrade(ctx):
+    ctx.create_tables(content_blobs)
+    for table, text_column, hash_column, move in REFERENCES:
+        ctx.add_column(table, hash_column, String(64))
+        ctx.create_index(f"ix_{table}_{hash_column}", table, [hash_column])
+        _move_bodies(ctx, table, text_column, hash_column, move)
@@ -0,0 +1,39 @@
+"""Move inline (data URL) profile images out of users into the media store."""
+import logging
+
+from sqlalchemy import text
+
+from ...core import media
+
+revision = "0009"
+description = "users.profile_image data URLs -> media references"
+
+logger = logging.getLogger(__name__)
+BATCH_SIZE = 100
+
+
+def upgrade(ctx):
+    last_id = 0
+    while True:
+        # Keyset over id: rows that can't be converted stay as they are
+        with ctx.engine.begin() as conn:
+            rows = conn.execute(
+                text(
+                    "SELECT id, profile_image FROM users "
+                    "WHERE id > :last_id AND profile_image LIKE 'data:%' ORDER BY id LIMIT :limit"
+                ),
+                {"last_id": last_id, "limit": BATCH_SIZE},
+            ).all()
+            if not rows:
+                return
+            for user_id, value in rows:
+                try:
+                    ref = media.save_data_url(value)
+                except media.InvalidImage as exc:
+                    logger.warning("Leaving profile image of user %s inline: %s", user_id, exc)
+                    continue
+                conn.execute(
+                    text("UPDATE users SET profile_image = :ref WHERE id = :id"),
+                    {"ref": ref, "id": user_id},
+                )
+            last_id = rows[-1][0]
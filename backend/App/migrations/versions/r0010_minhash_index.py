@@ -0,0 +1,111 @@
+"""MinHash/LSH near-duplicate index for prompt and tool bodies, plus duplicate_of flags."""
+import re
+import zlib
+
+from sqlalchemy import BigInteger, Column, Index, Integer, LargeBinary, MetaData, String, Table, text
+
+revision = "0010"
+description = "minhash_signatures / minhash_buckets and duplicate_of on prompts, tools"
+
+ENTITIES = ("prompts", "tools")
+INDEX_BATCH_SIZE = 500
+
+# The signature scheme the index was built with; services/duplicate_service
+# must keep producing the same values for these rows to stay comparable
+NUM_HASHES = 128
+BANDS = 16
+ROWS_PER_BAND = NUM_HASHES // BANDS
+SHINGLE_SIZE = 3
+_PRIME = (1 << 31) - 1
+_SEED = 43
+_CHUNK = 4096
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+metadata = MetaData()
+minhash_signatures = Table(
+    "minhash_signatures", metadata,
+    Column("entity", String(32), primary_key=True),
+    Column("item_id", Integer, primary_key=True),
+    Column("signature", LargeBinary, nullable=False),
+)
+minhash_buckets = Table(
+    "minhash_buckets", metadata,
+    Column("entity", String(32), primary_key=True),
+    Column("bucket", BigInteger, primary_key=True),
+    Column("item_id", Integer, primary_key=True),
+    Index("ix_minhash_buckets_entity_item_id", "entity", "item_id"),
+)
+
+
+def _signature(body, coefficients):
+    import numpy as np
+
+    tokens = _TOKEN_RE.findall(body.lower()) if body else []
+    if len(tokens) <= SHINGLE_SIZE:
+        grams = [tokens] if tokens else []
+    else:
+        grams = (tokens[i:i + SHINGLE_SIZE] for i in range(len(tokens) - SHINGLE_SIZE + 1))
+    values = {zlib.crc32(" ".join(gram).encode("utf-8")) for gram in grams}
+    if not values:
+        return None
+    x = np.fromiter(values, dtype=np.uint64, count=len(values))
+    a, b = coefficients
+    minimums = np.full(NUM_HASHES, _PRIME, dtype=np.uint64)
+    for start in range(0, len(x), _CHUNK):
+        hashed = (a * x[start:start + _CHUNK] + b) % _PRIME
+        np.minimum(minimums, hashed.min(axis=1), out=minimums)
+    return minimums.astype("<u4")
+
+
+def _band_keys(sig):
+    # Band number in the high bits: equal rows in different bands are different buckets
+    return [
+        (band << 32) | zlib.crc32(sig[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND].tobytes())
+        for band in range(BANDS)
+    ]
+
+
+def _index_missing(ctx, entity):
+    """Index rows without a signature; flagging them is left to `duplicates cluster`."""
+    import numpy as np
+
+    rng = np.random.default_rng(_SEED)
+    a = rng.integers(1, _PRIME, NUM_HASHES, dtype=np.uint64)
+    b = rng.integers(0, _PRIME, NUM_HASHES, dtype=np.uint64)
+    coefficients = (a[:, None], b[:, None])
+
+    last_id = 0
+    while True:
+        with ctx.engine.begin() as conn:
+            rows = conn.execute(
+                text(
+                    f"SELECT t.id, t.content FROM {entity} t "
+                    "LEFT JOIN minhash_signatures s ON s.entity = :entity AND s.item_id = t.id "
+                    f"WHERE s.item_id IS NULL AND t.id > :last_id ORDER BY t.id LIMIT {INDEX_BATCH_SIZE}"
+                ),
+                {"entity": entity, "last_id": last_id},
+            ).all()
+            if not rows:
+                return
+            signatures, buckets = [], []
+            for item_id, body in rows:
+                sig = _signature(body, coefficients)
+                if sig is None:
+                    continue
+                signatures.append({"entity": entity, "item_id": item_id, "signature": sig.tobytes()})
+                buckets += [{"entity": entity, "bucket": key, "item_id": item_id} for key in _band_keys(sig)]
+            if signatures:
+                conn.execute(minhash_signatures.insert(), signatures)
+                conn.execute(minhash_buckets.insert(), buckets)
+            last_id = rows[-1][0]
+
+
+def upgrade(ctx):
+    ctx.create_tables(minhash_signatures, minhash_buckets)
+    for table in ENTITIES:
+        ctx.add_column(table, "duplicate_of", Integer())
+        ctx.create_index(f"ix_{table}_duplicate_of", table, ["duplicate_of"])
+    # Index existing bodies so new ones are checked against them; flagging the
+    # existing library is left to `python -m App.cli duplicates cluster`
+    for entity in ENTITIES:
+        _index_missing(ctx, entity)
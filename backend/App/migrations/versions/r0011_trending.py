@@ -0,0 +1,37 @@
+"""Activity rollups and precomputed trending rankings."""
+from sqlalchemy import Column, DateTime, Float, Index, Integer, MetaData, String, Table
+
+revision = "0011"
+description = "activity_hourly, activity_daily and trending_ranks tables"
+
+metadata = MetaData()
+
+
+def _activity(name):
+    return Table(
+        name, metadata,
+        Column("entity", String(32), primary_key=True),
+        Column("bucket_start", DateTime, primary_key=True),
+        Column("item_id", Integer, primary_key=True),
+        Column("likes", Integer, nullable=False),
+        Column("views", Integer, nullable=False),
+    )
+
+
+activity_hourly = _activity("activity_hourly")
+activity_daily = _activity("activity_daily")
+trending_ranks = Table(
+    "trending_ranks", metadata,
+    Column("entity", String(32), primary_key=True),
+    Column("category", String(128), primary_key=True),
+    Column("rank", Integer, primary_key=True),
+    Column("item_id", Integer, nullable=False),
+    Column("score", Float, nullable=False),
+    Column("computed_at", DateTime, nullable=False),
+    Index("ix_trending_ranks_entity_category_item_id", "entity", "category", "item_id"),
+)
+
+
+def upgrade(ctx):
+    # Filled by `python -m App.cli trending refresh`; the first run rolls up all past events
+    ctx.create_tables(activity_hourly, activity_daily, trending_ranks)
@@ -0,0 +1,55 @@
+"""Item-item co-occurrence of likes and precomputed neighbors for recommendations."""
+from sqlalchemy import Column, Float, Integer, MetaData, String, Table
+
+revision = "0012"
+description = "like_cooccurrence, item_neighbors and item_neighbors_stale tables"
+
+# entity -> (like table, item column of the like table)
+LIKES = {
+    "prompts": ("liked_prompts", "prompt_id"),
+    "tools": ("liked_tools", "tool_id"),
+    "agents": ("liked_agents", "agent_id"),
+}
+
+metadata = MetaData()
+like_cooccurrence = Table(
+    "like_cooccurrence", metadata,
+    Column("entity", String(32), primary_key=True),
+    Column("item_id", Integer, primary_key=True),
+    Column("other_id", Integer, primary_key=True),
+    Column("count", Integer, nullable=False),
+)
+item_neighbors = Table(
+    "item_neighbors", metadata,
+    Column("entity", String(32), primary_key=True),
+    Column("item_id", Integer, primary_key=True),
+    Column("neighbor_id", Integer, primary_key=True),
+    Column("score", Float, nullable=False),
+)
+item_neighbors_stale = Table(
+    "item_neighbors_stale", metadata,
+    Column("entity", String(32), primary_key=True),
+    Column("item_id", Integer, primary_key=True),
+)
+
+
+def upgrade(ctx):
+    ctx.create_tables(like_cooccurrence, item_neighbors, item_neighbors_stale)
+    # Likes from now on update the matrix incrementally, so it must start complete.
+    # Every liked item is left stale: `recommendations refresh` computes the neighbors
+    for entity, (like_table, column) in LIKES.items():
+        ctx.execute("DELETE FROM like_cooccurrence WHERE entity = :entity", entity=entity)
+        ctx.execute("DELETE FROM item_neighbors WHERE entity = :entity", entity=entity)
+        ctx.execute("DELETE FROM item_neighbors_stale WHERE entity = :entity", entity=entity)
+        # Self-join on user: every pair of items a user liked, the diagonal included
+        ctx.execute(
+            "INSERT INTO like_cooccurrence (entity, item_id, other_id, count) "
+            f"SELECT :entity, a.{column}, b.{column}, COUNT(*) FROM {like_table} a "
+            f"JOIN {like_table} b ON b.user_id = a.user_id GROUP BY a.{column}, b.{column}",
+            entity=entity,
+        )
+        ctx.execute(
+            "INSERT INTO item_neighbors_stale (entity, item_id) "
+            "SELECT entity, item_id FROM like_cooccurrence WHERE entity = :entity AND other_id = item_id",
+            entity=entity,
+        )
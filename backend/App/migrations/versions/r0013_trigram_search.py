@@ -0,0 +1,79 @@
+"""Trigram indexes for fuzzy ?search=: pg_trgm GIN indexes on Postgres, search_trigrams elsewhere."""
+import json
+import re
+
+from sqlalchemy import Column, Index, Integer, MetaData, String, Table, text
+
+revision = "0013"
+description = "pg_trgm GIN indexes (Postgres) / search_trigrams posting table (SQLite)"
+
+# entity (table) -> fields searched
+FIELDS = {
+    "prompts": ("title", "description", "category", "tags"),
+    "tools": ("title", "description", "language", "tags"),
+    "agents": ("title", "description", "tags"),
+}
+INDEX_BATCH_SIZE = 500
+
+# pg_trgm's word characters: letters and digits only
+_WORD_RE = re.compile(r"[^\W_]+")
+
+metadata = MetaData()
+search_trigrams = Table(
+    "search_trigrams", metadata,
+    Column("entity", String(32), primary_key=True),
+    Column("trigram", String(16), primary_key=True),
+    Column("item_id", Integer, primary_key=True),
+    Index("ix_search_trigrams_entity_item_id", "entity", "item_id"),
+)
+
+
+def _trigrams(value) -> set[str]:
+    if value is None:
+        return set()
+    grams = set()
+    for word in _WORD_RE.findall(str(value).lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _index(ctx, entity, fields):
+    ctx.execute("DELETE FROM search_trigrams WHERE entity = :entity", entity=entity)
+    last_id = 0
+    while True:
+        with ctx.engine.begin() as conn:
+            rows = conn.execute(
+                text(
+                    f"SELECT id, {', '.join(fields)} FROM {entity} "
+                    f"WHERE id > :last_id ORDER BY id LIMIT {INDEX_BATCH_SIZE}"
+                ),
+                {"last_id": last_id},
+            ).all()
+            if not rows:
+                return
+            postings = []
+            for row in rows:
+                values = dict(zip(fields, row[1:]))
+                if values.get("tags"):
+                    # Raw JSON text here; the tags are searched as space-separated words
+                    tags = json.loads(values["tags"])
+                    values["tags"] = " ".join(str(tag) for tag in tags) if isinstance(tags, list) else tags
+                grams = set().union(*(_trigrams(value) for value in values.values()))
+                postings += [{"entity": entity, "trigram": gram, "item_id": row[0]} for gram in grams]
+            if postings:
+                conn.execute(search_trigrams.insert(), postings)
+            last_id = rows[-1][0]
+
+
+def upgrade(ctx):
+    ctx.create_tables(search_trigrams)
+    if ctx.dialect == "postgresql":
+        ctx.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for table, fields in FIELDS.items():
+            for field in fields:
+                column = "(tags::text)" if field == "tags" else field
+                ctx.create_index(f"ix_{table}_{field}_trgm", table, [f"{column} gin_trgm_ops"], using="gin")
+        return
+    for entity, fields in FIELDS.items():
+        _index(ctx, entity, fields)
@@ -0,0 +1,42 @@
+"""Persistent agent conversations: conversations and their append-only message log."""
+from sqlalchemy import (
+    JSON, Column, DateTime, ForeignKey, Integer, MetaData, String, Table, Text, UniqueConstraint, func,
+)
+
+revision = "0014"
+description = "conversations and conversation_messages tables"
+
+metadata = MetaData()
+for referenced in ("agents", "users"):
+    Table(referenced, metadata, Column("id", Integer, primary_key=True))
+
+conversations = Table(
+    "conversations", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("agent_id", Integer, ForeignKey("agents.id"), nullable=False, index=True),
+    Column("user_id", Integer, ForeignKey("users.id"), nullable=False, index=True),
+    Column("title", String(256)),
+    Column("state", JSON),
+    Column("message_count", Integer, nullable=False),
+    Column("summary", Text),
+    Column("summary_seq", Integer, nullable=False),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+    Column("updated_at", DateTime(timezone=True)),
+)
+conversation_messages = Table(
+    "conversation_messages", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("conversation_id", Integer, ForeignKey("conversations.id"), nullable=False),
+    Column("seq", Integer, nullable=False),
+    Column("role", String(16), nullable=False),
+    Column("author", String(256), nullable=False),
+    Column("content", Text, nullable=False),
+    Column("event", JSON, nullable=False),
+    Column("tokens", Integer, nullable=False),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+    UniqueConstraint("conversation_id", "seq", name="uq_conversation_messages_seq"),
+)
+
+
+def upgrade(ctx):
+    ctx.create_tables(conversations, conversation_messages)
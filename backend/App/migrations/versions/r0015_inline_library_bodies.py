@@ -0,0 +1,14 @@
+"""Library prompts and tools keep their bodies inline only: drop their blob references."""
+
+revision = "0015"
+description = "content_blobs refcounts from agent children only"
+
+
+def upgrade(ctx):
+    # r0008 counted prompts and tools as well; only agent children hold blobs now
+    ctx.execute(
+        "UPDATE content_blobs SET refcount = "
+        "(SELECT COUNT(*) FROM agent_tools WHERE agent_tools.code_hash = content_blobs.hash) + "
+        "(SELECT COUNT(*) FROM agent_prompts WHERE agent_prompts.content_hash = content_blobs.hash)"
+    )
+    ctx.execute("DELETE FROM content_blobs WHERE refcount <= 0")
@@ -0,0 +1,31 @@
+"""Clear profile_image values that are neither media references nor short URLs, then bound the column."""
+import logging
+
+from sqlalchemy import text
+
+revision = "0016"
+description = "users.profile_image cleanup and VARCHAR(256)"
+
+logger = logging.getLogger(__name__)
+# users.profile_image length (core/media.MAX_REF_LENGTH) when this was written
+MAX_REF_LENGTH = 256
+
+
+def upgrade(ctx):
+    # Data URLs r0009 could not convert, and anything media.to_ref() now rejects
+    with ctx.engine.begin() as conn:
+        cleared = conn.execute(
+            text(
+                "UPDATE users SET profile_image = '' "
+                "WHERE profile_image IS NOT NULL AND profile_image <> '' "
+                "AND profile_image NOT LIKE 'media:%' "
+                "AND NOT ((profile_image LIKE 'http://%' OR profile_image LIKE 'https://%') "
+                "AND LENGTH(profile_image) <= :limit)"
+            ),
+            {"limit": MAX_REF_LENGTH},
+        ).rowcount
+    if cleared:
+        logger.warning("Cleared %s profile image(s) that were not media references or URLs", cleared)
+    # SQLite doesn't enforce VARCHAR lengths; Postgres databases created before 0009 have an unbounded column
+    if ctx.dialect == "postgresql":
+        ctx.execute(f"ALTER TABLE users ALTER COLUMN profile_image TYPE VARCHAR({MAX_REF_LENGTH})")
@@ -1,8 +1,9 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, func,ForeignKey, Float, Boolean, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Text, DateTime, func,ForeignKey, Float, Boolean, UniqueConstraint, Index, LargeBinary, BigInteger
 from .database import Base
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from sqlalchemy import JSON
+import zlib
 
 class User(Base):
     __tablename__ = "users"
@@ -14,7 +15,8 @@ class User(Base):
     bio = Column(String, default="")
     website = Column(String, default="")
     joined_date = Column(DateTime(timezone=True), server_default=func.now())
-    profile_image = Column(String, default="")
+    # "media:<key>" reference into core/media (or a legacy external URL), never the image itself
+    profile_image = Column(String(256), default="")
     prompts = relationship("Prompt", back_populates="creator")
     tools = relationship("Tool", back_populates="creator")
 
@@ -31,8 +33,14 @@ class Prompt(Base):
     views = Column(Integer, default=0)
     downloads = Column(String(64), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Row version for ETag / Last-Modified; set client-side for sub-second precision
+    updated_at = Column(DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)
     created_by = Column(Integer, ForeignKey("users.id"), nullable=False)
     creator_name = Column(String(256), nullable=True)
+    # SHA-256 of content, see services/blob_service
+    content_hash = Column(String(64), nullable=True, index=True)
+    # Older prompt with a near-identical body, see services/duplicate_service
+    duplicate_of = Column(Integer, nullable=True, index=True)
     creator = relationship("User", back_populates="prompts")
 
 
@@ -51,8 +59,11 @@ class Tool(Base):
     views = Column(Integer, default=0)
     instructions = Column(JSON, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)
     created_by = Column(Integer, ForeignKey("users.id"), nullable=False)
     creator_name = Column(String(256), nullable=True)
+    content_hash = Column(String(64), nullable=True, index=True)
+    duplicate_of = Column(Integer, nullable=True, index=True)
     creator = relationship("User", back_populates="tools")
 
 class LikedPrompt(Base):
@@ -122,6 +133,7 @@ class Agent(Base):
     views = Column(Integer, default=0)
 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)
     created_by = Column(Integer, ForeignKey("users.id"), nullable=False)
     creator_name = Column(String(256), nullable=True)
 
@@ -136,7 +148,9 @@ class AgentTool(Base):
     agent_id = Column(Integer, ForeignKey("agents.id"), nullable=False)
     name = Column(String(256), nullable=False)
     description = Column(Text, nullable=True)
+    # Only set until the row is flushed; the body then lives in content_blobs
     code = Column(Text, nullable=True)
+    code_hash = Column(String(64), nullable=True, index=True)
     enabled = Column(Boolean, default=True)
     tool_id = Column(Integer, ForeignKey("tools.id"), nullable=True)
 
@@ -145,6 +159,9 @@ class AgentTool(Base):
 
     agent = relationship("Agent", back_populates="tools")
     tool = relationship("Tool")
+    code_blob = relationship(
+        "ContentBlob", primaryjoin="foreign(AgentTool.code_hash) == ContentBlob.hash", viewonly=True
+    )
 
     @property
     def display_name(self):
@@ -156,7 +173,9 @@ class AgentTool(Base):
 
     @property
     def display_code(self):
-        return self.tool.content if self.tool else self.code
+        if self.tool:
+            return self.tool.content
+        return self.code_blob.text if self.code_blob else self.code
 
 class AgentPrompt(Base):
     __tablename__ = "agent_prompts"
@@ -164,7 +183,9 @@ class AgentPrompt(Base):
     id = Column(Integer, primary_key=True)
     agent_id = Column(Integer, ForeignKey("agents.id"), nullable=False)
     order = Column(Integer, nullable=False)
+    # Like AgentTool.code: emptied on flush in favour of content_hash
     content = Column(Text, nullable=True)
+    content_hash = Column(String(64), nullable=True, index=True)
     prompt_id = Column(Integer, ForeignKey("prompts.id"), nullable=True)
 
     role = Column(String(64), default="user")
@@ -174,6 +195,18 @@ class AgentPrompt(Base):
 
     agent = relationship("Agent", back_populates="prompts")
     prompt = relationship("Prompt")
+    content_blob = relationship(
+        "ContentBlob", primaryjoin="foreign(AgentPrompt.content_hash) == ContentBlob.hash", viewonly=True
+    )
+
+    @property
+    def display_content(self):
+        # Cloned agents only keep prompt_id, so fall back to the library prompt
+        if self.content_blob:
+            return self.content_blob.text
+        if self.content is not None:
+            return self.content
+        return self.prompt.content if self.prompt else None
 
 class AgentRun(Base):
     __tablename__ = "agent_runs"
@@ -188,6 +221,34 @@ class AgentRun(Base):
     status = Column(String(32), default="completed")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    llm_calls = relationship("LLMCall", back_populates="agent_run")
+
+
+class LLMCall(Base):
+    """One model run (ai.py, tool runner, agent run/test) and what it cost."""
+    __tablename__ = "llm_calls"
+
+    id = Column(Integer, primary_key=True)
+    agent_run_id = Column(Integer, ForeignKey("agent_runs.id"), nullable=True, index=True)
+    agent_id = Column(Integer, ForeignKey("agents.id"), nullable=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
+
+    source = Column(String(64), nullable=False)
+    model = Column(String(128), nullable=False)
+    prompt_tokens = Column(Integer, nullable=True)
+    completion_tokens = Column(Integer, nullable=True)
+    total_tokens = Column(Integer, nullable=True)
+    cost_usd = Column(Float, nullable=True)
+
+    ttft_ms = Column(Float, nullable=True)
+    latency_ms = Column(Float, nullable=False)
+    retries = Column(Integer, default=0)
+    status = Column(String(16), default="ok")
+    error_class = Column(String(128), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+    agent_run = relationship("AgentRun", back_populates="llm_calls")
+
 class CommunityDiscussion(Base):
     __tablename__ = "community_discussions"
 
@@ -269,3 +330,180 @@ class CommunityGroupMessage(Base):
 
     user = relationship("User")
 
+    # History pages and reconnect catch-up are keyset scans on (group_id, id)
+    __table_args__ = (Index("ix_group_messages_group_id_id", "group_id", "id"),)
+
+class UserStats(Base):
+    __tablename__ = "user_stats"
+
+    # One row per user, kept current by the write paths in services/stats_service
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    total_prompts = Column(Integer, nullable=False, default=0)
+    total_tools = Column(Integer, nullable=False, default=0)
+    total_agents = Column(Integer, nullable=False, default=0)
+    total_likes = Column(Integer, nullable=False, default=0)
+    total_views = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class EntityVersion(Base):
+    __tablename__ = "entity_versions"
+
+    # Table-level change counter per catalog entity ("prompts", "tools", "agents"),
+    # bumped on every committed write; see services/version_service
+    entity = Column(String(32), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+class ContentBlob(Base):
+    """One stored copy of a prompt/tool body, shared by every row with the same SHA-256."""
+    __tablename__ = "content_blobs"
+
+    hash = Column(String(64), primary_key=True)
+    size = Column(Integer, nullable=False)  # uncompressed UTF-8 bytes
+    compression = Column(String(16), nullable=True)  # "zlib" or NULL
+    data = Column(LargeBinary, nullable=False)
+    # Rows pointing at this blob; kept by services/blob_service, deleted at 0
+    refcount = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    @staticmethod
+    def decode(data: bytes, compression) -> str:
+        if compression == "zlib":
+            data = zlib.decompress(data)
+        return data.decode("utf-8")
+
+    @property
+    def text(self) -> str:
+        return self.decode(self.data, self.compression)
+
+
+class MinHashSignature(Base):
+    """MinHash of a prompt/tool body; see services/duplicate_service."""
+    __tablename__ = "minhash_signatures"
+
+    entity = Column(String(32), primary_key=True)  # "prompts" or "tools"
+    item_id = Column(Integer, primary_key=True)
+    signature = Column(LargeBinary, nullable=False)
+
+
+class MinHashBucket(Base):
+    """LSH band buckets of the signatures; items sharing a bucket are duplicate candidates."""
+    __tablename__ = "minhash_buckets"
+
+    entity = Column(String(32), primary_key=True)
+    bucket = Column(BigInteger, primary_key=True)
+    item_id = Column(Integer, primary_key=True)
+    __table_args__ = (Index("ix_minhash_buckets_entity_item_id", "entity", "item_id"),)
+
+
+class HourlyActivity(Base):
+    """Likes and views per catalog item per hour, rolled up by services/trending_service."""
+    __tablename__ = "activity_hourly"
+
+    entity = Column(String(32), primary_key=True)  # "prompts", "tools" or "agents"
+    bucket_start = Column(DateTime, primary_key=True)  # UTC, truncated to the hour
+    item_id = Column(Integer, primary_key=True)
+    likes = Column(Integer, nullable=False, default=0)
+    views = Column(Integer, nullable=False, default=0)
+
+
+class DailyActivity(Base):
+    """Same as HourlyActivity per UTC day; kept longer than the hourly rows."""
+    __tablename__ = "activity_daily"
+
+    entity = Column(String(32), primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    item_id = Column(Integer, primary_key=True)
+    likes = Column(Integer, nullable=False, default=0)
+    views = Column(Integer, nullable=False, default=0)
+
+
+class TrendingRank(Base):
+    """Precomputed top items by time-decayed activity, overall (category "") and per category."""
+    __tablename__ = "trending_ranks"
+
+    entity = Column(String(32), primary_key=True)
+    category = Column(String(128), primary_key=True)  # lowercased; "" is the overall ranking
+    rank = Column(Integer, primary_key=True)
+    item_id = Column(Integer, nullable=False)
+    score = Column(Float, nullable=False)
+    computed_at = Column(DateTime, nullable=False)
+    __table_args__ = (Index("ix_trending_ranks_entity_category_item_id", "entity", "category", "item_id"),)
+
+
+class LikeCooccurrence(Base):
+    """
+    Sparse item x item matrix of users who liked both items (per entity); the
+    diagonal (item_id == other_id) holds an item's like count. Kept by
+    services/recommendation_service.
+    """
+    __tablename__ = "like_cooccurrence"
+
+    entity = Column(String(32), primary_key=True)
+    item_id = Column(Integer, primary_key=True)
+    other_id = Column(Integer, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class ItemNeighbor(Base):
+    """Top co-liked items per item (cosine over like_cooccurrence), read by recommendations."""
+    __tablename__ = "item_neighbors"
+
+    entity = Column(String(32), primary_key=True)
+    item_id = Column(Integer, primary_key=True)
+    neighbor_id = Column(Integer, primary_key=True)
+    score = Column(Float, nullable=False)
+
+
+class StaleNeighbors(Base):
+    """Items whose like_cooccurrence row changed since their neighbors were computed."""
+    __tablename__ = "item_neighbors_stale"
+
+    entity = Column(String(32), primary_key=True)
+    item_id = Column(Integer, primary_key=True)
+
+
+class TrigramPosting(Base):
+    """Trigram -> item postings for fuzzy ?search= on SQLite; see services/fuzzy_service."""
+    __tablename__ = "search_trigrams"
+
+    entity = Column(String(32), primary_key=True)
+    trigram = Column(String(16), primary_key=True)
+    item_id = Column(Integer, primary_key=True)
+    __table_args__ = (Index("ix_search_trigrams_entity_item_id", "entity", "item_id"),)
+
+
+class Conversation(Base):
+    """A persisted multi-turn chat with an agent (an ADK session); see services/conversation_service."""
+    __tablename__ = "conversations"
+
+    id = Column(Integer, primary_key=True)
+    agent_id = Column(Integer, ForeignKey("agents.id"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    title = Column(String(256), nullable=True)
+
+    state = Column(JSON, nullable=True)  # ADK session state
+    message_count = Column(Integer, nullable=False, default=0)
+    summary = Column(Text, nullable=True)
+    summary_seq = Column(Integer, nullable=False, default=0)  # messages up to this seq are in the summary
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    agent = relationship("Agent")
+
+
+class ConversationMessage(Base):
+    """Append-only log of a conversation's ADK events, numbered 1, 2, ... by seq."""
+    __tablename__ = "conversation_messages"
+
+    id = Column(Integer, primary_key=True)
+    conversation_id = Column(Integer, ForeignKey("conversations.id"), nullable=False)
+    seq = Column(Integer, nullable=False)
+    role = Column(String(16), nullable=False)  # user | model | tool
+    author = Column(String(256), nullable=False)
+    content = Column(Text, nullable=False)  # readable text of the event
+    event = Column(JSON, nullable=False)  # the ADK event as JSON
+    tokens = Column(Integer, nullable=False)  # estimated
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    __table_args__ = (UniqueConstraint("conversation_id", "seq", name="uq_conversation_messages_seq"),)
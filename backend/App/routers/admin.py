@@ -0,0 +1,62 @@
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from sqlalchemy.orm import Session
+from .. import models
+from ..database import get_db
+from ..core.auth import get_admin_user
+from ..core import profiling
+from ..services import llm_telemetry
+
+# Admins are the user ids listed in ADMIN_USER_IDS (comma separated)
+router = APIRouter(prefix="/admin", tags=["Admin"])
+
+
+@router.get("/profiler")
+def profiler_status(admin: models.User = Depends(get_admin_user)):
+    return profiling.sampler.status()
+
+
+@router.post("/profiler/start")
+def start_profiler(
+    seconds: float = Query(10, gt=0, le=profiling.MAX_PROFILE_SECONDS),
+    interval_ms: float = Query(10, ge=1, le=1000),
+    admin: models.User = Depends(get_admin_user),
+):
+    if not profiling.sampler.start(seconds, interval_ms / 1000):
+        raise HTTPException(status_code=409, detail="Profiler already running")
+    return profiling.sampler.status()
+
+
+@router.post("/profiler/stop", response_class=PlainTextResponse)
+def stop_profiler(admin: models.User = Depends(get_admin_user)):
+    """Stop early (or fetch the finished run) and return collapsed stacks."""
+    return PlainTextResponse(profiling.sampler.stop(), headers={"Cache-Control": "no-store"})
+
+
+@router.get("/tasks")
+async def dump_tasks(
+    contains: Optional[str] = None,
+    limit: int = Query(30, ge=1, le=200),
+    admin: models.User = Depends(get_admin_user),
+):
+    # async on purpose: asyncio.all_tasks() only works on the loop thread
+    tasks = profiling.task_dump(contains=contains, limit=limit)
+    return {"count": len(tasks), "tasks": tasks}
+
+
+@router.get("/llm-usage")
+def llm_usage(
+    group_by: Literal["agent", "model", "user", "source"] = "model",
+    days: int = Query(7, ge=1, le=365),
+    sort: Literal["cost", "latency", "tokens", "calls"] = "cost",
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db),
+    admin: models.User = Depends(get_admin_user),
+):
+    """Calls, tokens, spend and latency from llm_calls, to find slow or expensive agents."""
+    return {
+        "group_by": group_by,
+        "days": days,
+        "data": llm_telemetry.usage_summary(db, group_by=group_by, days=days, sort=sort, limit=limit),
+    }
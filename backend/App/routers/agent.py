@@ -1,12 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import Optional
+from typing import Literal, Optional
 from typing import List
 from ..database import get_db
 import traceback
+from datetime import datetime
 from .. import schemas, models
-from ..services import agent_service
-from ..core.auth import get_current_user
+from ..services import agent_service, stats_service, catalog_service, version_service, blob_service, similarity_service, trending_service, fuzzy_service, conversation_service, eval_service, import_service
+from ..core.auth import get_current_user, get_optional_user
+from ..core.responses import FastJSONResponse, dumps
+from ..core import http_cache, response_cache
 import uuid
 
 # request_id = uuid.uuid4()
@@ -29,17 +33,37 @@ def create_agent_endpoint(
     )
 
 @router.get("/", response_model=schemas.AgentListResponse)
+@response_cache.cached("agents")
 def list_agents(
+    request: Request,
     search: Optional[str] = Query("", description="Search over title / description / content"),
     tag: Optional[str] = Query("", description="Filter by tag"),
     tools: Optional[str] = Query(None, description="Filter by tools"),
     model: Optional[str] = Query(None, description="Filter by model"),
     page: int = Query(1, ge=1),
     limit: int = 12,
+    fields: Optional[str] = Query(None, description="Extra fields to include: description,system_prompt,instructions"),
+    fuzzy: bool = Query(False, description="Typo-tolerant search by trigram similarity"),
+    threshold: float = Query(
+        fuzzy_service.DEFAULT_THRESHOLD, ge=0.0, le=1.0,
+        description="Share of the search's trigrams a match must contain (fuzzy only)",
+    ),
+    sort: Optional[schemas.ListSort] = Query(
+        None, description="newest (default), trending: ranked by recent likes and views, "
+        "relevance: best match first (default with fuzzy)",
+    ),
     db: Session = Depends(get_db)
 ):
-    query = db.query(models.Agent)
-    if search:
+    etag = http_cache.list_etag(request, "agents", version_service.get_version(db, "agents"))
+    cached = http_cache.not_modified(request, etag, http_cache.LIST_CACHE_CONTROL)
+    if cached:
+        return cached
+
+    query = catalog_service.card_query(db, models.Agent, fields)
+    relevance = None
+    if search and fuzzy:
+        query, relevance = fuzzy_service.fuzzy_filter(db, query, "agents", search, threshold)
+    elif search:
         query = query.filter(
             models.Agent.title.ilike(f"%{search}%") |
             models.Agent.description.ilike(f"%{search}%")
@@ -58,10 +82,17 @@ def list_agents(
     if model:
         query = query.filter(models.Agent.model.ilike(f"%{model}%"))
 
+    if sort == "trending":
+        query = trending_service.order_by_trending(query, "agents")
+    elif relevance is not None and sort != "newest":
+        query = query.order_by(relevance.desc(), models.Agent.created_at.desc())
+    else:
+        query = query.order_by(models.Agent.created_at.desc())
+
     total = query.count()
 
     agents = (
-        query.order_by(models.Agent.created_at.desc())
+        query
         .offset((page - 1) * limit)
         .limit(limit)
         .all()
@@ -69,75 +100,65 @@ def list_agents(
 
     total_pages = (total + limit - 1) // limit
 
-    # normalize tags
-    for t in agents:
-        if isinstance(t.tags, str):
-            t.tags = [x.strip() for x in t.tags.split(",") if x.strip()]
-        elif t.tags is None:
-            t.tags = []
-
-    return {"data": agents, "total_pages": total_pages}
+    return FastJSONResponse(
+        {"data": catalog_service.to_cards(agents), "total_pages": total_pages},
+        headers=http_cache.validators(etag, http_cache.LIST_CACHE_CONTROL),
+    )
 
 @router.get("/my", response_model=schemas.AgentListResponse)
 def my_tools(
+    fields: Optional[str] = Query(None, description="Extra fields to include: description,system_prompt,instructions"),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
     agents = (
-        db.query(models.Agent)
+        catalog_service.card_query(db, models.Agent, fields)
         .filter(models.Agent.created_by == current_user.id)
         .order_by(models.Agent.created_at.desc())
         .all()
     )
 
-    # normalize tags
-    for t in agents:
-        if isinstance(t.tags, str):
-            t.tags = [x.strip() for x in t.tags.split(",") if x.strip()]
-        elif t.tags is None:
-            t.tags = []
-
-    return {"data": agents, "total_pages": 1}
+    return FastJSONResponse({"data": catalog_service.to_cards(agents), "total_pages": 1})
 
 @router.get("/liked", response_model=schemas.AgentListResponse)
 def get_liked_agents(
+    fields: Optional[str] = Query(None, description="Extra fields to include: description,system_prompt,instructions"),
     db: Session = Depends(get_db),
     current_user=Depends(get_current_user),
 ):
     liked = (
-        db.query(models.Agent)
+        catalog_service.card_query(db, models.Agent, fields)
         .join(models.LikedAgent, models.LikedAgent.agent_id == models.Agent.id)
         .filter(models.LikedAgent.user_id == current_user.id)
         .order_by(models.LikedAgent.liked_at.desc())
         .all()
     )
-    results = []
-
-    for t in liked:
-        # normalize tags
-        if isinstance(t.tags, str):
-            tags = [x.strip() for x in t.tags.split(",") if x.strip()]
-        else:
-            tags = t.tags or []
-
-        results.append({
-            "id": t.id,
-            "title": t.title,
-            "description": t.description,
-            "system_prompt": t.system_prompt,
-            "tags": tags,
-            "model": t.model,
-            "temperature": t.temperature,
-            "max_tokens": t.max_tokens,
-            "visibility": t.visibility,
-            "likes": t.likes,
-            "views": t.views,
-            "created_at": t.created_at,
-            "created_by": t.created_by,
-            "creator_name": t.creator_name or (t.creator.full_name if t.creator else "")
-        })
-
-    return {"data": results, "total_pages": 1}
+
+    return FastJSONResponse({"data": catalog_service.to_cards(liked), "total_pages": 1})
+
+@router.post("/batch", response_model=schemas.AgentBatchResponse)
+def get_agents_batch(
+    payload: schemas.BatchGetRequest,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """Several agents with their tools and prompts, in request order. No views are counted."""
+    return FastJSONResponse(
+        catalog_service.batch_get(db, models.Agent, payload.ids, viewer_id=current_user.id)
+    )
+
+@router.get("/{agent_id}/similar", response_model=schemas.SimilarAgentListResponse)
+def similar_agents(
+    agent_id: int,
+    limit: int = Query(10, ge=1, le=similarity_service.MAX_SIMILAR),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    agent = db.query(models.Agent).filter(models.Agent.id == agent_id).first()
+    if not agent or (agent.visibility == "private" and agent.created_by != current_user.id):
+        raise HTTPException(status_code=404, detail="Agent not found")
+
+    return FastJSONResponse({"data": similarity_service.similar_cards(db, "agents", agent, limit)})
 
 @router.post("/{agent_id}/like")
 def like_agent(
@@ -158,18 +179,26 @@ def like_agent(
         db.delete(existing_like)
         if agent.likes and agent.likes > 0:
             agent.likes -= 1
+            stats_service.bump(db, agent.created_by, total_likes=-1)
         msg = "Agent unliked"
     else:
         new_like = models.LikedAgent(user_id=current_user.id, agent_id=agent_id)
         db.add(new_like)
         agent.likes = (agent.likes or 0) + 1
+        stats_service.bump(db, agent.created_by, total_likes=1)
         msg = "Agent liked"
 
     db.commit()
     return {"message": msg, "likes": agent.likes}
 
 @router.get("/filters")
-def get_agent_filters(db: Session = Depends(get_db)):
+def get_agent_filters(request: Request, response: Response, db: Session = Depends(get_db)):
+    etag = http_cache.list_etag(request, "agents", version_service.get_version(db, "agents"))
+    cached = http_cache.not_modified(request, etag, http_cache.FILTERS_CACHE_CONTROL)
+    if cached:
+        return cached
+    http_cache.set_validators(response, etag, http_cache.FILTERS_CACHE_CONTROL)
+
     # 1. Tools Used
     # We want to get names of tools that are actually used in agents
     tools_used_raw = (
@@ -210,7 +239,13 @@ def get_agent_filters(db: Session = Depends(get_db)):
 
 
 @router.get("/{agent_id}", response_model=schemas.AgentRead)
-def get_agent(agent_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user),):
+def get_agent(
+    agent_id: int,
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
     agent = db.query(models.Agent).filter(models.Agent.id == agent_id).first()
     if not agent:
         raise HTTPException(status_code=404, detail="Agent not found")
@@ -229,6 +264,7 @@ def get_agent(agent_id: int, db: Session = Depends(get_db), current_user: models
 
         # Increment total agent views
         agent.views = (agent.views or 0) + 1
+        stats_service.bump(db, agent.created_by, total_views=1)
 
         db.commit()
         db.refresh(agent)
@@ -242,6 +278,17 @@ def get_agent(agent_id: int, db: Session = Depends(get_db), current_user: models
     if not agent.creator_name and agent.creator:
         agent.creator_name = agent.creator.full_name
 
+    # Child rows are replaced on update and may resolve through library items
+    etag = http_cache.row_etag(
+        agent,
+        [(t.id, t.tool.updated_at if t.tool else None) for t in agent.tools],
+        [(p.id, p.prompt.updated_at if p.prompt else None) for p in agent.prompts],
+    )
+    cached = http_cache.not_modified(request, etag, http_cache.PRIVATE_DETAIL_CACHE_CONTROL, agent.updated_at)
+    if cached:
+        return cached
+    http_cache.set_validators(response, etag, http_cache.PRIVATE_DETAIL_CACHE_CONTROL, agent.updated_at)
+
     return agent
 
 @router.put("/{agent_id}", response_model=schemas.AgentRead)
@@ -267,9 +314,13 @@ def update_agent(
     agent.max_tokens = payload.max_tokens
     agent.visibility = payload.visibility
     agent.instructions = payload.instructions
+    # Children are replaced below, which the row itself wouldn't notice
+    agent.updated_at = datetime.utcnow()
 
-    # Clear & replace tools
-    db.query(models.AgentTool).filter(models.AgentTool.agent_id == agent.id).delete()
+    # Clear & replace tools (bulk deletes skip the flush hook, so release blobs here)
+    old_tools = db.query(models.AgentTool).filter(models.AgentTool.agent_id == agent.id)
+    blob_service.release(db, [h for (h,) in old_tools.with_entities(models.AgentTool.code_hash)])
+    old_tools.delete()
     for tool in payload.tools:
         db.add(models.AgentTool(
             agent_id=agent.id,
@@ -282,7 +333,9 @@ def update_agent(
         ))
 
     # Clear & replace prompts
-    db.query(models.AgentPrompt).filter(models.AgentPrompt.agent_id == agent.id).delete()
+    old_prompts = db.query(models.AgentPrompt).filter(models.AgentPrompt.agent_id == agent.id)
+    blob_service.release(db, [h for (h,) in old_prompts.with_entities(models.AgentPrompt.content_hash)])
+    old_prompts.delete()
     for prompt in payload.prompts:
         db.add(models.AgentPrompt(
             agent_id=agent.id,
@@ -322,7 +375,15 @@ def delete_agent(
     if not agent:
         raise HTTPException(status_code=404)
 
+    conversation_service.delete_for_agent(db, agent.id)
     db.delete(agent)
+    stats_service.bump(
+        db,
+        agent.created_by,
+        total_agents=-1,
+        total_likes=-(agent.likes or 0),
+        total_views=-(agent.views or 0),
+    )
     db.commit()
     return {"success": True}
 
@@ -352,8 +413,15 @@ def delete_agent(
 #     return {"views": agent.views}
 
 @router.post("/{agent_id}/run")
-async def run_agent(agent_id: int, payload: schemas.AgentRunRequest, db: Session = Depends(get_db)):
-    result = await agent_service.run_agent(db, agent_id, payload.input)
+async def run_agent(
+    agent_id: int,
+    payload: schemas.AgentRunRequest,
+    db: Session = Depends(get_db),
+    current_user: Optional[models.User] = Depends(get_optional_user),
+):
+    result = await agent_service.run_agent(
+        db, agent_id, payload.input, user_id=current_user.id if current_user else None
+    )
     if not result:
         raise HTTPException(status_code=404, detail="Agent not found")
     return result
@@ -361,3 +429,58 @@ async def run_agent(agent_id: int, payload: schemas.AgentRunRequest, db: Session
 @router.post("/test")
 async def test_agent_preview(payload: schemas.AgentTestRequest, db: Session = Depends(get_db)):
     return await agent_service.test_agent(db, payload)
+
+@router.post("/eval")
+async def eval_agent(
+    request: Request,
+    agent_id: Optional[int] = None,
+    concurrency: int = Query(eval_service.DEFAULT_CONCURRENCY, ge=1, le=eval_service.MAX_CONCURRENCY),
+    rate: Optional[float] = Query(None, gt=0, description="Most cases started per minute"),
+    match: Literal["contains", "exact", "regex"] = "contains",
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """
+    Run an agent over an NDJSON dataset (see services/eval_service) and
+    stream one result line per case as it finishes, then a summary line.
+    The agent is ?agent_id= or a {"config": ...} first record.
+    """
+    decoder = import_service.ItemDecoder(gzip=request.headers.get("content-encoding") == "gzip")
+    items, size, complete = [], 0, True
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > eval_service.MAX_DATASET_BYTES:
+            limit_mb = eval_service.MAX_DATASET_BYTES // (1024 * 1024)
+            raise HTTPException(status_code=413, detail=f"Datasets are limited to {limit_mb} MB")
+        items += decoder.feed(chunk)
+        # A config record plus MAX_CASES cases is the most a run takes; parse_dataset reports the rest
+        if len(items) > eval_service.MAX_CASES + 1:
+            complete = False
+            break
+    if complete:
+        items += decoder.feed(b"", final=True)
+    try:
+        config, cases = eval_service.parse_dataset(items, default_match=match)
+    except eval_service.DatasetError as exc:
+        raise HTTPException(status_code=422, detail=exc.errors)
+    if not cases:
+        raise HTTPException(status_code=422, detail="The dataset has no cases")
+
+    if agent_id is not None:
+        agent = db.query(models.Agent).filter(models.Agent.id == agent_id).first()
+        if not agent or (agent.visibility == "private" and agent.created_by != current_user.id):
+            raise HTTPException(status_code=404, detail="Agent not found")
+        resolved = agent_service.resolve_agent(agent)
+    elif config is not None:
+        resolved = agent_service.resolve_config(db, config)
+    else:
+        raise HTTPException(status_code=422, detail="Pass ?agent_id= or a config record")
+
+    # The body streams after get_db's session is closed; resolved holds copies only
+    async def lines():
+        async for record in eval_service.run(
+            resolved, cases, concurrency=concurrency, rate=rate, user_id=current_user.id
+        ):
+            yield dumps(record) + b"\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers={"Cache-Control": "no-store"})
@@ -3,8 +3,8 @@ from sqlalchemy.orm import Session
 from ..database import get_db
 from ..core.auth import get_current_user
 import uuid
-from google.adk.runners import RunConfig
-from ..agents.tool_runner_agent import runner, session_service
+from ..agents.tool_runner_agent import TOOL_RUNNER_MODEL, get_runner, new_run_config
+from ..services import llm_telemetry
 
 router = APIRouter(prefix="/ai", tags=["AI"])
 
@@ -26,6 +26,7 @@ async def generate_installation_steps(payload: dict):
     )
 
     session_id = str(uuid.uuid4())
+    runner, session_service = get_runner()
 
     await session_service.create_session(
         session_id=session_id,
@@ -33,21 +34,23 @@ async def generate_installation_steps(payload: dict):
         user_id="default_user"
     )
 
-    config = RunConfig()
+    config = new_run_config()
     message = UserMessage(user_prompt)
 
     output = ""
 
-    async for ev in runner.run_async(
-        user_id="default_user",
-        session_id=session_id,
-        new_message=message,
-        run_config=config
-    ):
-        if hasattr(ev, "content") and ev.content:
-            for part in ev.content.parts:
-                if hasattr(part, "text"):
-                    output += part.text
+    with llm_telemetry.track("ai.installation_steps", TOOL_RUNNER_MODEL) as call:
+        async for ev in runner.run_async(
+            user_id="default_user",
+            session_id=session_id,
+            new_message=message,
+            run_config=config
+        ):
+            call.observe(ev)
+            if hasattr(ev, "content") and ev.content:
+                for part in ev.content.parts:
+                    if hasattr(part, "text"):
+                        output += part.text
 
     if not output:
         output = "(no output)"
@@ -76,6 +79,7 @@ async def generate_agent_instructions(payload: dict):
     )
 
     session_id = str(uuid.uuid4())
+    runner, session_service = get_runner()
 
     await session_service.create_session(
         session_id=session_id,
@@ -83,21 +87,23 @@ async def generate_agent_instructions(payload: dict):
         user_id="default_user"
     )
 
-    config = RunConfig()
+    config = new_run_config()
     message = UserMessage(user_prompt)
 
     output = ""
 
-    async for ev in runner.run_async(
-        user_id="default_user",
-        session_id=session_id,
-        new_message=message,
-        run_config=config
-    ):
-        if hasattr(ev, "content") and ev.content:
-            for part in ev.content.parts:
-                if hasattr(part, "text"):
-                    output += part.text
+    with llm_telemetry.track("ai.agent_instructions", TOOL_RUNNER_MODEL) as call:
+        async for ev in runner.run_async(
+            user_id="default_user",
+            session_id=session_id,
+            new_message=message,
+            run_config=config
+        ):
+            call.observe(ev)
+            if hasattr(ev, "content") and ev.content:
+                for part in ev.content.parts:
+                    if hasattr(part, "text"):
+                        output += part.text
 
     if not output:
         output = "(no output)"
@@ -0,0 +1,37 @@
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from .. import models
+from ..database import get_db
+from ..core.auth import get_current_user
+from ..services import import_service
+
+router = APIRouter(prefix="/import", tags=["Import"])
+
+
+@router.post("")
+async def bulk_import(
+    request: Request,
+    type: Optional[Literal["prompt", "tool", "agent"]] = None,
+    dedupe: bool = True,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """
+    Import prompts, tools and agents from the raw request body: NDJSON or a
+    JSON array (optionally with Content-Encoding: gzip). Items without a
+    "type" field use ?type=. The body is parsed and written as it streams
+    in; the response reports per-item errors and skipped duplicates.
+    """
+    decoder = import_service.ItemDecoder(gzip=request.headers.get("content-encoding") == "gzip")
+    importer = import_service.BulkImporter(db, current_user, default_type=type, dedupe=dedupe)
+
+    async for chunk in request.stream():
+        items = decoder.feed(chunk)
+        if items:
+            # Validation and chunked INSERTs are blocking work
+            await run_in_threadpool(importer.add_many, items)
+
+    await run_in_threadpool(importer.add_many, decoder.feed(b"", final=True))
+    return await run_in_threadpool(importer.finish)
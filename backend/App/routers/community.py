@@ -1,10 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from typing import List, Optional
 
 from ..database import get_db
 from .. import models, schemas
 from ..core.auth import get_current_user
+from ..services import group_message_service
 
 router = APIRouter(prefix="/community", tags=["Community"])
 
@@ -324,6 +325,9 @@ def delete_group(
 @router.get("/groups/{group_id}/messages")
 def get_group_messages(
     group_id: int,
+    before_id: Optional[int] = Query(None, description="Return messages older than this id"),
+    after_id: Optional[int] = Query(None, description="Return messages newer than this id"),
+    limit: int = Query(group_message_service.DEFAULT_PAGE_SIZE, ge=1, le=group_message_service.MAX_PAGE_SIZE),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
@@ -335,20 +339,11 @@ def get_group_messages(
     if not member:
         raise HTTPException(403, "Join the group to view messages")
 
-    messages = (
-        db.query(models.CommunityGroupMessage)
-        .filter_by(group_id=group_id)
-        .order_by(models.CommunityGroupMessage.created_at.asc())
-        .all()
+    return group_message_service.fetch_group_messages(
+        db,
+        group_id,
+        before_id=before_id,
+        after_id=after_id,
+        limit=limit,
     )
 
-    return [
-        {
-            "id": m.id,
-            "content": m.content,
-            "user_name": m.user.full_name,
-            "created_at": m.created_at
-        }
-        for m in messages
-    ]
-
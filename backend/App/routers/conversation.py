@@ -0,0 +1,89 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from .. import models, schemas
+from ..core.auth import get_current_user
+from ..database import get_db
+from ..services import agent_service, conversation_service
+
+router = APIRouter(prefix="/conversations", tags=["Conversations"])
+
+
+def _own_conversation(conversation_id: int, db: Session, current_user: models.User) -> models.Conversation:
+    conversation = conversation_service.get(db, conversation_id, current_user.id)
+    if not conversation:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return conversation
+
+
+@router.post("/", response_model=schemas.ConversationRead)
+def create_conversation(
+    payload: schemas.ConversationCreate,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    agent = db.query(models.Agent).filter(models.Agent.id == payload.agent_id).first()
+    if not agent or (agent.visibility == "private" and agent.created_by != current_user.id):
+        raise HTTPException(status_code=404, detail="Agent not found")
+    return conversation_service.create(db, agent, current_user.id, payload.title)
+
+
+@router.get("/", response_model=schemas.ConversationListResponse)
+def list_conversations(
+    agent_id: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    query = db.query(models.Conversation).filter(models.Conversation.user_id == current_user.id)
+    if agent_id is not None:
+        query = query.filter(models.Conversation.agent_id == agent_id)
+    rows = query.order_by(models.Conversation.updated_at.desc(), models.Conversation.id.desc()).limit(limit).all()
+    return {"data": rows}
+
+
+@router.get("/{conversation_id}", response_model=schemas.ConversationRead)
+def get_conversation(
+    conversation_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    return _own_conversation(conversation_id, db, current_user)
+
+
+@router.get("/{conversation_id}/messages", response_model=list[schemas.ConversationMessageRead])
+def list_messages(
+    conversation_id: int,
+    before_seq: Optional[int] = None,
+    after_seq: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    _own_conversation(conversation_id, db, current_user)
+    return conversation_service.fetch_messages(db, conversation_id, before_seq, after_seq, limit)
+
+
+@router.post("/{conversation_id}/messages", response_model=schemas.ConversationTurnResponse)
+async def send_message(
+    conversation_id: int,
+    payload: schemas.ConversationMessageCreate,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    # Only the new message is sent: the history is read from the conversation's log
+    conversation = _own_conversation(conversation_id, db, current_user)
+    return await agent_service.run_conversation_turn(db, conversation, payload.input)
+
+
+@router.delete("/{conversation_id}")
+def delete_conversation(
+    conversation_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    conversation = _own_conversation(conversation_id, db, current_user)
+    conversation_service.delete_conversations(db, [conversation.id])
+    db.commit()
+    return {"success": True}
@@ -0,0 +1,37 @@
+from typing import Literal
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+from .. import models
+from ..core.auth import get_current_user
+from ..services import export_service
+
+router = APIRouter(prefix="/export", tags=["Export"])
+
+
+@router.get("/{entity}")
+def export_library(
+    entity: Literal["prompts", "tools", "agents", "all"],
+    gzip: bool = False,
+    mine: bool = False,
+    current_user: models.User = Depends(get_current_user),
+):
+    """
+    Stream a whole library as NDJSON, one object per line with a "type" field.
+    Agents include their tools and prompts. `all` writes prompts, tools, then agents.
+    """
+    entities = export_service.ENTITIES if entity == "all" else (entity,)
+    filename = f"{entity}.ndjson" + (".gz" if gzip else "")
+
+    return StreamingResponse(
+        export_service.stream_ndjson(
+            entities,
+            created_by=current_user.id if mine else None,
+            viewer_id=current_user.id,
+            compress=gzip,
+        ),
+        media_type="application/gzip" if gzip else "application/x-ndjson",
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "Cache-Control": "no-store",
+        },
+    )
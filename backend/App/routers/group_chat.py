@@ -1,3 +1,5 @@
+import json
+
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 from jose import jwt, JWTError
 from sqlalchemy.orm import Session
@@ -5,6 +7,7 @@ from sqlalchemy.orm import Session
 from ..database import SessionLocal
 from ..core.auth import SECRET_KEY, ALGORITHM
 from .. import models
+from ..services import group_message_service
 
 router = APIRouter()
 
@@ -70,9 +73,39 @@ async def group_chat(websocket: WebSocket, group_id: int):
 
     await manager.connect(group_id, websocket)
 
+    # Reconnect catch-up: clients pass the last message id they saw, either as
+    # ?last_id= on the URL or later as {"type": "resume", "last_id": N}.
+    # The socket is registered before the catch-up query runs, so a message
+    # may arrive both live and in the backlog; clients dedupe by id.
     try:
+        last_id = websocket.query_params.get("last_id")
+        if last_id is not None and last_id.isdigit():
+            await send_missed_messages(websocket, db, group_id, int(last_id))
+
         while True:
-            data = await websocket.receive_json()
+            # A malformed frame gets an error frame back instead of ending the connection
+            try:
+                data = json.loads(await websocket.receive_text())
+            except ValueError:
+                await websocket.send_json({"type": "error", "detail": "Frames must be JSON objects"})
+                continue
+            if not isinstance(data, dict):
+                await websocket.send_json({"type": "error", "detail": "Frames must be JSON objects"})
+                continue
+
+            if data.get("type") == "resume":
+                resume_from = data.get("last_id") or 0
+                if isinstance(resume_from, str) and resume_from.isdigit():
+                    resume_from = int(resume_from)
+                if not isinstance(resume_from, int) or isinstance(resume_from, bool) or resume_from < 0:
+                    await websocket.send_json({"type": "error", "detail": "last_id must be a message id"})
+                    continue
+                await send_missed_messages(websocket, db, group_id, resume_from)
+                continue
+
+            if not isinstance(data.get("content"), str) or not data["content"].strip():
+                await websocket.send_json({"type": "error", "detail": "content must be a non-empty string"})
+                continue
 
             message = models.CommunityGroupMessage(
                 group_id=group_id,
@@ -95,6 +128,34 @@ async def group_chat(websocket: WebSocket, group_id: int):
             )
 
     except WebSocketDisconnect:
-        manager.disconnect(group_id, websocket)
+        pass
     finally:
+        # Whatever ended the handler, the socket must not stay in the room
+        manager.disconnect(group_id, websocket)
         db.close()
+
+
+async def send_missed_messages(websocket: WebSocket, db: Session, group_id: int, last_id: int):
+    """Replay every message after last_id in pages, then mark the catch-up as done."""
+    sent = 0
+    while True:
+        page = group_message_service.fetch_group_messages(
+            db,
+            group_id,
+            after_id=last_id,
+            limit=group_message_service.MAX_PAGE_SIZE,
+        )
+        for m in page:
+            await websocket.send_json({
+                "id": m["id"],
+                "content": m["content"],
+                "user_id": str(m["user_id"]),
+                "user_name": m["user_name"],
+                "created_at": m["created_at"].isoformat() if m["created_at"] else None,
+            })
+            last_id = m["id"]
+        sent += len(page)
+        if len(page) < group_message_service.MAX_PAGE_SIZE:
+            break
+
+    await websocket.send_json({"type": "resumed", "count": sent, "last_id": last_id})
@@ -0,0 +1,25 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse
+
+from ..core import http_cache, media
+
+router = APIRouter(prefix="/media", tags=["Media"])
+
+
+@router.get("/{key}")
+def get_media(key: str, request: Request):
+    """Stored images and thumbnails. Keys are content hashes, so responses never change."""
+    served = media.resolve(key)
+    if served is None:
+        raise HTTPException(status_code=404, detail="Media not found")
+
+    etag = http_cache.make_etag(served)
+    cached = http_cache.not_modified(request, etag, media.MEDIA_CACHE_CONTROL)
+    if cached:
+        return cached
+
+    return FileResponse(
+        media.get_store().path(served),
+        media_type=media.content_type(served),
+        headers=http_cache.validators(etag, media.MEDIA_CACHE_CONTROL),
+    )
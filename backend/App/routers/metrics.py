@@ -0,0 +1,11 @@
+from fastapi import APIRouter, Response
+
+from ..core import metrics
+
+router = APIRouter(tags=["Metrics"])
+
+
+# Prometheus scrape target; not part of the public API docs
+@router.get("/metrics", include_in_schema=False)
+def get_metrics():
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
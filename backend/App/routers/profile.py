@@ -1,10 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException,status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from .. import models, schemas
 from ..database import get_db
+from ..core import media
 from ..core.auth import get_current_user
 from ..schemas import UserResponse,UserProfileUpdate,UserProfile
-from sqlalchemy import func
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
@@ -45,6 +46,12 @@ def update_profile(update: schemas.UserProfileUpdate, db: Session = Depends(get_
                 detail="This email is already registered to another user"
             )
     
+    if 'profile_image' in update_data:
+        try:
+            update_data['profile_image'] = media.to_ref(update_data['profile_image'])
+        except media.InvalidImage as e:
+            raise HTTPException(status_code=_image_error_status(e), detail=str(e))
+
     # Update user fields
     for key, value in update_data.items():
         setattr(user, key, value)
@@ -61,30 +68,40 @@ def update_profile(update: schemas.UserProfileUpdate, db: Session = Depends(get_
     
     return user
 
-@router.get("/stats")
-def user_stats(
+def _image_error_status(error: media.InvalidImage) -> int:
+    if isinstance(error, media.ImageTooLarge):
+        return status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    return status.HTTP_400_BAD_REQUEST
+
+
+@router.put("/profile/image", response_model=UserProfile)
+async def upload_profile_image(
+    request: Request,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: models.User = Depends(get_current_user),
 ):
-    user_id = current_user.id
+    """Raw image bytes as the body (PNG, JPEG, GIF or WebP); thumbnails are made here."""
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > media.MAX_IMAGE_BYTES:
+            raise HTTPException(status_code=413, detail="Image is too large")
 
-    total_prompts = db.query(models.Prompt).filter(models.Prompt.created_by == user_id).count()
-    total_tools = db.query(models.Tool).filter(models.Tool.created_by == user_id).count()
+    try:
+        # Hashing, decoding and resizing are blocking work
+        ref = await run_in_threadpool(media.save_image, bytes(body))
+    except media.InvalidImage as e:
+        raise HTTPException(status_code=_image_error_status(e), detail=str(e))
 
-    total_prompt_likes = db.query(func.sum(models.Prompt.likes)).filter(models.Prompt.created_by == user_id).scalar() or 0
-    total_tool_likes = db.query(func.sum(models.Tool.likes)).filter(models.Tool.created_by == user_id).scalar() or 0
-    total_likes = total_prompt_likes + total_tool_likes
+    def save():
+        user = db.query(models.User).filter(models.User.id == current_user.id).first()
+        user.profile_image = ref
+        db.commit()
+        db.refresh(user)
+        return user
 
-    total_prompt_views = db.query(func.sum(models.Prompt.views)).filter(models.Prompt.created_by == user_id).scalar() or 0
-    total_tool_views = db.query(func.sum(models.Tool.views)).filter(models.Tool.created_by == user_id).scalar() or 0
-    total_views = total_prompt_views + total_tool_views
+    return await run_in_threadpool(save)
 
-    return {
-        "total_prompts": total_prompts,
-        "total_tools": total_tools,
-        "total_likes": total_likes,
-        "total_views": total_views,
-    }
 
 @router.get("/{user_id}", response_model=schemas.UserResponse)
 def get_user_by_id(
@@ -1,8 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException,Query
+from fastapi import APIRouter, Depends, HTTPException,Query, Request, Response
 from sqlalchemy.orm import Session
 from ..database import get_db
 from .. import models, schemas
 from ..core.auth import get_current_user
+from ..core.responses import FastJSONResponse
+from ..core import http_cache, response_cache
+from ..services import stats_service, catalog_service, version_service, similarity_service, duplicate_service, trending_service, fuzzy_service
 from datetime import datetime
 from fastapi import status
 from sqlalchemy import func
@@ -11,8 +14,19 @@ router = APIRouter(prefix="/prompts", tags=["Prompts"])
 
 @router.post("/create", response_model=schemas.PromptResponse)
 def create_prompt(prompt: schemas.PromptCreate,
+    on_duplicate: schemas.OnDuplicate = Query("flag", description="flag: create and set duplicate_of, reject: 409, merge: return the existing prompt"),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),):
+    if on_duplicate != "flag":
+        duplicates = duplicate_service.near_duplicates(db, "prompts", prompt.content)
+        if duplicates and on_duplicate == "reject":
+            raise HTTPException(
+                status_code=409,
+                detail={"message": "A near-identical prompt already exists", "duplicates": duplicates},
+            )
+        if duplicates:
+            return db.get(models.Prompt, duplicates[0]["original_id"])
+
     new_prompt = models.Prompt(
         title=prompt.title,
         description=prompt.description,
@@ -25,26 +39,47 @@ def create_prompt(prompt: schemas.PromptCreate,
         created_by=current_user.id,
     )
     db.add(new_prompt)
+    stats_service.bump(db, current_user.id, total_prompts=1)
     db.commit()
     db.refresh(new_prompt)
     return new_prompt
 
-@router.get("/", response_model=schemas.PromptListResponse)
+@router.get("/", response_model=schemas.PromptCardListResponse)
+@response_cache.cached("prompts")
 def get_all_prompts(
+    request: Request,
     page: int = Query(1, ge=1),
     limit: int = Query(10, ge=1),
     search: str | None = None,
     category: str | None = None,
     model: str | None = None,
     tag: str | None = None,
+    fields: str | None = Query(None, description="Extra fields to include: description,content"),
+    fuzzy: bool = Query(False, description="Typo-tolerant search by trigram similarity"),
+    threshold: float = Query(
+        fuzzy_service.DEFAULT_THRESHOLD, ge=0.0, le=1.0,
+        description="Share of the search's trigrams a match must contain (fuzzy only)",
+    ),
+    sort: schemas.ListSort | None = Query(
+        None, description="newest (default), trending: ranked by recent likes and views, "
+        "relevance: best match first (default with fuzzy)",
+    ),
     db: Session = Depends(get_db)
 ):
+    etag = http_cache.list_etag(request, "prompts", version_service.get_version(db, "prompts"))
+    cached = http_cache.not_modified(request, etag, http_cache.LIST_CACHE_CONTROL)
+    if cached:
+        return cached
+
     skip = (page - 1) * limit
 
-    query = db.query(models.Prompt)
+    query = catalog_service.card_query(db, models.Prompt, fields)
 
     # 🔍 SEARCH FILTER
-    if search:
+    relevance = None
+    if search and fuzzy:
+        query, relevance = fuzzy_service.fuzzy_filter(db, query, "prompts", search, threshold)
+    elif search:
         search_term = f"%{search}%"
         query = query.filter(
             models.Prompt.title.ilike(search_term) |
@@ -66,10 +101,18 @@ def get_all_prompts(
         # Assuming tags are stored as comma-separated strings or JSON text that contains the tag
         query = query.filter(models.Prompt.tags.ilike(f"%{tag}%"))
 
+    if sort == "trending":
+        # The category's own ranking goes deeper than the overall top N
+        query = trending_service.order_by_trending(query, "prompts", category)
+    elif relevance is not None and sort != "newest":
+        query = query.order_by(relevance.desc(), models.Prompt.id.desc())
+    else:
+        query = query.order_by(models.Prompt.id.desc())
+
     total_prompts = query.count()
 
     prompts = (
-        query.order_by(models.Prompt.id.desc())
+        query
         .offset(skip)
         .limit(limit)
         .all()
@@ -77,37 +120,42 @@ def get_all_prompts(
 
     total_pages = (total_prompts + limit - 1) // limit
 
-    # tags conversion
-    for p in prompts:
-        if isinstance(p.tags, list):
-            pass
-        elif isinstance(p.tags, str):
-            p.tags = [t.strip() for t in p.tags.split(",") if t.strip()]
-        else:
-            p.tags = []
-
-    return {"data": prompts, "total_pages": total_pages}
+    return FastJSONResponse(
+        {"data": catalog_service.to_cards(prompts), "total_pages": total_pages},
+        headers=http_cache.validators(etag, http_cache.LIST_CACHE_CONTROL),
+    )
 
 
-@router.get("/my", response_model=schemas.PromptListResponse)
+@router.get("/my", response_model=schemas.PromptCardListResponse)
 def my_prompts(
+    fields: str | None = Query(None, description="Extra fields to include: description,content"),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    prompts = db.query(models.Prompt)\
+    prompts = catalog_service.card_query(db, models.Prompt, fields)\
                 .filter(models.Prompt.created_by == current_user.id)\
                 .order_by(models.Prompt.created_at.desc())\
                 .all()
 
     total_pages = 1  # Since this is "my prompts", no pagination applied
 
-    return {
-        "data": prompts,
+    return FastJSONResponse({
+        "data": catalog_service.to_cards(prompts),
         "total_pages": total_pages
-    }
+    })
+
+@router.post("/batch", response_model=schemas.PromptBatchResponse)
+def get_prompts_batch(payload: schemas.BatchGetRequest, db: Session = Depends(get_db)):
+    """Several prompts by id, in request order. Unlike GET /{id}, no views are counted."""
+    return FastJSONResponse(catalog_service.batch_get(db, models.Prompt, payload.ids))
 
 @router.get("/filters")
-def get_prompt_filters(db: Session = Depends(get_db)):
+def get_prompt_filters(request: Request, response: Response, db: Session = Depends(get_db)):
+    etag = http_cache.list_etag(request, "prompts", version_service.get_version(db, "prompts"))
+    cached = http_cache.not_modified(request, etag, http_cache.FILTERS_CACHE_CONTROL)
+    if cached:
+        return cached
+    http_cache.set_validators(response, etag, http_cache.FILTERS_CACHE_CONTROL)
 
     # 1. UNIQUE CATEGORIES
     categories = (
@@ -152,50 +200,24 @@ def get_prompt_filters(db: Session = Depends(get_db)):
         "models": models_list
     }
 
-@router.get("/liked", response_model=schemas.PromptListResponse)
+@router.get("/liked", response_model=schemas.PromptCardListResponse)
 def liked_prompts(
+    fields: str | None = Query(None, description="Extra fields to include: description,content"),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
     liked = (
-        db.query(models.Prompt)
+        catalog_service.card_query(db, models.Prompt, fields)
         .join(models.LikedPrompt, models.LikedPrompt.prompt_id == models.Prompt.id)
         .filter(models.LikedPrompt.user_id == current_user.id)
         .order_by(models.LikedPrompt.liked_at.desc())
         .all()
     )
 
-    results = []
-
-    for p in liked:
-        # convert tags
-        if isinstance(p.tags, list):
-            tags = p.tags
-        elif isinstance(p.tags, str):
-            tags = [t.strip() for t in p.tags.split(",") if t.strip()]
-        else:
-            tags = p.tags or []
-
-        results.append({
-            "id": p.id,
-            "title": p.title,
-            "description": p.description,
-            "content": p.content,
-            "category": p.category,
-            "tags": tags,
-            "recommended_model": p.recommended_model,
-            "likes": p.likes,
-            "views": p.views,
-            "downloads": p.downloads,
-            "created_at": p.created_at,
-            "created_by": p.created_by,
-            "creator_name": p.creator_name or (p.creator.full_name if p.creator else "")
-        })
-
-    return {
-        "data": results,
+    return FastJSONResponse({
+        "data": catalog_service.to_cards(liked),
         "total_pages": 1
-    }
+    })
 
 
 # ----------------------------------------
@@ -207,6 +229,8 @@ from fastapi import Depends
 @router.get("/{prompt_id}", response_model=schemas.PromptResponse)
 def get_prompt(
     prompt_id: int,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db), 
 ):
     prompt = db.query(models.Prompt).filter(models.Prompt.id == prompt_id).first()
@@ -227,12 +251,31 @@ def get_prompt(
 
         # Increment total prompt views
         prompt.views = (prompt.views or 0) + 1
+        stats_service.bump(db, prompt.created_by, total_views=1)
 
         db.commit()
         db.refresh(prompt)
 
+    etag = http_cache.row_etag(prompt)
+    cached = http_cache.not_modified(request, etag, http_cache.DETAIL_CACHE_CONTROL, prompt.updated_at)
+    if cached:
+        return cached
+    http_cache.set_validators(response, etag, http_cache.DETAIL_CACHE_CONTROL, prompt.updated_at)
+
     return prompt
 
+@router.get("/{prompt_id}/similar", response_model=schemas.SimilarPromptListResponse)
+def similar_prompts(
+    prompt_id: int,
+    limit: int = Query(10, ge=1, le=similarity_service.MAX_SIMILAR),
+    db: Session = Depends(get_db),
+):
+    prompt = db.query(models.Prompt).filter(models.Prompt.id == prompt_id).first()
+    if not prompt:
+        raise HTTPException(status_code=404, detail="Prompt not found")
+
+    return FastJSONResponse({"data": similarity_service.similar_cards(db, "prompts", prompt, limit)})
+
 @router.post("/{prompt_id}/like")
 def like_prompt(
     prompt_id: int,
@@ -253,12 +296,14 @@ def like_prompt(
         db.delete(existing_like)
         if prompt.likes and prompt.likes > 0:
             prompt.likes -= 1
+            stats_service.bump(db, prompt.created_by, total_likes=-1)
         message = "Prompt unliked"
     else:
         # Like
         new_like = models.LikedPrompt(user_id=current_user.id, prompt_id=prompt_id)
         db.add(new_like)
         prompt.likes = (prompt.likes or 0) + 1
+        stats_service.bump(db, prompt.created_by, total_likes=1)
         message = "Prompt liked"
 
     db.commit()
@@ -312,6 +357,13 @@ def delete_prompt(
         raise HTTPException(status_code=403, detail="Not authorized")
 
     db.delete(prompt)
+    stats_service.bump(
+        db,
+        prompt.created_by,
+        total_prompts=-1,
+        total_likes=-(prompt.likes or 0),
+        total_views=-(prompt.views or 0),
+    )
     db.commit()
 
     return {"message": "Prompt deleted successfully", "id": prompt_id}
@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+from .. import models, schemas
+from ..core.auth import get_current_user
+from ..core.responses import FastJSONResponse
+from ..database import get_db
+from ..services import recommendation_service
+
+router = APIRouter(prefix="/users", tags=["Recommendations"])
+
+
+@router.get("/me/recommendations", response_model=schemas.RecommendationsResponse)
+def my_recommendations(
+    limit: int = Query(10, ge=1, le=recommendation_service.MAX_RECOMMENDATIONS),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    # Reads precomputed neighbor lists only (see services/recommendation_service)
+    return FastJSONResponse({
+        entity: recommendation_service.recommend(db, current_user.id, entity, limit)
+        for entity in recommendation_service.ENTITIES
+    })
@@ -0,0 +1,28 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from .. import schemas
+from ..core.responses import FastJSONResponse
+from ..database import get_db
+from ..services import suggest_service
+
+router = APIRouter(prefix="/search", tags=["Search"])
+
+
+@router.get("/suggest", response_model=schemas.SuggestResponse)
+def suggest(
+    q: str = Query("", max_length=200, description="What has been typed so far"),
+    limit: int = Query(8, ge=1, le=suggest_service.MAX_SUGGESTIONS),
+    types: Optional[str] = Query(None, description="Comma-separated subset of: " + ",".join(suggest_service.KINDS)),
+    db: Session = Depends(get_db),
+):
+    kinds = None
+    if types:
+        kinds = {t.strip() for t in types.split(",") if t.strip()}
+        unknown = kinds - set(suggest_service.KINDS)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown suggestion types: {', '.join(sorted(unknown))}")
+    # In-memory lookup; the database is only read to sync every few seconds
+    return FastJSONResponse({"query": q, "data": suggest_service.suggest(db, q, limit, kinds)})
@@ -1,17 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
 from typing import Optional
 from .. import schemas, models
-from google.adk.runners import RunConfig
-from google.adk.runners import Runner
-from google.adk.events import Event, EventActions
-from ..agents.tool_runner_agent import runner, session_service
+from ..agents.tool_runner_agent import TOOL_RUNNER_MODEL, get_runner, new_run_config
 from ..database import get_db
 from ..core.auth import get_current_user
+from ..core.responses import FastJSONResponse
+from ..core import http_cache, response_cache, sandbox
+from ..services import stats_service, catalog_service, version_service, llm_telemetry, similarity_service, duplicate_service, trending_service, fuzzy_service, tool_runtime_service
 from datetime import datetime
 from sqlalchemy import func
-from google.genai import Client
-from google.adk.models.lite_llm import LiteLlm
 import uuid
 
 router = APIRouter(prefix="/tools", tags=["Tools"])
@@ -22,9 +20,20 @@ router = APIRouter(prefix="/tools", tags=["Tools"])
 @router.post("/create", response_model=schemas.ToolResponse)
 def create_tool(
     tool: schemas.ToolCreate,
+    on_duplicate: schemas.OnDuplicate = Query("flag", description="flag: create and set duplicate_of, reject: 409, merge: return the existing tool"),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
+    if on_duplicate != "flag":
+        duplicates = duplicate_service.near_duplicates(db, "tools", tool.content)
+        if duplicates and on_duplicate == "reject":
+            raise HTTPException(
+                status_code=409,
+                detail={"message": "A near-identical tool already exists", "duplicates": duplicates},
+            )
+        if duplicates:
+            return db.get(models.Tool, duplicates[0]["original_id"])
+
     new_tool = models.Tool(
         title=tool.title,
         description=tool.description,
@@ -39,6 +48,7 @@ def create_tool(
         creator_name=current_user.full_name
     )
     db.add(new_tool)
+    stats_service.bump(db, current_user.id, total_tools=1)
     db.commit()
     db.refresh(new_tool)
     return new_tool
@@ -47,20 +57,40 @@ def create_tool(
 # ----------------------------------------------------------------------
 #  LIST ALL TOOLS
 # ----------------------------------------------------------------------
-@router.get("/", response_model=schemas.ToolListResponse)
+@router.get("/", response_model=schemas.ToolCardListResponse)
+@response_cache.cached("tools")
 def list_all_tools(
+    request: Request,
     search: Optional[str] = Query("", description="Search over title / description / content"),
     tag: Optional[str] = Query("", description="Filter by tag"),
     language: Optional[str] = Query(None, description="Filter by language"),
     model: Optional[str] = Query(None, description="Filter by recommended model"),
     page: int = Query(1, ge=1),
     limit: int = 12,
+    fields: Optional[str] = Query(None, description="Extra fields to include: description,content,instructions"),
+    fuzzy: bool = Query(False, description="Typo-tolerant search by trigram similarity"),
+    threshold: float = Query(
+        fuzzy_service.DEFAULT_THRESHOLD, ge=0.0, le=1.0,
+        description="Share of the search's trigrams a match must contain (fuzzy only)",
+    ),
+    sort: Optional[schemas.ListSort] = Query(
+        None, description="newest (default), trending: ranked by recent likes and views, "
+        "relevance: best match first (default with fuzzy)",
+    ),
     db: Session = Depends(get_db)
 ):
-    query = db.query(models.Tool)
+    etag = http_cache.list_etag(request, "tools", version_service.get_version(db, "tools"))
+    cached = http_cache.not_modified(request, etag, http_cache.LIST_CACHE_CONTROL)
+    if cached:
+        return cached
+
+    query = catalog_service.card_query(db, models.Tool, fields)
 
     # 🔍 Search
-    if search:
+    relevance = None
+    if search and fuzzy:
+        query, relevance = fuzzy_service.fuzzy_filter(db, query, "tools", search, threshold)
+    elif search:
         query = query.filter(
             models.Tool.title.ilike(f"%{search}%") |
             models.Tool.description.ilike(f"%{search}%") |
@@ -80,10 +110,17 @@ def list_all_tools(
     if model:
         query = query.filter(models.Tool.recommended_model.ilike(f"%{model}%"))
 
+    if sort == "trending":
+        query = trending_service.order_by_trending(query, "tools", language)
+    elif relevance is not None and sort != "newest":
+        query = query.order_by(relevance.desc(), models.Tool.created_at.desc())
+    else:
+        query = query.order_by(models.Tool.created_at.desc())
+
     total = query.count()
 
     tools = (
-        query.order_by(models.Tool.created_at.desc())
+        query
         .offset((page - 1) * limit)
         .limit(limit)
         .all()
@@ -91,84 +128,49 @@ def list_all_tools(
 
     total_pages = (total + limit - 1) // limit
 
-    # normalize tags
-    for t in tools:
-        if isinstance(t.tags, str):
-            t.tags = [x.strip() for x in t.tags.split(",") if x.strip()]
-        elif t.tags is None:
-            t.tags = []
-
-    return {"data": tools, "total_pages": total_pages}
+    return FastJSONResponse(
+        {"data": catalog_service.to_cards(tools), "total_pages": total_pages},
+        headers=http_cache.validators(etag, http_cache.LIST_CACHE_CONTROL),
+    )
 
 
 # ----------------------------------------------------------------------
 #  GET MY TOOLS
 # ----------------------------------------------------------------------
-@router.get("/my", response_model=schemas.ToolListResponse)
+@router.get("/my", response_model=schemas.ToolCardListResponse)
 def my_tools(
+    fields: Optional[str] = Query(None, description="Extra fields to include: description,content,instructions"),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
     tools = (
-        db.query(models.Tool)
+        catalog_service.card_query(db, models.Tool, fields)
         .filter(models.Tool.created_by == current_user.id)
         .order_by(models.Tool.created_at.desc())
         .all()
     )
 
-    # normalize tags
-    for t in tools:
-        if isinstance(t.tags, str):
-            t.tags = [x.strip() for x in t.tags.split(",") if x.strip()]
-        elif t.tags is None:
-            t.tags = []
-
-    return {"data": tools, "total_pages": 1}
+    return FastJSONResponse({"data": catalog_service.to_cards(tools), "total_pages": 1})
 
 
 # ----------------------------------------------------------------------
 #  GET LIKED TOOLS
 # ----------------------------------------------------------------------
-@router.get("/liked", response_model=schemas.ToolListResponse)
+@router.get("/liked", response_model=schemas.ToolCardListResponse)
 def liked_tools(
+    fields: Optional[str] = Query(None, description="Extra fields to include: description,content,instructions"),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
     liked = (
-        db.query(models.Tool)
+        catalog_service.card_query(db, models.Tool, fields)
         .join(models.LikedTool, models.LikedTool.tool_id == models.Tool.id)
         .filter(models.LikedTool.user_id == current_user.id)
         .order_by(models.LikedTool.liked_at.desc())
         .all()
     )
 
-    results = []
-
-    for t in liked:
-        # normalize tags
-        if isinstance(t.tags, str):
-            tags = [x.strip() for x in t.tags.split(",") if x.strip()]
-        else:
-            tags = t.tags or []
-
-        results.append({
-            "id": t.id,
-            "title": t.title,
-            "description": t.description,
-            "content": t.content,
-            "tags": tags,
-            "recommended_model": t.recommended_model,
-            "language": t.language,
-            "version": t.version,
-            "instructions": t.instructions,
-            "likes": t.likes,
-            "views": t.views,
-            "created_at": t.created_at,
-            "created_by": t.created_by,
-            "creator_name": t.creator_name or (t.creator.full_name if t.creator else "")
-        })
-
-    return {"data": results, "total_pages": 1}
+    return FastJSONResponse({"data": catalog_service.to_cards(liked), "total_pages": 1})
 
 
 # ----------------------------------------------------------------------
@@ -193,21 +195,52 @@ def like_tool(
         db.delete(existing_like)
         if tool.likes and tool.likes > 0:
             tool.likes -= 1
+            stats_service.bump(db, tool.created_by, total_likes=-1)
         msg = "Tool unliked"
     else:
         new_like = models.LikedTool(user_id=current_user.id, tool_id=tool_id)
         db.add(new_like)
         tool.likes = (tool.likes or 0) + 1
+        stats_service.bump(db, tool.created_by, total_likes=1)
         msg = "Tool liked"
 
     db.commit()
     return {"message": msg, "likes": tool.likes}
 
+# ----------------------------------------------------------------------
+#  BATCH GET
+# ----------------------------------------------------------------------
+@router.post("/batch", response_model=schemas.ToolBatchResponse)
+def get_tools_batch(payload: schemas.BatchGetRequest, db: Session = Depends(get_db)):
+    """Several tools by id, in request order. Unlike GET /{id}, no views are counted."""
+    return FastJSONResponse(catalog_service.batch_get(db, models.Tool, payload.ids))
+
+# ----------------------------------------------------------------------
+#  SIMILAR TOOLS
+# ----------------------------------------------------------------------
+@router.get("/{tool_id}/similar", response_model=schemas.SimilarToolListResponse)
+def similar_tools(
+    tool_id: int,
+    limit: int = Query(10, ge=1, le=similarity_service.MAX_SIMILAR),
+    db: Session = Depends(get_db),
+):
+    tool = db.query(models.Tool).filter(models.Tool.id == tool_id).first()
+    if not tool:
+        raise HTTPException(status_code=404, detail="Tool not found")
+
+    return FastJSONResponse({"data": similarity_service.similar_cards(db, "tools", tool, limit)})
+
 # ----------------------------------------------------------------------
 #  TOOL FILTERS
 # ----------------------------------------------------------------------
 @router.get("/filters")
-def get_tool_filters(db: Session = Depends(get_db)):
+def get_tool_filters(request: Request, response: Response, db: Session = Depends(get_db)):
+    etag = http_cache.list_etag(request, "tools", version_service.get_version(db, "tools"))
+    cached = http_cache.not_modified(request, etag, http_cache.FILTERS_CACHE_CONTROL)
+    if cached:
+        return cached
+    http_cache.set_validators(response, etag, http_cache.FILTERS_CACHE_CONTROL)
+
     # 1. Languages
     languages = (
         db.query(models.Tool.language)
@@ -254,6 +287,8 @@ def get_tool_filters(db: Session = Depends(get_db)):
 @router.get("/{tool_id}", response_model=schemas.ToolResponse)
 def get_single_tool(
     tool_id: int,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db)
 ):
     tool = db.query(models.Tool).filter(models.Tool.id == tool_id).first()
@@ -274,6 +309,7 @@ def get_single_tool(
 
         # Increment total tool views
         tool.views = (tool.views or 0) + 1
+        stats_service.bump(db, tool.created_by, total_views=1)
 
         db.commit()
         db.refresh(tool)
@@ -287,6 +323,12 @@ def get_single_tool(
     if not tool.creator_name and tool.creator:
         tool.creator_name = tool.creator.full_name
 
+    etag = http_cache.row_etag(tool)
+    cached = http_cache.not_modified(request, etag, http_cache.DETAIL_CACHE_CONTROL, tool.updated_at)
+    if cached:
+        return cached
+    http_cache.set_validators(response, etag, http_cache.DETAIL_CACHE_CONTROL, tool.updated_at)
+
     return tool
 
 
@@ -339,6 +381,13 @@ def delete_tool(
         raise HTTPException(status_code=403, detail="Not authorized")
 
     db.delete(tool)
+    stats_service.bump(
+        db,
+        tool.created_by,
+        total_tools=-1,
+        total_likes=-(tool.likes or 0),
+        total_views=-(tool.views or 0),
+    )
     db.commit()
 
     return {"message": "Tool deleted successfully", "id": tool_id}
@@ -349,11 +398,25 @@ class UserMessage:
         self.parts = [{"text": content}]
 
 @router.post("/{tool_id}/run")
-async def run_tool(tool_id: int, db: Session = Depends(get_db)):
+async def run_tool(
+    tool_id: int,
+    payload: Optional[schemas.ToolRunRequest] = None,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
     tool = db.query(models.Tool).filter(models.Tool.id == tool_id).first()
     if not tool:
         raise HTTPException(status_code=404, detail="Tool not found")
 
+    # Python tools are executed in the sandbox pool; other languages are still simulated by the model
+    if tool_runtime_service.is_python(tool.language):
+        payload = payload or schemas.ToolRunRequest()
+        try:
+            outcome = await tool_runtime_service.run_async(tool.content or "", payload.args, payload.entrypoint)
+        except sandbox.SandboxError as exc:
+            return {"tool_id": tool_id, "output": f"Error: {exc}", "error": str(exc)}
+        return {"tool_id": tool_id, "output": tool_runtime_service.output_text(outcome), **outcome}
+
     user_prompt = (
         "Analyze and simulate this tool.\n\n"
         f"Title: {tool.title}\n"
@@ -362,6 +425,7 @@ async def run_tool(tool_id: int, db: Session = Depends(get_db)):
     )
 
     session_id = str(uuid.uuid4())
+    runner, session_service = get_runner()
     
     # Explicitly create the session in the service (Async)
     try:
@@ -376,20 +440,22 @@ async def run_tool(tool_id: int, db: Session = Depends(get_db)):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Session creation failed: {str(exc)}")
     
-    config = RunConfig()
+    config = new_run_config()
 
     try:
         # Wrap prompt in an object with .role attribute
         message = UserMessage(user_prompt)
         
         events = []
-        async for ev in runner.run_async(
-            user_id="default_user",
-            session_id=session_id,
-            new_message=message,
-            run_config=config
-        ):
-            events.append(ev)
+        with llm_telemetry.track("tools.run", TOOL_RUNNER_MODEL) as call:
+            async for ev in runner.run_async(
+                user_id="default_user",
+                session_id=session_id,
+                new_message=message,
+                run_config=config
+            ):
+                call.observe(ev)
+                events.append(ev)
 
         output = ""
         print(f"DEBUG: Captured {len(events)} events.")
@@ -448,6 +514,7 @@ async def generate_tool_instructions_by_id(
     )
 
     session_id = str(uuid.uuid4())
+    runner, session_service = get_runner()
 
     await session_service.create_session(
         session_id=session_id,
@@ -456,34 +523,36 @@ async def generate_tool_instructions_by_id(
     )
 
     message = UserMessage(user_prompt)
-    config = RunConfig()
+    config = new_run_config()
 
     final_text = None
 
-    async for ev in runner.run_async(
-        user_id="default_user",
-        session_id=session_id,
-        new_message=message,
-        run_config=config
-    ):
-        # Prefer agent_state output if it exists
-        if (
-            hasattr(ev, "actions")
-            and ev.actions
-            and ev.actions.agent_state
-            and ev.actions.agent_state.get("output")
+    with llm_telemetry.track("tools.instructions", TOOL_RUNNER_MODEL) as call:
+        async for ev in runner.run_async(
+            user_id="default_user",
+            session_id=session_id,
+            new_message=message,
+            run_config=config
         ):
-            final_text = ev.actions.agent_state["output"]
-            break
-
-        # Otherwise keep OVERWRITING with latest content
-        if hasattr(ev, "content") and ev.content:
-            parts = []
-            for part in ev.content.parts:
-                if hasattr(part, "text"):
-                    parts.append(part.text)
-            if parts:
-                final_text = "".join(parts)
+            call.observe(ev)
+            # Prefer agent_state output if it exists
+            if (
+                hasattr(ev, "actions")
+                and ev.actions
+                and ev.actions.agent_state
+                and ev.actions.agent_state.get("output")
+            ):
+                final_text = ev.actions.agent_state["output"]
+                break
+
+            # Otherwise keep OVERWRITING with latest content
+            if hasattr(ev, "content") and ev.content:
+                parts = []
+                for part in ev.content.parts:
+                    if hasattr(part, "text"):
+                        parts.append(part.text)
+                if parts:
+                    final_text = "".join(parts)
 
     output = (final_text or "(no output)").strip()
     return {"output": output}
@@ -506,6 +575,7 @@ async def generate_tool_instructions(
     )
 
     session_id = str(uuid.uuid4())
+    runner, session_service = get_runner()
 
     await session_service.create_session(
         session_id=session_id,
@@ -514,34 +584,36 @@ async def generate_tool_instructions(
     )
 
     message = UserMessage(user_prompt)
-    config = RunConfig()
+    config = new_run_config()
 
     final_text = None
 
-    async for ev in runner.run_async(
-        user_id="default_user",
-        session_id=session_id,
-        new_message=message,
-        run_config=config
-    ):
-        # Prefer agent_state output if it exists
-        if (
-            hasattr(ev, "actions")
-            and ev.actions
-            and ev.actions.agent_state
-            and ev.actions.agent_state.get("output")
+    with llm_telemetry.track("tools.instructions", TOOL_RUNNER_MODEL) as call:
+        async for ev in runner.run_async(
+            user_id="default_user",
+            session_id=session_id,
+            new_message=message,
+            run_config=config
         ):
-            final_text = ev.actions.agent_state["output"]
-            break
-
-        # Otherwise keep OVERWRITING with latest content
-        if hasattr(ev, "content") and ev.content:
-            parts = []
-            for part in ev.content.parts:
-                if hasattr(part, "text"):
-                    parts.append(part.text)
-            if parts:
-                final_text = "".join(parts)
+            call.observe(ev)
+            # Prefer agent_state output if it exists
+            if (
+                hasattr(ev, "actions")
+                and ev.actions
+                and ev.actions.agent_state
+                and ev.actions.agent_state.get("output")
+            ):
+                final_text = ev.actions.agent_state["output"]
+                break
+
+            # Otherwise keep OVERWRITING with latest content
+            if hasattr(ev, "content") and ev.content:
+                parts = []
+                for part in ev.content.parts:
+                    if hasattr(part, "text"):
+                        parts.append(part.text)
+                if parts:
+                    final_text = "".join(parts)
 
     output = (final_text or "(no output)").strip()
     return {"output": output}
@@ -1,8 +1,9 @@
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Literal
 from datetime import datetime
 from pydantic import ConfigDict
-from pydantic import Field
+from pydantic import Field, computed_field, field_serializer
+from .core import media
 
 class UserBase(BaseModel):
     full_name : str
@@ -35,14 +36,31 @@ class UserProfile(BaseModel):
 
     model_config = ConfigDict(from_attributes=True)
 
+    # The row holds a media reference; clients get URLs
+    @field_serializer("profile_image")
+    def _profile_image_url(self, value):
+        return media.url_for(value)
+
+    @computed_field
+    @property
+    def profile_image_thumbnails(self) -> dict[str, str]:
+        if not self.profile_image:
+            return {}
+        return {str(size): media.url_for(self.profile_image, size) for size in media.THUMBNAIL_SIZES}
+
 class UserProfileUpdate(BaseModel):
     full_name: str
     bio: str
     location: str
     website: str
     phone: str
+    # A data URL is moved into the media store; our own /media/ URL is kept as is
     profile_image: str | None = ""
 
+    @field_serializer("profile_image")
+    def _profile_image_url(self, value):
+        return media.url_for(value)
+
 class UserLogin(BaseModel):
     identifier : str
     password : str
@@ -54,6 +72,12 @@ class Token(BaseModel):
 class TokenData(BaseModel):
     identifier : Optional[str] = None
 
+# Order of the catalog list endpoints; "trending" is served from services/trending_service
+ListSort = Literal["newest", "trending", "relevance"]
+
+# What POST /prompts/create and /tools/create do with a near-duplicate body
+OnDuplicate = Literal["flag", "reject", "merge"]
+
 class PromptBase(BaseModel):
     title: str
     description: str
@@ -74,6 +98,7 @@ class PromptResponse(PromptBase):
     created_at: datetime
     created_by: int
     creator_name: str
+    duplicate_of: Optional[int] = None
     model_config = ConfigDict(from_attributes=True)
     
 class PromptListResponse(BaseModel):
@@ -83,6 +108,33 @@ class PromptListResponse(BaseModel):
 class PromptUpdate(PromptBase):
     pass
 
+# Lightweight list-view shape; heavy fields only appear when requested via ?fields=
+class PromptCard(BaseModel):
+    id: int
+    title: str
+    description: Optional[str] = None
+    tags: Optional[List[str]] = None
+    category: Optional[str] = None
+    recommended_model: Optional[str] = None
+    downloads: Optional[str] = None
+    likes: Optional[int] = None
+    views: Optional[int] = None
+    created_at: Optional[datetime] = None
+    created_by: int
+    creator_name: Optional[str] = None
+    content: Optional[str] = None
+    model_config = ConfigDict(from_attributes=True)
+
+class PromptCardListResponse(BaseModel):
+    data: List[PromptCard]
+    total_pages: int
+
+class SimilarPromptCard(PromptCard):
+    score: float
+
+class SimilarPromptListResponse(BaseModel):
+    data: List[SimilarPromptCard]
+
 class ToolBase(BaseModel):
     title: str
     description: str
@@ -107,6 +159,7 @@ class ToolResponse(ToolBase):
     created_at: datetime
     created_by: int
     creator_name: str
+    duplicate_of: Optional[int] = None
     model_config = ConfigDict(from_attributes=True)
 
 # Response wrapper for list endpoint
@@ -114,6 +167,39 @@ class ToolListResponse(BaseModel):
     data: List[ToolResponse]
     total_pages: int
 
+class ToolCard(BaseModel):
+    id: int
+    title: str
+    description: Optional[str] = None
+    tags: Optional[List[str]] = None
+    recommended_model: Optional[str] = None
+    language: Optional[str] = None
+    version: Optional[str] = None
+    downloads: Optional[str] = None
+    likes: Optional[int] = None
+    views: Optional[int] = None
+    created_at: Optional[datetime] = None
+    created_by: int
+    creator_name: Optional[str] = None
+    content: Optional[str] = None
+    instructions: Optional[str] = None
+    model_config = ConfigDict(from_attributes=True)
+
+class ToolCardListResponse(BaseModel):
+    data: List[ToolCard]
+    total_pages: int
+
+class SimilarToolCard(ToolCard):
+    score: float
+
+class SimilarToolListResponse(BaseModel):
+    data: List[SimilarToolCard]
+
+# POST /tools/{id}/run: keyword arguments for the tool's entrypoint, its first public function by default
+class ToolRunRequest(BaseModel):
+    args: dict = {}
+    entrypoint: Optional[str] = None
+
 class AgentRunRequest(BaseModel):
     agent: str
     input: str
@@ -181,7 +267,8 @@ class AgentPromptRead(BaseModel):
     id: int
     role: str
     order: int
-    content: str
+    # Read through the blob store / library prompt, see AgentPrompt.display_content
+    content: str = Field(validation_alias="display_content")
     prompt_id: int | None = None
     model_config = ConfigDict(from_attributes=True)
 
@@ -217,6 +304,12 @@ class AgentCard(BaseModel):
     likes: int = 0
     views: int
     visibility: str
+    tags: Optional[List[str]] = None
+    created_at: Optional[datetime] = None
+    created_by: Optional[int] = None
+    creator_name: Optional[str] = None
+    system_prompt: Optional[str] = None
+    instructions: Optional[str] = None
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -224,6 +317,107 @@ class AgentListResponse(BaseModel):
     data: List[AgentCard]
     total_pages: int
 
+class SimilarAgentCard(AgentCard):
+    score: float
+
+class SimilarAgentListResponse(BaseModel):
+    data: List[SimilarAgentCard]
+
+# ---- search suggestions (services/suggest_service) ----
+
+class Suggestion(BaseModel):
+    type: Literal["prompt", "tool", "agent", "tag", "category", "language", "creator"]
+    text: str
+    id: Optional[int] = None  # prompts, tools and agents
+    likes: Optional[int] = None
+    count: Optional[int] = None  # items with this tag / category / language / creator
+
+class SuggestResponse(BaseModel):
+    query: str
+    data: List[Suggestion]
+
+# ---- recommendations (services/recommendation_service) ----
+
+class RecommendedPromptCard(PromptCard):
+    score: float
+    reason: Literal["liked_by_similar_users", "trending"]
+
+class RecommendedToolCard(ToolCard):
+    score: float
+    reason: Literal["liked_by_similar_users", "trending"]
+
+class RecommendedAgentCard(AgentCard):
+    score: float
+    reason: Literal["liked_by_similar_users", "trending"]
+
+class RecommendationsResponse(BaseModel):
+    prompts: List[RecommendedPromptCard]
+    tools: List[RecommendedToolCard]
+    agents: List[RecommendedAgentCard]
+
+# ---- conversations (services/conversation_service) ----
+
+class ConversationCreate(BaseModel):
+    agent_id: int
+    title: Optional[str] = None
+
+class ConversationRead(BaseModel):
+    id: int
+    agent_id: int
+    title: Optional[str] = None
+    message_count: int
+    summary: Optional[str] = None  # of the turns that no longer fit in the context window
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+class ConversationListResponse(BaseModel):
+    data: List[ConversationRead]
+
+class ConversationMessageRead(BaseModel):
+    id: int
+    seq: int
+    role: Literal["user", "model", "tool"]
+    author: str
+    content: str
+    created_at: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+class ConversationMessageCreate(BaseModel):
+    input: str = Field(..., min_length=1)
+
+class ConversationContext(BaseModel):
+    messages: int  # history messages sent with this turn
+    tokens: int  # their estimated size
+    summarized_through: int  # seq of the last message folded into the summary (0: none)
+
+class ConversationTurnResponse(BaseModel):
+    conversation_id: int
+    agent_id: int
+    output: str
+    messages: List[ConversationMessageRead]  # appended by this turn
+    context: ConversationContext
+
+# POST /{prompts,tools,agents}/batch
+BATCH_GET_MAX = 100
+
+class BatchGetRequest(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=BATCH_GET_MAX)
+
+class PromptBatchResponse(BaseModel):
+    data: List[PromptResponse]
+    missing: List[int]
+
+class ToolBatchResponse(BaseModel):
+    data: List[ToolResponse]
+    missing: List[int]
+
+class AgentBatchResponse(BaseModel):
+    data: List[AgentRead]
+    missing: List[int]
+
 class CommunityGroupCreate(BaseModel):
     name: str
     description: str
@@ -1,12 +1,16 @@
 from sqlalchemy.orm import Session
 from .. import schemas, models
-from google.adk.agents import Agent
-from google.adk.models.lite_llm import LiteLlm
-from google.adk.runners import Runner, RunConfig, InMemorySessionService
+from . import stats_service
+from . import llm_telemetry
+from . import blob_service
+from . import tool_runtime_service
+from . import conversation_service
 import uuid
 import asyncio
 import re
 
+DEFAULT_MODEL = "gpt-4o-mini"
+
 class UserMessage:
     def __init__(self, content: str):
         self.role = "user"
@@ -36,9 +40,19 @@ def create_agent(
     db.add(agent)
     db.flush()  # get agent.id
 
+    saved_tools = 0
+    saved_prompts = 0
+
     for tool in payload.tools:
         standalone_tool_id = None
-        if tool.save_to_library:
+        # Same body already in this user's library: link it instead of copying it again
+        existing_tool = (
+            blob_service.find(db, models.Tool, tool.code).filter(models.Tool.created_by == user_id).first()
+            if tool.save_to_library and tool.code is not None else None
+        )
+        if existing_tool:
+            standalone_tool_id = existing_tool.id
+        elif tool.save_to_library:
             new_tool = models.Tool(
                 title=tool.name,
                 description=tool.description,
@@ -50,6 +64,7 @@ def create_agent(
             db.add(new_tool)
             db.flush()
             standalone_tool_id = new_tool.id
+            saved_tools += 1
 
         db.add(models.AgentTool(
             agent_id=agent.id,
@@ -62,7 +77,13 @@ def create_agent(
 
     for prompt in payload.prompts:
         standalone_prompt_id = None
-        if prompt.save_to_library:
+        existing_prompt = (
+            blob_service.find(db, models.Prompt, prompt.content).filter(models.Prompt.created_by == user_id).first()
+            if prompt.save_to_library and prompt.content is not None else None
+        )
+        if existing_prompt:
+            standalone_prompt_id = existing_prompt.id
+        elif prompt.save_to_library:
             new_prompt = models.Prompt(
                 title=f"Prompt from {agent.title}",
                 description=f"Automated prompt extraction from {agent.title}",
@@ -74,6 +95,7 @@ def create_agent(
             db.add(new_prompt)
             db.flush()
             standalone_prompt_id = new_prompt.id
+            saved_prompts += 1
 
         db.add(models.AgentPrompt(
             agent_id=agent.id,
@@ -83,13 +105,20 @@ def create_agent(
             prompt_id=standalone_prompt_id,
         ))
 
+    stats_service.bump(
+        db,
+        user_id,
+        total_agents=1,
+        total_tools=saved_tools,
+        total_prompts=saved_prompts,
+    )
     db.commit()
     db.refresh(agent)
     return agent
 
 def clone_agent(db: Session, agent: models.Agent, user_id: int, creator_name: str):
     clone = models.Agent(
-        name=f"{agent.name} (Clone)",
+        title=f"{agent.title} (Clone)",
         description=agent.description,
         system_prompt=agent.system_prompt,
         model=agent.model,
@@ -104,10 +133,14 @@ def clone_agent(db: Session, agent: models.Agent, user_id: int, creator_name: st
     db.add(clone)
     db.flush()
 
+    # Children share the original's blobs: a clone adds references, not copies
     for tool in agent.tools:
         db.add(models.AgentTool(
             agent_id=clone.id,
             tool_id=tool.tool_id,
+            name=tool.name,
+            description=tool.description,
+            code_hash=tool.code_hash,
             enabled=tool.enabled,
             config=tool.config,
         ))
@@ -116,32 +149,87 @@ def clone_agent(db: Session, agent: models.Agent, user_id: int, creator_name: st
         db.add(models.AgentPrompt(
             agent_id=clone.id,
             prompt_id=prompt.prompt_id,
+            content_hash=prompt.content_hash,
             role=prompt.role,
             order=prompt.order,
         ))
 
+    stats_service.bump(db, user_id, total_agents=1)
     db.commit()
     db.refresh(clone)
     return clone
 
-async def run_agent(db: Session, agent_id: int, user_input: str):
+async def run_agent(db: Session, agent_id: int, user_input: str, user_id: int = None):
     agent_db = db.query(models.Agent).filter(models.Agent.id == agent_id).first()
     if not agent_db:
         return None
+    return await _run_recorded(db, agent_db, user_input, user_id)
+
+async def run_conversation_turn(db: Session, conversation: models.Conversation, user_input: str):
+    """One turn of a persisted conversation: history and summary come from conversation_service."""
+    from ..agents.conversation_sessions import ConversationSessions
 
-    return await _execute_agent(
+    agent_db = conversation.agent
+    sessions = ConversationSessions(db, conversation)
+    result = await _run_recorded(
+        db,
+        agent_db,
+        user_input,
+        conversation.user_id,
+        session_service=sessions,
+        session_id=str(conversation.id),
+        context=conversation_service.context_instructions(conversation),
+        source="agent.conversation",
+    )
+    # Keeps the next turn's context within budget
+    await conversation_service.compact(db, conversation, agent_db.model or DEFAULT_MODEL)
+    result.update(conversation_id=conversation.id, messages=sessions.appended, context=sessions.window)
+    return result
+
+async def _run_recorded(db: Session, agent_db: models.Agent, user_input: str, user_id: int = None, **execute_args):
+    run_args = dict(
         title=agent_db.title,
         model_name=agent_db.model,
         system_prompt=agent_db.system_prompt,
-        prompts=agent_db.prompts,
+        prompts=list(agent_db.prompts),
+        tools=list(agent_db.tools),
         user_input=user_input,
-        agent_id=agent_db.id
+        agent_id=agent_db.id,
+        **execute_args,
     )
 
+    # agent_runs.user_id is required, so anonymous runs only leave an llm_calls row
+    agent_run = None
+    if user_id is not None:
+        agent_run = models.AgentRun(agent_id=agent_db.id, user_id=user_id, input=user_input, status="running")
+        db.add(agent_run)
+        db.commit()
+
+    try:
+        result = await _execute_agent(
+            **run_args,
+            user_id=user_id,
+            agent_run_id=agent_run.id if agent_run else None,
+        )
+    except Exception:
+        if agent_run is not None:
+            agent_run.status = "failed"
+            db.commit()
+        raise
+
+    if agent_run is not None:
+        agent_run.output = result["output"]
+        agent_run.status = "completed"
+        db.commit()
+    return result
+
 async def test_agent(db: Session, payload: schemas.AgentTestRequest):
-    # Resolve library items for testing
+    return await run_resolved(resolve_config(db, payload.config), payload.input, source="agent.test")
+
+def resolve_config(db: Session, config: schemas.AgentCreate) -> dict:
+    """_execute_agent() arguments for an unsaved agent config, with library items resolved."""
     resolved_prompts = []
-    for p in payload.config.prompts:
+    for p in config.prompts:
         if p.prompt_id and not p.content:
             lib_p = db.query(models.Prompt).filter(models.Prompt.id == p.prompt_id).first()
             if lib_p:
@@ -157,16 +245,77 @@ async def test_agent(db: Session, payload: schemas.AgentTestRequest):
                 order=p.order
             ))
 
-    return await _execute_agent(
-        title=payload.config.title,
-        model_name=payload.config.model,
-        system_prompt=payload.config.system_prompt,
+    resolved_tools = []
+    for t in config.tools:
+        lib_t = db.query(models.Tool).filter(models.Tool.id == t.tool_id).first() if t.tool_id and not t.code else None
+        resolved_tools.append(models.AgentTool(
+            name=lib_t.title if lib_t else t.name,
+            description=lib_t.description if lib_t else t.description,
+            code=lib_t.content if lib_t else t.code,
+            enabled=t.enabled,
+            config=t.config,
+        ))
+
+    return dict(
+        title=config.title,
+        model_name=config.model,
+        system_prompt=config.system_prompt,
         prompts=resolved_prompts,
-        user_input=payload.input
+        tools=resolved_tools,
+    )
+
+def resolve_agent(agent_db: models.Agent) -> dict:
+    """
+    _execute_agent() arguments for a saved agent, copied into unsaved objects
+    so runs no longer need the session (e.g. after a streamed response began).
+    """
+    return dict(
+        title=agent_db.title,
+        model_name=agent_db.model,
+        system_prompt=agent_db.system_prompt,
+        prompts=[
+            models.AgentPrompt(role=p.role, content=p.display_content, order=p.order)
+            for p in agent_db.prompts
+        ],
+        tools=[
+            models.AgentTool(
+                name=t.display_name,
+                description=t.display_description,
+                code=t.display_code,
+                enabled=t.enabled,
+                config=t.config,
+            )
+            for t in agent_db.tools
+        ],
+        agent_id=agent_db.id,
     )
 
-async def _execute_agent(title: str, model_name: str, system_prompt: str, prompts: list, user_input: str, agent_id: int = None):
-    model = LiteLlm(model=model_name or "gpt-4o-mini")
+async def run_resolved(resolved: dict, user_input: str, source: str, user_id: int = None):
+    """Run an agent from resolve_config() / resolve_agent() arguments."""
+    return await _execute_agent(**resolved, user_input=user_input, source=source, user_id=user_id)
+
+async def _execute_agent(
+    title: str,
+    model_name: str,
+    system_prompt: str,
+    prompts: list,
+    user_input: str,
+    tools: list = (),
+    agent_id: int = None,
+    source: str = "agent.run",
+    user_id: int = None,
+    agent_run_id: int = None,
+    session_service=None,
+    session_id: str = None,
+    context: str = "",
+):
+    # Deferred: the ADK / LiteLLM stack is only needed once an agent actually runs
+    from google.adk.agents import Agent
+    from google.adk.models.lite_llm import LiteLlm
+    from google.adk.runners import Runner, RunConfig, InMemorySessionService
+
+    model_name = model_name or DEFAULT_MODEL
+    model = LiteLlm(model=model_name)
     
     # Concatenate all system prompts
     full_system_prompt = system_prompt or ""
@@ -176,7 +325,8 @@ async def _execute_agent(title: str, model_name: str, system_prompt: str, prompt
     
     for p in sorted_prompts:
         if p.role == "system":
-            full_system_prompt += f"\n{p.content}"
+            full_system_prompt += f"\n{p.display_content}"
+    full_system_prompt += context
     
     # Sanitize agent name
     safe_name = re.sub(r'[^a-zA-Z0-9_]', '_', title)
@@ -186,48 +336,66 @@ async def _execute_agent(title: str, model_name: str, system_prompt: str, prompt
     adk_agent = Agent(
         name=safe_name,
         model=model,
-        description=full_system_prompt or "You are a helpful AI assistant."
+        description=full_system_prompt or "You are a helpful AI assistant.",
+        # Tool code runs in the sandbox pool; several calls in one turn run in parallel
+        tools=tool_runtime_service.agent_tools(tools),
     )
     
-    session_service = InMemorySessionService()
+    # One-off runs get a throwaway session; conversations pass their persisted one
+    adk_user_id = "default_user"
+    if session_service is None:
+        session_service = InMemorySessionService()
+        session_id = str(uuid.uuid4())
+        await session_service.create_session(
+            session_id=session_id,
+            app_name="AgentHub",
+            user_id=adk_user_id
+        )
+    elif user_id is not None:
+        adk_user_id = str(user_id)
+
     runner = Runner(
         app_name="AgentHub",
         agent=adk_agent,
         session_service=session_service
     )
-
-    session_id = str(uuid.uuid4())
-    await session_service.create_session(
-        session_id=session_id,
-        app_name="AgentHub",
-        user_id="default_user"
-    )
     
     config = RunConfig()
     output = ""
 
-    async for ev in runner.run_async(
-        user_id="default_user",
-        session_id=session_id,
-        new_message=UserMessage(user_input),
-        run_config=config,
-    ):
-        # Extract model response text
-        if hasattr(ev, "model_response") and ev.model_response:
-            for part in getattr(ev.model_response, "parts", []):
-                if hasattr(part, "text"):
-                    output += part.text
+    with llm_telemetry.track(
+        source, model_name, agent_id=agent_id, user_id=user_id, agent_run_id=agent_run_id
+    ) as call:
+        async for ev in runner.run_async(
+            user_id=adk_user_id,
+            session_id=session_id,
+            new_message=UserMessage(user_input),
+            run_config=config,
+        ):
+            call.observe(ev)
+            # Extract model response text
+            if hasattr(ev, "model_response") and ev.model_response:
+                for part in getattr(ev.model_response, "parts", None) or []:
+                    if getattr(part, "text", None):
+                        output += part.text
         
-        # Extract from content fallback (often used in ADK events)
-        if hasattr(ev, "content") and ev.content:
-            for part in getattr(ev.content, "parts", []):
-                if hasattr(part, "text"):
-                    output += part.text
-                elif isinstance(part, dict) and "text" in part:
-                    output += part["text"]
+            # Extract from content fallback (often used in ADK events)
+            if hasattr(ev, "content") and ev.content:
+                for part in getattr(ev.content, "parts", None) or []:
+                    # Function call / response parts have no text
+                    if getattr(part, "text", None):
+                        output += part.text
+                    elif isinstance(part, dict) and "text" in part:
+                        output += part["text"]
 
     return {
         "agent_id": agent_id,
         "title": title,
-        "output": output or "(no output)"
+        "output": output or "(no output)",
+        "usage": {
+            "prompt_tokens": call.prompt_tokens,
+            "completion_tokens": call.completion_tokens,
+            "total_tokens": call.total_tokens,
+            "cost_usd": call.cost_usd,
+        },
     }
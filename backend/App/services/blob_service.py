@@ -0,0 +1,192 @@
+# services/blob_service.py
+"""
+Content-addressed storage for prompt and tool bodies.
+
+Every body is stored once, keyed by the SHA-256 of its UTF-8 text:
+
+- prompts.content_hash / tools.content_hash: the library text stays inline
+  only (list search and ?fields=content read it) and holds no blob; the
+  hash just makes "does this body already exist?" an indexed lookup.
+- agent_tools.code_hash / agent_prompts.content_hash: the body lives in
+  content_blobs and the inline column is emptied on write, so an agent
+  copied from library items or cloned adds a hash per child instead of
+  another copy of the text.
+
+Reference counts are kept by the flush hook below for ORM writes; bulk
+statements go through acquire() / release() explicitly, like
+version_service.mark_changed(). A blob is deleted when its count reaches 0.
+"""
+import hashlib
+import os
+import zlib
+from collections import Counter
+from typing import Iterable, Optional
+
+from sqlalchemy import bindparam, event, inspect, select, update, delete
+from sqlalchemy.orm import Session
+
+from .. import models
+
+# model -> (text attribute, hash attribute, whether the text moves into the blob;
+# if not, the row keeps it inline and the hash holds no blob reference)
+REFERENCES = {
+    models.Prompt: ("content", "content_hash", False),
+    models.Tool: ("content", "content_hash", False),
+    models.AgentTool: ("code", "code_hash", True),
+    models.AgentPrompt: ("content", "content_hash", True),
+}
+
+# Bodies shorter than this are stored as-is; zlib barely helps and costs a call per read
+COMPRESS_MIN_BYTES = 256
+
+_table = models.ContentBlob.__table__
+
+
+def digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def encode(text: str) -> tuple[bytes, Optional[str]]:
+    """Blob payload and its compression ("zlib" or None). BLOB_COMPRESSION=none turns it off."""
+    raw = text.encode("utf-8")
+    if os.getenv("BLOB_COMPRESSION", "zlib") == "zlib" and len(raw) >= COMPRESS_MIN_BYTES:
+        packed = zlib.compress(raw, 6)
+        if len(packed) < len(raw):
+            return packed, "zlib"
+    return raw, None
+
+
+def _insert_statement(dialect: str):
+    # Two writers may store the same new body at once; the second insert is a no-op
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+        return insert(_table).on_conflict_do_nothing(index_elements=["hash"])
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+        return insert(_table).on_conflict_do_nothing(index_elements=["hash"])
+    return _table.insert()
+
+
+def _apply(session: Session, delta: Counter, texts: dict[str, str]) -> None:
+    delta = {h: n for h, n in delta.items() if n}
+    if not delta:
+        return
+    conn = session.connection()
+
+    new = [h for h, n in delta.items() if n > 0 and h in texts]
+    if new:
+        existing = set(conn.execute(select(_table.c.hash).where(_table.c.hash.in_(new))).scalars())
+        rows = []
+        for h in new:
+            if h in existing:
+                continue
+            data, compression = encode(texts[h])
+            rows.append({
+                "hash": h,
+                "size": len(texts[h].encode("utf-8")),
+                "compression": compression,
+                "data": data,
+                "refcount": 0,
+            })
+        if rows:
+            conn.execute(_insert_statement(conn.dialect.name), rows)
+
+    conn.execute(
+        update(_table)
+        .where(_table.c.hash == bindparam("b_hash"))
+        .values(refcount=_table.c.refcount + bindparam("b_delta")),
+        [{"b_hash": h, "b_delta": n} for h, n in delta.items()],
+    )
+
+    released = [h for h, n in delta.items() if n < 0]
+    if released:
+        conn.execute(delete(_table).where(_table.c.hash.in_(released), _table.c.refcount <= 0))
+
+
+def digests(texts: Iterable[Optional[str]]) -> list[Optional[str]]:
+    """Hashes for inline-only rows (library prompts and tools) written with bulk statements."""
+    return [digest(text) if text is not None else None for text in texts]
+
+
+def acquire(session: Session, texts: Iterable[Optional[str]]) -> list[Optional[str]]:
+    """Store bodies for rows written with bulk statements; returns their hashes (None for None)."""
+    hashes, stored = [], {}
+    for text in texts:
+        h = digest(text) if text is not None else None
+        if h is not None:
+            stored[h] = text
+        hashes.append(h)
+    _apply(session, Counter(h for h in hashes if h is not None), stored)
+    return hashes
+
+
+def release(session: Session, hashes: Iterable[Optional[str]]) -> None:
+    """Drop references held by rows removed with bulk statements."""
+    delta = Counter()
+    for h in hashes:
+        if h is not None:
+            delta[h] -= 1
+    _apply(session, delta, {})
+
+
+def get_many(session: Session, hashes: Iterable[Optional[str]]) -> dict[str, str]:
+    wanted = {h for h in hashes if h is not None}
+    if not wanted:
+        return {}
+    rows = session.execute(
+        select(_table.c.hash, _table.c.compression, _table.c.data).where(_table.c.hash.in_(wanted))
+    )
+    return {row.hash: models.ContentBlob.decode(row.data, row.compression) for row in rows}
+
+
+def find(session: Session, model, text: str):
+    """Query for rows of `model` whose body is exactly `text` (an index lookup on the hash)."""
+    _, hash_attr, _ = REFERENCES[model]
+    return session.query(model).filter(getattr(model, hash_attr) == digest(text))
+
+
+# ---- reference counting for ORM writes ----
+
+def _committed(history) -> Optional[str]:
+    old = history.deleted or history.unchanged
+    return old[0] if old else None
+
+
+@event.listens_for(Session, "before_flush")
+def _track_references(session, flush_context, instances):
+    delta = Counter()
+    texts = {}
+
+    for obj in list(session.new) + list(session.dirty):
+        spec = REFERENCES.get(type(obj))
+        if spec is None:
+            continue
+        text_attr, hash_attr, move = spec
+        state = inspect(obj)
+
+        added = state.attrs[text_attr].history.added
+        if added and added[0] is not None:
+            h = digest(added[0])
+            texts[h] = added[0]
+            setattr(obj, hash_attr, h)
+            if move:
+                setattr(obj, text_attr, None)
+        if not move:
+            continue
+
+        history = state.attrs[hash_attr].history
+        if history.added:
+            if history.added[0] is not None:
+                delta[history.added[0]] += 1
+            if history.deleted and history.deleted[0] is not None:
+                delta[history.deleted[0]] -= 1
+
+    for obj in session.deleted:
+        spec = REFERENCES.get(type(obj))
+        if spec is None or not spec[2]:
+            continue
+        h = _committed(inspect(obj).attrs[spec[1]].history)
+        if h is not None:
+            delta[h] -= 1
+
+    _apply(session, delta, texts)
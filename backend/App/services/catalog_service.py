@@ -0,0 +1,190 @@
+# services/catalog_service.py
+from sqlalchemy.orm import Session, Query
+from sqlalchemy import case, func, or_
+from typing import Iterable, Optional
+from collections import defaultdict
+from .. import models
+from . import blob_service
+
+# Cards carry a preview of the description, never the full body
+DESCRIPTION_PREVIEW_CHARS = 200
+
+
+def _card_columns(model) -> list:
+    common = [
+        model.id,
+        model.title,
+        model.tags,
+        model.likes,
+        model.views,
+        model.created_at,
+        model.created_by,
+        func.coalesce(model.creator_name, models.User.full_name).label("creator_name"),
+    ]
+
+    if model is models.Prompt:
+        return common + [model.category, model.recommended_model, model.downloads]
+    if model is models.Tool:
+        return common + [model.recommended_model, model.language, model.version, model.downloads]
+    if model is models.Agent:
+        return common + [model.model, model.visibility]
+    raise ValueError(f"No card projection for {model.__name__}")
+
+
+# Heavy columns a list caller may opt into with ?fields=a,b
+DETAIL_FIELDS = {
+    models.Prompt: ("description", "content"),
+    models.Tool: ("description", "content", "instructions"),
+    models.Agent: ("description", "system_prompt", "instructions"),
+}
+
+
+def parse_fields(model, fields: Optional[str]) -> set[str]:
+    if not fields:
+        return set()
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    # Unknown names are ignored, like any other sparse fieldset
+    return requested & set(DETAIL_FIELDS[model])
+
+
+def card_query(db: Session, model, fields: Optional[str] = None) -> Query:
+    """
+    Column-only query for list views: no full rows, no lazy relationship loads.
+
+    `description` is truncated unless it is explicitly requested through
+    `fields`, and other Text columns are only selected when requested.
+    """
+    extra = parse_fields(model, fields)
+    columns = _card_columns(model)
+
+    if "description" in extra:
+        columns.append(model.description)
+    else:
+        columns.append(func.substr(model.description, 1, DESCRIPTION_PREVIEW_CHARS).label("description"))
+
+    for name in sorted(extra - {"description"}):
+        columns.append(getattr(model, name))
+
+    return (
+        db.query(*columns)
+        .outerjoin(models.User, models.User.id == model.created_by)
+    )
+
+
+# ---- batch get ----
+
+# Detail-only scalar columns that are neither card nor heavy Text fields
+_BATCH_EXTRA = {
+    models.Prompt: ("duplicate_of",),
+    models.Tool: ("duplicate_of",),
+    models.Agent: ("temperature", "max_tokens"),
+}
+
+
+def _dedupe_ids(ids: Iterable[int]) -> list[int]:
+    return list(dict.fromkeys(ids))
+
+
+def batch_get(db: Session, model, ids: list[int], viewer_id: Optional[int] = None) -> dict:
+    """
+    Full detail rows for `ids` from one IN query, in request order.
+
+    Same shape as the single-item GETs, minus their side effects: no view
+    rows are written and no counters move. Ids that don't exist (or, for
+    agents, are someone else's private agent) come back under "missing".
+    Agents get their tools and prompts with one IN query each.
+    """
+    wanted = _dedupe_ids(ids)
+    columns = _card_columns(model) + [model.description]
+    columns += [getattr(model, name) for name in DETAIL_FIELDS[model] if name != "description"]
+    columns += [getattr(model, name) for name in _BATCH_EXTRA[model]]
+
+    query = (
+        db.query(*columns)
+        .outerjoin(models.User, models.User.id == model.created_by)
+        .filter(model.id.in_(wanted))
+    )
+    if model is models.Agent:
+        query = query.filter(or_(model.visibility != "private", model.created_by == viewer_id))
+
+    found = {row["id"]: row for row in to_cards(query.all())}
+
+    if model is models.Agent and found:
+        tools, prompts = _agent_children(db, list(found))
+        for agent_id, row in found.items():
+            row["tools"] = tools.get(agent_id, [])
+            row["prompts"] = prompts.get(agent_id, [])
+
+    return {
+        "data": [found[i] for i in wanted if i in found],
+        "missing": [i for i in wanted if i not in found],
+    }
+
+
+def _agent_children(db: Session, agent_ids: list[int]) -> tuple[dict, dict]:
+    at, tool = models.AgentTool, models.Tool
+    linked = tool.id.isnot(None)
+    # Mirrors AgentTool.display_*: a library tool wins over the agent's own copy
+    tool_rows = (
+        db.query(
+            at.agent_id, at.id, at.enabled, at.tool_id, at.config,
+            case((linked, tool.title), else_=at.name).label("display_name"),
+            case((linked, tool.description), else_=at.description).label("display_description"),
+            case((linked, tool.content), else_=at.code).label("display_code"),
+            case((linked, None), else_=at.code_hash).label("code_hash"),
+        )
+        .outerjoin(tool, tool.id == at.tool_id)
+        .filter(at.agent_id.in_(agent_ids))
+        .order_by(at.agent_id, at.id)
+        .all()
+    )
+
+    ap, prompt = models.AgentPrompt, models.Prompt
+    # Cloned agents only keep prompt_id, so fall back to the library prompt's text
+    prompt_rows = (
+        db.query(
+            ap.agent_id, ap.id, ap.role, ap.order, ap.prompt_id,
+            func.coalesce(ap.content, prompt.content, "").label("content"),
+            ap.content_hash,
+        )
+        .outerjoin(prompt, prompt.id == ap.prompt_id)
+        .filter(ap.agent_id.in_(agent_ids))
+        .order_by(ap.agent_id, ap.order, ap.id)
+        .all()
+    )
+
+    # Bodies stored in content_blobs, one IN query for all of them
+    bodies = blob_service.get_many(
+        db, [r.code_hash for r in tool_rows] + [r.content_hash for r in prompt_rows]
+    )
+
+    tools, prompts = defaultdict(list), defaultdict(list)
+    for rows, grouped, body_key, hash_key in (
+        (tool_rows, tools, "display_code", "code_hash"),
+        (prompt_rows, prompts, "content", "content_hash"),
+    ):
+        for row in rows:
+            child = row._asdict()
+            h = child.pop(hash_key)
+            if h in bodies:
+                child[body_key] = bodies[h]
+            grouped[child.pop("agent_id")].append(child)
+    return tools, prompts
+
+
+def normalize_tags(value) -> list:
+    if isinstance(value, list):
+        return value
+    if isinstance(value, str):
+        return [t.strip() for t in value.split(",") if t.strip()]
+    return []
+
+
+def to_cards(rows) -> list[dict]:
+    # Output already matches the *Card schemas, so routers can return it as-is
+    cards = []
+    for row in rows:
+        card = row._asdict()
+        card["tags"] = normalize_tags(card.get("tags"))
+        cards.append(card)
+    return cards
@@ -0,0 +1,216 @@
+# services/conversation_service.py
+"""
+Persistent multi-turn conversations with an agent.
+
+A conversation is an ADK session kept in the database. Every event of a
+turn (the user's message, model replies, function calls and their results)
+is appended to conversation_messages and never rewritten afterwards.
+agents/conversation_sessions.ConversationSessions is the ADK session service
+over that log: the runner reads the history from it and appends the turn's
+events to it.
+
+What the model is sent each turn is bounded by CONTEXT_TOKENS however long
+the conversation gets:
+- the session service hands the runner only the newest whole turns that fit in
+  the budget, never anything already in the summary;
+- after a turn, compact() folds the oldest turns into a rolling summary
+  once the unsummarized history outgrows the budget, leaving about half of
+  it. That costs one extra model call per half-budget of conversation, and
+  the summary goes into the agent's instructions.
+If summarizing fails (or CONVERSATION_SUMMARY=0) the older turns are simply
+left out: truncation instead of summarization. A failed summary still moves
+summary_seq past those turns, so the next attempt doesn't resend them.
+
+Token counts are estimated (about 4 characters per token) when a message is
+written; they only have to be good enough to size the window.
+"""
+import logging
+import os
+import uuid
+from typing import Optional
+
+from sqlalchemy import delete
+from sqlalchemy.orm import Session
+
+from .. import models
+from . import llm_telemetry
+
+logger = logging.getLogger(__name__)
+
+APP_NAME = "AgentHub"
+CONTEXT_TOKENS = int(os.getenv("CONVERSATION_CONTEXT_TOKENS", "4000"))
+SUMMARIZE = os.getenv("CONVERSATION_SUMMARY", "1") != "0"
+SUMMARY_MAX_CHARS = 4000
+# What one summarizer call is sent at most (newest part kept), about twice the budget
+SUMMARY_INPUT_CHARS = CONTEXT_TOKENS * 8
+# Past this many messages the window is cut regardless of tokens
+MAX_WINDOW_MESSAGES = 400
+
+Message = models.ConversationMessage
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 4
+
+
+# ---- conversations ----
+
+def create(db: Session, agent: models.Agent, user_id: int, title: Optional[str] = None) -> models.Conversation:
+    conversation = models.Conversation(agent_id=agent.id, user_id=user_id, title=title, state={})
+    db.add(conversation)
+    db.commit()
+    db.refresh(conversation)
+    return conversation
+
+
+def get(db: Session, conversation_id: int, user_id: int) -> Optional[models.Conversation]:
+    return db.query(models.Conversation).filter(
+        models.Conversation.id == conversation_id,
+        models.Conversation.user_id == user_id,
+    ).first()
+
+
+def delete_conversations(db: Session, conversation_ids: list[int]) -> None:
+    """Remove conversations and their logs (does not commit)."""
+    if not conversation_ids:
+        return
+    conn = db.connection()
+    conn.execute(delete(Message.__table__).where(Message.conversation_id.in_(conversation_ids)))
+    conn.execute(delete(models.Conversation.__table__).where(models.Conversation.id.in_(conversation_ids)))
+
+
+def delete_for_agent(db: Session, agent_id: int) -> None:
+    ids = [row.id for row in db.query(models.Conversation.id).filter(models.Conversation.agent_id == agent_id)]
+    delete_conversations(db, ids)
+
+
+def fetch_messages(
+    db: Session,
+    conversation_id: int,
+    before_seq: Optional[int] = None,
+    after_seq: Optional[int] = None,
+    limit: int = 50,
+) -> list[models.ConversationMessage]:
+    """Keyset page of the log in ascending seq order, like group_message_service.fetch_group_messages."""
+    limit = max(1, min(limit, 200))
+    query = db.query(Message).filter(Message.conversation_id == conversation_id)
+    if after_seq is not None:
+        query = query.filter(Message.seq > after_seq)
+    if before_seq is not None:
+        query = query.filter(Message.seq < before_seq)
+    if after_seq is not None and before_seq is None:
+        return query.order_by(Message.seq.asc()).limit(limit).all()
+    rows = query.order_by(Message.seq.desc()).limit(limit).all()
+    rows.reverse()
+    return rows
+
+
+# ---- the context window ----
+
+def _turns(db: Session, conversation: models.Conversation) -> list[tuple[int, int]]:
+    """(first seq, tokens) of every turn after the summary, newest first."""
+    rows = (
+        db.query(Message.seq, Message.role, Message.tokens)
+        .filter(Message.conversation_id == conversation.id, Message.seq > conversation.summary_seq)
+        .order_by(Message.seq.desc())
+        .limit(MAX_WINDOW_MESSAGES)
+        .all()
+    )
+    turns, tokens = [], 0
+    for row in rows:
+        tokens += row.tokens
+        # A turn starts at the user's message; what follows are replies and tool calls
+        if row.role == "user":
+            turns.append((row.seq, tokens))
+            tokens = 0
+    return turns
+
+
+def window_start(db: Session, conversation: models.Conversation) -> tuple[int, int]:
+    """(first seq sent to the model, estimated tokens of the window)."""
+    start, used = conversation.message_count + 1, 0
+    for seq, tokens in _turns(db, conversation):
+        if used + tokens > CONTEXT_TOKENS:
+            break
+        start, used = seq, used + tokens
+    return start, used
+
+
+def context_instructions(conversation: models.Conversation) -> str:
+    if not conversation.summary:
+        return ""
+    return f"\n\nSummary of the earlier conversation:\n{conversation.summary}"
+
+
+# ---- rolling summary ----
+
+async def compact(db: Session, conversation: models.Conversation, model_name: str) -> None:
+    """Fold the oldest turns into the summary once the unsummarized history is over budget."""
+    if not SUMMARIZE:
+        return
+    turns = _turns(db, conversation)
+    if sum(tokens for _, tokens in turns) <= CONTEXT_TOKENS:
+        return
+    # Keep the newest turns that fit in half the budget (at least the last one)
+    kept, cut = 0, None
+    for seq, tokens in turns:
+        if cut is not None and kept + tokens > CONTEXT_TOKENS // 2:
+            break
+        kept, cut = kept + tokens, seq
+    rows = (
+        db.query(Message.role, Message.content)
+        .filter(Message.conversation_id == conversation.id, Message.seq > conversation.summary_seq, Message.seq < cut)
+        .order_by(Message.seq)
+        .all()
+    )
+    if not rows:
+        return
+    transcript = "\n".join(f"{row.role}: {row.content}" for row in rows)[-SUMMARY_INPUT_CHARS:]
+    try:
+        summary = await _summarize(model_name, conversation, transcript)
+        conversation.summary = summary[:SUMMARY_MAX_CHARS]
+    except Exception:
+        # The window still bounds the context, the turns just drop out unsummarized
+        logger.exception("Could not summarize conversation %s", conversation.id)
+    conversation.summary_seq = cut - 1
+    db.commit()
+
+
+async def _summarize(model_name: str, conversation: models.Conversation, transcript: str) -> str:
+    # Deferred: the ADK / LiteLLM stack is only needed once a model is called
+    from google.adk.agents import Agent
+    from google.adk.models.lite_llm import LiteLlm
+    from google.adk.runners import Runner, RunConfig, InMemorySessionService
+    from google.genai import types
+
+    agent = Agent(
+        name="conversation_summarizer",
+        model=LiteLlm(model=model_name),
+        description=(
+            "You keep the running summary of a conversation between a user and an AI agent. "
+            "Merge the new part of the conversation into the previous summary. Keep facts, decisions, "
+            "names, numbers and open questions the agent will need later; drop small talk. "
+            "Answer with the updated summary only, in at most 300 words."
+        ),
+    )
+    session_service = InMemorySessionService()
+    runner = Runner(app_name=APP_NAME, agent=agent, session_service=session_service)
+    session_id = str(uuid.uuid4())
+    await session_service.create_session(app_name=APP_NAME, user_id="summarizer", session_id=session_id)
+
+    message = types.Content(role="user", parts=[types.Part(text=(
+        f"Previous summary:\n{conversation.summary or '(none)'}\n\nNew part of the conversation:\n{transcript}"
+    ))])
+    output = ""
+    with llm_telemetry.track(
+        "conversation.summary", model_name, agent_id=conversation.agent_id, user_id=conversation.user_id
+    ) as call:
+        async for ev in runner.run_async(
+            user_id="summarizer", session_id=session_id, new_message=message, run_config=RunConfig()
+        ):
+            call.observe(ev)
+            if ev.content and not ev.partial:
+                output += "".join(part.text or "" for part in ev.content.parts or [])
+    if not output.strip():
+        raise ValueError("empty summary")
+    return output.strip()
@@ -0,0 +1,357 @@
+# services/duplicate_service.py
+"""
+Near-duplicate detection for prompt and tool bodies (MinHash + LSH).
+
+A body is cut into shingles (runs of SHINGLE_SIZE word/punctuation tokens,
+ignoring case and whitespace) and summarized by a MinHash signature of
+NUM_HASHES minimums. The share of equal positions in two signatures
+estimates the Jaccard similarity of their shingle sets.
+
+The signature is split into BANDS bands of ROWS_PER_BAND values and each
+band is hashed to a bucket key in minhash_buckets. Items sharing a bucket
+are candidates, so a lookup is one indexed IN query over BANDS keys plus a
+signature comparison for the few candidates, whatever the library size.
+With 16 bands of 8 rows a pair at Jaccard 0.8 is found ~95% of the time,
+one at 0.5 ~6%.
+
+Rows point at the older item they duplicate through duplicate_of:
+- ORM writes are checked and indexed by the flush hooks below (this covers
+  the create endpoints and agents saving tools/prompts to the library);
+- bulk inserts (imports) call index_written(), like
+  version_service.mark_changed();
+- `python -m App.cli duplicates cluster` indexes rows that are missing and
+  re-flags the whole library group by group, the oldest item of each group
+  being the one the others point at.
+
+The create endpoints can also refuse a near-duplicate or return the
+existing item instead (see near_duplicates()).
+"""
+import re
+import zlib
+from functools import lru_cache
+from typing import Iterable, Optional
+
+from sqlalchemy import bindparam, delete, event, inspect, insert, select, update
+from sqlalchemy.orm import Session
+
+from .. import models
+from . import version_service
+
+NUM_HASHES = 128
+BANDS = 16
+ROWS_PER_BAND = NUM_HASHES // BANDS
+SHINGLE_SIZE = 3
+# Estimated Jaccard similarity from which two bodies count as near-duplicates
+THRESHOLD = 0.8
+INDEX_BATCH_SIZE = 500
+
+MODELS = {"prompts": models.Prompt, "tools": models.Tool}
+ENTITY_OF = {model: entity for entity, model in MODELS.items()}
+
+# Hash functions are (a * x + b) mod _PRIME over 32-bit shingle hashes; a * x stays below 2**63
+_PRIME = (1 << 31) - 1
+# Fixed, so signatures already stored in the database stay comparable
+_SEED = 43
+# Shingles hashed per step, bounding the NUM_HASHES x n intermediate matrix
+_CHUNK = 4096
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_PENDING_KEY = "duplicates_pending"
+
+_signatures = models.MinHashSignature.__table__
+_buckets = models.MinHashBucket.__table__
+
+
+# ---- signatures ----
+
+@lru_cache(maxsize=1)
+def _coefficients():
+    import numpy as np
+
+    rng = np.random.default_rng(_SEED)
+    a = rng.integers(1, _PRIME, NUM_HASHES, dtype=np.uint64)
+    b = rng.integers(0, _PRIME, NUM_HASHES, dtype=np.uint64)
+    return a[:, None], b[:, None]
+
+
+def shingles(text: str) -> set[int]:
+    tokens = _TOKEN_RE.findall(text.lower())
+    if len(tokens) <= SHINGLE_SIZE:
+        grams = [tokens] if tokens else []
+    else:
+        grams = (tokens[i:i + SHINGLE_SIZE] for i in range(len(tokens) - SHINGLE_SIZE + 1))
+    return {zlib.crc32(" ".join(gram).encode("utf-8")) for gram in grams}
+
+
+def signature(text: Optional[str]):
+    """MinHash signature (NUM_HASHES little-endian uint32), or None for a body without tokens."""
+    import numpy as np
+
+    values = shingles(text) if text else set()
+    if not values:
+        return None
+    x = np.fromiter(values, dtype=np.uint64, count=len(values))
+    a, b = _coefficients()
+    minimums = np.full(NUM_HASHES, _PRIME, dtype=np.uint64)
+    for start in range(0, len(x), _CHUNK):
+        hashed = (a * x[start:start + _CHUNK] + b) % _PRIME
+        np.minimum(minimums, hashed.min(axis=1), out=minimums)
+    return minimums.astype("<u4")
+
+
+def band_keys(sig) -> list[int]:
+    # Band number in the high bits: equal rows in different bands are different buckets
+    return [
+        (band << 32) | zlib.crc32(sig[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND].tobytes())
+        for band in range(BANDS)
+    ]
+
+
+def similarity(sig, other) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures."""
+    return float((sig == other).mean())
+
+
+# ---- the band index ----
+
+def _matches(session: Session, entity: str, sig, below: Optional[int] = None) -> list[tuple[int, float]]:
+    """(id, similarity) of indexed items at or above THRESHOLD, best first; `below` keeps only older ids."""
+    import numpy as np
+
+    candidates = (
+        select(_buckets.c.item_id)
+        .where(_buckets.c.entity == entity, _buckets.c.bucket.in_(band_keys(sig)))
+    )
+    query = select(_signatures.c.item_id, _signatures.c.signature).where(
+        _signatures.c.entity == entity, _signatures.c.item_id.in_(candidates)
+    )
+    if below is not None:
+        query = query.where(_signatures.c.item_id < below)
+
+    found = []
+    for item_id, stored in session.connection().execute(query):
+        score = similarity(sig, np.frombuffer(stored, dtype="<u4"))
+        if score >= THRESHOLD:
+            found.append((item_id, score))
+    found.sort(key=lambda match: (-match[1], match[0]))
+    return found
+
+
+def _original(session: Session, entity: str, matches: list[tuple[int, float]]) -> Optional[int]:
+    """The item a new row duplicating `matches` should point at: the best match's own original."""
+    if not matches:
+        return None
+    model = MODELS[entity]
+    best = matches[0][0]
+    pointer = session.connection().execute(select(model.duplicate_of).where(model.id == best)).scalar()
+    return pointer or best
+
+
+def _store(session: Session, entity: str, item_id: int, sig, replace: bool = True) -> None:
+    conn = session.connection()
+    if replace:
+        _unindex(session, entity, [item_id])
+    if sig is None:
+        return
+    conn.execute(insert(_signatures), {"entity": entity, "item_id": item_id, "signature": sig.tobytes()})
+    conn.execute(
+        insert(_buckets),
+        [{"entity": entity, "bucket": key, "item_id": item_id} for key in band_keys(sig)],
+    )
+
+
+def _unindex(session: Session, entity: str, ids: list[int]) -> None:
+    conn = session.connection()
+    conn.execute(delete(_buckets).where(_buckets.c.entity == entity, _buckets.c.item_id.in_(ids)))
+    conn.execute(delete(_signatures).where(_signatures.c.entity == entity, _signatures.c.item_id.in_(ids)))
+
+
+def near_duplicates(db: Session, entity: str, text: str, limit: int = 5) -> list[dict]:
+    """Existing items whose body is a near-duplicate of `text`, best first, for the create endpoints."""
+    sig = signature(text)
+    if sig is None:
+        return []
+    matches = _matches(db, entity, sig)[:limit]
+    if not matches:
+        return []
+    model = MODELS[entity]
+    rows = {
+        row.id: row
+        for row in db.query(model.id, model.title, model.duplicate_of)
+        .filter(model.id.in_([item_id for item_id, _ in matches]))
+    }
+    return [
+        {
+            "id": item_id,
+            "title": rows[item_id].title,
+            "score": round(score, 4),
+            "original_id": rows[item_id].duplicate_of or item_id,
+        }
+        for item_id, score in matches
+        if item_id in rows
+    ]
+
+
+def index_written(session: Session, entity: str, items: Iterable[tuple[int, Optional[str]]]) -> int:
+    """Index and flag (id, body) pairs inserted with bulk statements; returns how many were flagged."""
+    model = MODELS[entity]
+    flags = []
+    for item_id, text in items:
+        sig = signature(text)
+        if sig is None:
+            continue
+        original = _original(session, entity, _matches(session, entity, sig, below=item_id))
+        if original is not None:
+            flags.append({"b_id": item_id, "b_original": original})
+        _store(session, entity, item_id, sig, replace=False)
+    if flags:
+        session.connection().execute(
+            update(model).where(model.id == bindparam("b_id")).values(duplicate_of=bindparam("b_original")),
+            flags,
+        )
+    return len(flags)
+
+
+def index_missing(db: Session, entity: str, batch_size: int = INDEX_BATCH_SIZE) -> int:
+    """Index rows that have no signature yet (rows older than the index); doesn't flag them."""
+    model = MODELS[entity]
+    last_id = 0
+    done = 0
+    while True:
+        rows = db.execute(
+            select(model.id, model.content)
+            .outerjoin(
+                _signatures,
+                (_signatures.c.entity == entity) & (_signatures.c.item_id == model.id),
+            )
+            .where(_signatures.c.item_id.is_(None), model.id > last_id)
+            .order_by(model.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return done
+        for item_id, text in rows:
+            sig = signature(text)
+            if sig is not None:
+                _store(db, entity, item_id, sig, replace=False)
+                done += 1
+        db.commit()
+        last_id = rows[-1][0]
+
+
+def cluster(db: Session, entity: str, batch_size: int = INDEX_BATCH_SIZE) -> tuple[int, int]:
+    """
+    Group the whole library into near-duplicate clusters and point every
+    member at the oldest item of its cluster. Returns (clusters, flagged rows).
+    """
+    import numpy as np
+
+    index_missing(db, entity, batch_size)
+    model = MODELS[entity]
+
+    sigs = {
+        item_id: np.frombuffer(stored, dtype="<u4")
+        for item_id, stored in db.execute(
+            select(_signatures.c.item_id, _signatures.c.signature).where(_signatures.c.entity == entity)
+        )
+    }
+    parent = {}
+
+    def root(item_id):
+        while parent.get(item_id, item_id) != item_id:
+            parent[item_id] = parent.get(parent[item_id], parent[item_id])
+            item_id = parent[item_id]
+        return item_id
+
+    def check_bucket(members):
+        # Each member is compared with one member per cluster seen in the bucket,
+        # not with every member: m copies of one text cost m comparisons, not m²/2
+        leaders = {}
+        for item_id in members:
+            mine, merged = root(item_id), False
+            for leader in list(leaders.values()):
+                theirs = root(leader)
+                if theirs != mine and similarity(sigs[item_id], sigs[leader]) >= THRESHOLD:
+                    # The smaller (older) id becomes the root, i.e. the original
+                    parent[max(mine, theirs)] = min(mine, theirs)
+                    mine, merged = min(mine, theirs), True
+            if merged:
+                leaders = {root(leader): leader for leader in leaders.values()}
+            leaders.setdefault(mine, item_id)
+
+    current_bucket, members = None, []
+    for bucket, item_id in db.execute(
+        select(_buckets.c.bucket, _buckets.c.item_id)
+        .where(_buckets.c.entity == entity)
+        .order_by(_buckets.c.bucket, _buckets.c.item_id)
+        .execution_options(yield_per=batch_size)
+    ):
+        if bucket != current_bucket:
+            check_bucket(members)
+            current_bucket, members = bucket, []
+        members.append(item_id)
+    check_bucket(members)
+
+    wanted = {item_id: root(item_id) for item_id in parent if root(item_id) != item_id}
+    flagged = {
+        item_id: original
+        for item_id, original in db.query(model.id, model.duplicate_of).filter(model.duplicate_of.isnot(None))
+    }
+    changes = [
+        {"b_id": item_id, "b_original": wanted.get(item_id)}
+        for item_id in set(wanted) | set(flagged)
+        if wanted.get(item_id) != flagged.get(item_id)
+    ]
+    if changes:
+        db.connection().execute(
+            update(model).where(model.id == bindparam("b_id")).values(duplicate_of=bindparam("b_original")),
+            changes,
+        )
+        version_service.mark_changed(db, entity)
+    db.commit()
+    return len(set(wanted.values())), len(wanted)
+
+
+# ---- ORM writes ----
+
+@event.listens_for(Session, "before_flush")
+def _check_bodies(session, flush_context, instances):
+    pending = []
+    for obj in list(session.new) + list(session.dirty):
+        entity = ENTITY_OF.get(type(obj))
+        if entity is None:
+            continue
+        state = inspect(obj)
+        if obj not in session.new and not state.attrs.content.history.has_changes():
+            continue
+        sig = signature(obj.content)
+        # An explicitly set duplicate_of is kept; edits only compare against older items
+        if not state.attrs.duplicate_of.history.added:
+            matches = _matches(session, entity, sig, below=obj.id) if sig is not None else []
+            obj.duplicate_of = _original(session, entity, matches)
+        pending.append((entity, obj, sig))
+    if pending:
+        session.info.setdefault(_PENDING_KEY, []).extend(pending)
+
+
+@event.listens_for(Session, "after_flush")
+def _index_bodies(session, flush_context):
+    for entity, obj, sig in session.info.pop(_PENDING_KEY, []):
+        _store(session, entity, obj.id, sig)
+
+    deleted = {}
+    for obj in session.deleted:
+        entity = ENTITY_OF.get(type(obj))
+        if entity is not None:
+            deleted.setdefault(entity, []).append(obj.id)
+    for entity, ids in deleted.items():
+        _unindex(session, entity, ids)
+        model = MODELS[entity]
+        # Their duplicates lose the original; the next cluster run regroups them
+        session.connection().execute(
+            update(model).where(model.duplicate_of.in_(ids)).values(duplicate_of=None)
+        )
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_bodies(session):
+    session.info.pop(_PENDING_KEY, None)
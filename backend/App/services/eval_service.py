@@ -0,0 +1,274 @@
+# services/eval_service.py
+"""
+Batch evaluation: run one agent over a dataset of inputs.
+
+The dataset is NDJSON (or a JSON array, gzip ok; read with
+import_service.ItemDecoder), one case per record:
+    {"input": "What is 2 + 3?", "expected": "5", "match": "contains", "id": "sum-1"}
+Only "input" is required. A case with "expected" is scored pass/fail by
+`match`: contains (the default), exact, both ignoring case and spacing, or
+regex (re.search, in a child interpreter killed after REGEX_TIMEOUT_SECONDS,
+so a catastrophic pattern fails its case instead of stalling the event
+loop). A first record of the form {"config": {...AgentCreate}}
+evaluates that unsaved config instead of a saved agent, like /agents/test.
+
+Cases go through agent_service like any other run, with at most
+`concurrency` of them in flight and, with `rate`, at most that many started
+per minute (evenly spaced). run() yields one result record per case as it
+finishes (so in completion order; "index" is its position in the dataset),
+then a summary: pass rate, latency percentiles, token usage and cost. Every
+model call is also recorded in llm_calls under source "agent.eval".
+"""
+import asyncio
+import json
+import math
+import os
+import re
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Iterable, Optional
+
+from pydantic import ValidationError
+
+from .. import schemas
+from . import agent_service
+
+MAX_CASES = int(os.getenv("EVAL_MAX_CASES", "1000"))
+MAX_DATASET_BYTES = int(os.getenv("EVAL_MAX_DATASET_MB", "32")) * 1024 * 1024
+DEFAULT_CONCURRENCY = 4
+MAX_CONCURRENCY = 16
+CASE_TIMEOUT_SECONDS = float(os.getenv("EVAL_CASE_TIMEOUT_SECONDS", "120"))
+MATCHES = ("contains", "exact", "regex")
+REGEX_TIMEOUT_SECONDS = 2.0
+
+# re.search never releases the GIL, so a thread can't bound it; a process can be killed
+_REGEX_SCRIPT = "import json, re, sys; p, s = json.load(sys.stdin); print(int(re.search(p, s) is not None))"
+
+
+@dataclass
+class Case:
+    index: int
+    input: str
+    expected: Optional[str] = None
+    match: str = "contains"
+    id: Any = None
+
+
+class DatasetError(ValueError):
+    def __init__(self, errors: list[dict]):
+        super().__init__(f"{len(errors)} invalid record(s)")
+        self.errors = errors
+
+
+def _error_text(exc: Exception) -> str:
+    if isinstance(exc, ValidationError):
+        return "; ".join(f"{'.'.join(str(p) for p in err['loc']) or 'record'}: {err['msg']}" for err in exc.errors())
+    return str(exc)
+
+
+def parse_dataset(
+    items: Iterable[tuple[int, Any]], default_match: str = "contains"
+) -> tuple[Optional[schemas.AgentCreate], list[Case]]:
+    """
+    (config or None, cases) from ItemDecoder output. Raises DatasetError
+    listing every unusable record, so nothing runs on a half-valid dataset.
+    """
+    config, cases, errors = None, [], []
+    for index, item in items:
+        try:
+            if isinstance(item, Exception):
+                raise item
+            if not isinstance(item, dict):
+                raise ValueError("expected a JSON object")
+            if "config" in item:
+                if index != 0:
+                    raise ValueError("a config record must come first")
+                config = schemas.AgentCreate.model_validate(item["config"])
+                continue
+            if not isinstance(item.get("input"), str) or not item["input"].strip():
+                raise ValueError("input: a non-empty string is required")
+            expected = item.get("expected")
+            match = item.get("match") or default_match
+            if match not in MATCHES:
+                raise ValueError(f"match: one of {', '.join(MATCHES)}")
+            if expected is not None:
+                expected = str(expected)
+                if match == "regex":
+                    re.compile(expected)
+            cases.append(Case(index, item["input"], expected, match, item.get("id")))
+        except (ValueError, ValidationError, re.error) as exc:
+            errors.append({"index": index, "error": _error_text(exc)})
+        if len(cases) > MAX_CASES:
+            errors.append({"index": index, "error": f"at most {MAX_CASES} cases per run"})
+            break
+    if errors:
+        raise DatasetError(errors[:100])
+    return config, cases
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split()).casefold()
+
+
+async def _regex_search(pattern: str, text: str) -> bool:
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, "-I", "-S", "-c", _REGEX_SCRIPT,
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+    )
+    try:
+        out, _ = await asyncio.wait_for(
+            proc.communicate(json.dumps([pattern, text]).encode("utf-8")), REGEX_TIMEOUT_SECONDS
+        )
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        raise TimeoutError(f"regex took longer than {REGEX_TIMEOUT_SECONDS:g}s") from None
+    return out.strip() == b"1"
+
+
+async def score(output: str, expected: str, match: str) -> bool:
+    if match == "regex":
+        return await _regex_search(expected, output)
+    if match == "exact":
+        return _normalize(output) == _normalize(expected)
+    return _normalize(expected) in _normalize(output)
+
+
+class RateLimiter:
+    """Spaces out starts to at most `per_minute` a minute (no bursts)."""
+
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute
+        self.next_start = 0.0
+
+    async def wait(self) -> None:
+        now = time.monotonic()
+        start = max(now, self.next_start)
+        self.next_start = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+def _percentile(values: list[float], q: float) -> Optional[float]:
+    # Nearest rank: an observed value, meaningful for small runs too
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[max(0, math.ceil(q * len(ordered)) - 1)], 2)
+
+
+class Summary:
+    def __init__(self, cases: int):
+        self.cases = cases
+        self.started = time.perf_counter()
+        self.errors = self.scored = self.passed = 0
+        self.latencies: list[float] = []
+        self.tokens = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        self.cost_usd = 0.0
+
+    def add(self, record: dict) -> None:
+        self.latencies.append(record["latency_ms"])
+        if record["error"]:
+            self.errors += 1
+        if record["passed"] is not None:
+            self.scored += 1
+            self.passed += record["passed"]
+        for key in self.tokens:
+            self.tokens[key] += record["usage"].get(key) or 0
+        self.cost_usd += record["usage"].get("cost_usd") or 0
+
+    def record(self) -> dict:
+        duration = time.perf_counter() - self.started
+        done = len(self.latencies)
+        return {
+            "type": "summary",
+            "cases": self.cases,
+            "completed": done - self.errors,
+            "errors": self.errors,
+            "scored": self.scored,
+            "passed": self.passed,
+            "pass_rate": round(self.passed / self.scored, 4) if self.scored else None,
+            "latency_ms": {
+                "mean": round(sum(self.latencies) / done, 2) if done else None,
+                "p50": _percentile(self.latencies, 0.5),
+                "p95": _percentile(self.latencies, 0.95),
+                "max": _percentile(self.latencies, 1.0),
+            },
+            "usage": {**self.tokens, "cost_usd": round(self.cost_usd, 6)},
+            "duration_ms": round(duration * 1000, 2),
+            "cases_per_second": round(done / duration, 3) if duration else None,
+        }
+
+
+async def _run_case(case: Case, resolved: dict, user_id: Optional[int], timeout: float) -> dict:
+    started = time.perf_counter()
+    output, usage, error = None, {}, None
+    try:
+        result = await asyncio.wait_for(
+            agent_service.run_resolved(resolved, case.input, source="agent.eval", user_id=user_id), timeout
+        )
+        output, usage = result["output"], result.get("usage") or {}
+    except asyncio.TimeoutError:
+        error = f"timed out after {timeout:g}s"
+    except Exception as exc:
+        error = f"{type(exc).__name__}: {exc}"
+    passed = None
+    if output is not None and case.expected is not None:
+        try:
+            passed = await score(output, case.expected, case.match)
+        except TimeoutError as exc:
+            error = f"scoring: {exc}"
+    if error and case.expected is not None:
+        passed = False
+    return {
+        "type": "result",
+        "index": case.index,
+        "id": case.id,
+        "input": case.input,
+        "expected": case.expected,
+        "output": output,
+        "passed": passed,
+        "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+        "usage": usage,
+        "error": error,
+    }
+
+
+async def run(
+    resolved: dict,
+    cases: list[Case],
+    concurrency: int = DEFAULT_CONCURRENCY,
+    rate: Optional[float] = None,
+    user_id: Optional[int] = None,
+    timeout: float = CASE_TIMEOUT_SECONDS,
+) -> AsyncIterator[dict]:
+    """
+    Run `cases` against an agent resolved by agent_service.resolve_agent() /
+    resolve_config(). Yields result records as cases finish, then the summary.
+    """
+    concurrency = max(1, min(concurrency, MAX_CONCURRENCY))
+    limiter = RateLimiter(rate) if rate else None
+    summary = Summary(len(cases))
+    pending: set[asyncio.Task] = set()
+    try:
+        for case in cases:
+            while len(pending) >= concurrency:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    summary.add(task.result())
+                    yield task.result()
+            if limiter:
+                await limiter.wait()
+            pending.add(asyncio.create_task(_run_case(case, resolved, user_id, timeout)))
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                summary.add(task.result())
+                yield task.result()
+    finally:
+        # The client went away (or the consumer stopped): don't leave cases running
+        for task in pending:
+            task.cancel()
+    yield summary.record()
@@ -0,0 +1,124 @@
+# services/export_service.py
+"""
+Streaming NDJSON export of the prompt, tool and agent libraries.
+
+Rows are read with yield_per, so memory stays flat however large the
+library is; agents are emitted with their agent_tools / agent_prompts rows
+inlined, fetched with one IN query per yield_per batch. Every line carries a
+"type" field, so one file can hold all three libraries (and is what
+import_service reads back).
+"""
+import zlib
+from collections import defaultdict
+from typing import Iterable, Iterator, Optional
+
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..core.responses import dumps
+from . import blob_service
+from ..database import SessionLocal
+
+ENTITIES = ("prompts", "tools", "agents")
+RECORD_TYPES = {"prompts": "prompt", "tools": "tool", "agents": "agent"}
+MODELS = {"prompts": models.Prompt, "tools": models.Tool, "agents": models.Agent}
+
+EXPORT_BATCH_SIZE = 500
+# Lines are buffered up to this size before a chunk goes out (and into gzip)
+FLUSH_BYTES = 64 * 1024
+
+
+def _select(entity: str, created_by: Optional[int], viewer_id: Optional[int]):
+    table = MODELS[entity].__table__
+    stmt = select(table).order_by(table.c.id)
+    if created_by is not None:
+        stmt = stmt.where(table.c.created_by == created_by)
+    if entity == "agents" and viewer_id is not None:
+        # Other people's private agents stay out of API exports
+        stmt = stmt.where(or_(table.c.visibility != "private", table.c.created_by == viewer_id))
+    return stmt
+
+
+def _children(db: Session, model, agent_ids: list[int], order_by) -> dict[int, list[dict]]:
+    table = model.__table__
+    text_column, hash_column, _ = blob_service.REFERENCES[model]
+    rows = db.execute(
+        select(table).where(table.c.agent_id.in_(agent_ids)).order_by(table.c.agent_id, *order_by)
+    ).mappings().all()
+
+    # Bodies live in content_blobs; inline them so the file stands on its own
+    bodies = blob_service.get_many(db, [row[hash_column] for row in rows])
+    grouped = defaultdict(list)
+    for row in rows:
+        child = dict(row)
+        if child[hash_column] in bodies:
+            child[text_column] = bodies[child[hash_column]]
+        grouped[child.pop("agent_id")].append(child)
+    return grouped
+
+
+def iter_records(
+    db: Session,
+    entity: str,
+    created_by: Optional[int] = None,
+    viewer_id: Optional[int] = None,
+    batch_size: int = EXPORT_BATCH_SIZE,
+) -> Iterator[dict]:
+    record_type = RECORD_TYPES[entity]
+    result = db.execute(
+        _select(entity, created_by, viewer_id).execution_options(yield_per=batch_size)
+    ).mappings()
+
+    for batch in result.partitions():
+        if entity != "agents":
+            for row in batch:
+                yield {"type": record_type, **row}
+            continue
+
+        ids = [row["id"] for row in batch]
+        tools = _children(db, models.AgentTool, ids, [models.AgentTool.id])
+        prompts = _children(db, models.AgentPrompt, ids, [models.AgentPrompt.order, models.AgentPrompt.id])
+        for row in batch:
+            yield {
+                "type": record_type,
+                **row,
+                "tools": tools.get(row["id"], []),
+                "prompts": prompts.get(row["id"], []),
+            }
+
+
+def stream_ndjson(
+    entities: Iterable[str],
+    created_by: Optional[int] = None,
+    viewer_id: Optional[int] = None,
+    compress: bool = False,
+    batch_size: int = EXPORT_BATCH_SIZE,
+) -> Iterator[bytes]:
+    """
+    Yield the export as NDJSON chunks (gzip-framed when `compress`).
+
+    Opens its own session: a StreamingResponse body runs after the request's
+    get_db session has already been closed.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    buffer = bytearray()
+    db = SessionLocal()
+    try:
+        for entity in entities:
+            for record in iter_records(db, entity, created_by, viewer_id, batch_size):
+                buffer += dumps(record)
+                buffer += b"\n"
+                if len(buffer) >= FLUSH_BYTES:
+                    chunk = compressor.compress(bytes(buffer)) if compressor else bytes(buffer)
+                    buffer.clear()
+                    if chunk:
+                        yield chunk
+
+        tail = bytes(buffer)
+        if compressor:
+            tail = compressor.compress(tail) + compressor.flush()
+        if tail:
+            yield tail
+    finally:
+        db.close()
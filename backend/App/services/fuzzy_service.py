@@ -0,0 +1,186 @@
+# services/fuzzy_service.py
+"""
+Typo-tolerant ?search= for the prompt, tool and agent lists (trigram matching).
+
+Text is compared the way pg_trgm does it: lowercased, split into words of
+letters and digits, each word padded as "  word " and cut into trigrams.
+"promt" shares 4 of its 6 trigrams with "prompt", so it still finds it.
+
+An item matches when at least `threshold` of the query's trigrams occur in
+one of its FIELDS, and results are ranked by that share (the similarity):
+- on Postgres, with pg_trgm's word_similarity() and `%>` over GIN
+  gin_trgm_ops indexes on each field (revision 0013);
+- elsewhere (SQLite), over search_trigrams, a posting table of
+  (entity, trigram, item_id) that the application keeps. The share is
+  counted per item over all its fields together, which can only match a
+  little more than pg_trgm does.
+
+The postings are kept current like the other derived indexes: ORM writes
+by the flush hook below, bulk inserts (imports) through index_written(),
+and `python -m App.cli fuzzy rebuild` re-indexes everything.
+
+Tool bodies (code) are not trigram-indexed: they would dominate the
+posting table and a misspelled identifier is rarely what users look for.
+The exact (ILIKE) search still covers them.
+"""
+import math
+import re
+from typing import Iterable
+
+from sqlalchemy import Text, cast, delete, event, func, inspect, insert, literal, or_, select, text
+from sqlalchemy.orm import Query, Session
+
+from .. import models
+
+DEFAULT_THRESHOLD = 0.5
+INDEX_BATCH_SIZE = 500
+
+# entity -> (model, fields searched)
+FIELDS = {
+    "prompts": (models.Prompt, ("title", "description", "category", "tags")),
+    "tools": (models.Tool, ("title", "description", "language", "tags")),
+    "agents": (models.Agent, ("title", "description", "tags")),
+}
+ENTITY_OF = {model: entity for entity, (model, _) in FIELDS.items()}
+
+# pg_trgm's word characters: letters and digits only
+_WORD_RE = re.compile(r"[^\W_]+")
+
+_postings = models.TrigramPosting.__table__
+
+
+def trigrams(value) -> set[str]:
+    if value is None:
+        return set()
+    if isinstance(value, (list, tuple)):
+        value = " ".join(str(v) for v in value)
+    grams = set()
+    for word in _WORD_RE.findall(str(value).lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _item_trigrams(entity: str, obj) -> set[str]:
+    get = obj.get if isinstance(obj, dict) else lambda name: getattr(obj, name, None)
+    _, fields = FIELDS[entity]
+    grams = set()
+    for field in fields:
+        grams |= trigrams(get(field))
+    return grams
+
+
+def _uses_pg_trgm(session: Session) -> bool:
+    return session.get_bind().dialect.name == "postgresql"
+
+
+# ---- querying ----
+
+def fuzzy_filter(db: Session, query: Query, entity: str, search: str, threshold: float = DEFAULT_THRESHOLD):
+    """
+    Restrict a list query to items matching `search` at `threshold` or more.
+    Returns (query, similarity column to order by), or (query, None) if
+    `search` has no letters or digits, which matches nothing.
+    """
+    model, fields = FIELDS[entity]
+    grams = trigrams(search)
+    if not grams:
+        return query.filter(literal(False)), None
+
+    if _uses_pg_trgm(db):
+        # %> compares against this setting; set_config(..., true) lasts until the transaction ends
+        db.execute(
+            text("SELECT set_config('pg_trgm.word_similarity_threshold', :threshold, true)"),
+            {"threshold": str(threshold)},
+        )
+        columns = [_pg_column(model, field) for field in fields]
+        score = func.greatest(*[func.word_similarity(search, func.coalesce(col, "")) for col in columns])
+        return query.filter(or_(*[col.op("%>")(search) for col in columns])), score
+
+    needed = max(1, math.ceil(threshold * len(grams) - 1e-9))
+    matched = func.count()
+    hits = (
+        select(_postings.c.item_id, (matched * 1.0 / len(grams)).label("similarity"))
+        .where(_postings.c.entity == entity, _postings.c.trigram.in_(grams))
+        # "+ 0" keeps SQLite from walking the (entity, item_id) index for the GROUP BY,
+        # i.e. every posting of the entity, instead of looking up the query's trigrams
+        .group_by(_postings.c.item_id + 0)
+        .having(matched >= needed)
+        .subquery()
+    )
+    return query.join(hits, hits.c.item_id == model.id), hits.c.similarity
+
+
+def _pg_column(model, field: str):
+    column = getattr(model, field)
+    # JSON tags are indexed and compared as their text
+    return cast(column, Text) if field == "tags" else column
+
+
+# ---- the posting table (not used on Postgres) ----
+
+def _store(session: Session, entity: str, items: dict) -> None:
+    """Replace the postings of {item_id: trigrams}."""
+    if not items:
+        return
+    conn = session.connection()
+    conn.execute(delete(_postings).where(_postings.c.entity == entity, _postings.c.item_id.in_(list(items))))
+    rows = [
+        {"entity": entity, "trigram": gram, "item_id": item_id}
+        for item_id, grams in items.items()
+        for gram in grams
+    ]
+    if rows:
+        conn.execute(insert(_postings), rows)
+
+
+def index_written(session: Session, entity: str, items: Iterable[tuple[int, object]]) -> None:
+    """Index (id, row-like) pairs inserted with bulk statements."""
+    if _uses_pg_trgm(session):
+        return
+    _store(session, entity, {item_id: _item_trigrams(entity, obj) for item_id, obj in items})
+
+
+def rebuild(db: Session, entity: str, batch_size: int = INDEX_BATCH_SIZE) -> int:
+    """Re-index every item of `entity`; returns how many (0 on Postgres, where pg_trgm does this)."""
+    if _uses_pg_trgm(db):
+        return 0
+    model, fields = FIELDS[entity]
+    columns = [getattr(model, field) for field in fields]
+    db.execute(delete(_postings).where(_postings.c.entity == entity))
+    last_id = 0
+    done = 0
+    while True:
+        rows = db.query(model.id, *columns).filter(model.id > last_id).order_by(model.id).limit(batch_size).all()
+        if not rows:
+            db.commit()
+            return done
+        _store(db, entity, {row.id: _item_trigrams(entity, row) for row in rows})
+        db.commit()
+        last_id = rows[-1].id
+        done += len(rows)
+
+
+# ---- ORM writes ----
+
+@event.listens_for(Session, "after_flush")
+def _index_items(session, flush_context):
+    changed, deleted = {}, {}
+    for obj in list(session.new) + list(session.dirty):
+        entity = ENTITY_OF.get(type(obj))
+        if entity is None:
+            continue
+        _, fields = FIELDS[entity]
+        state = inspect(obj)
+        # Likes and views update rows all the time; only re-index on text changes
+        if obj not in session.new and not any(state.attrs[f].history.has_changes() for f in fields):
+            continue
+        changed.setdefault(entity, {})[obj.id] = _item_trigrams(entity, obj)
+    for obj in session.deleted:
+        entity = ENTITY_OF.get(type(obj))
+        if entity is not None:
+            deleted.setdefault(entity, {})[obj.id] = set()
+    if not (changed or deleted) or _uses_pg_trgm(session):
+        return
+    for entity in set(changed) | set(deleted):
+        _store(session, entity, {**deleted.get(entity, {}), **changed.get(entity, {})})
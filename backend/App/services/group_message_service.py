@@ -0,0 +1,59 @@
+# services/group_message_service.py
+from sqlalchemy.orm import Session
+from typing import Optional
+from .. import models
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+Message = models.CommunityGroupMessage
+
+
+def fetch_group_messages(
+    db: Session,
+    group_id: int,
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+) -> list[dict]:
+    """
+    Keyset page of a group's messages, always returned in ascending id order.
+
+    - after_id only: the oldest `limit` messages newer than after_id (catch-up).
+    - otherwise: the newest `limit` messages older than before_id (or overall).
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    query = (
+        db.query(
+            Message.id,
+            Message.content,
+            Message.user_id,
+            Message.created_at,
+            models.User.full_name,
+        )
+        .join(models.User, models.User.id == Message.user_id)
+        .filter(Message.group_id == group_id)
+    )
+
+    if after_id is not None:
+        query = query.filter(Message.id > after_id)
+    if before_id is not None:
+        query = query.filter(Message.id < before_id)
+
+    if after_id is not None and before_id is None:
+        rows = query.order_by(Message.id.asc()).limit(limit).all()
+    else:
+        rows = query.order_by(Message.id.desc()).limit(limit).all()
+        rows.reverse()
+
+    return [
+        {
+            "id": row.id,
+            "content": row.content,
+            "user_id": row.user_id,
+            "user_name": row.full_name,
+            "created_at": row.created_at,
+        }
+        for row in rows
+    ]
@@ -0,0 +1,435 @@
+# services/import_service.py
+"""
+Bulk import of prompts, tools and agents from NDJSON or a JSON array.
+
+ItemDecoder is push based (feed it bytes as they arrive), so neither the API
+nor the CLI ever holds the whole payload. Items are validated one by one
+against the regular create schemas, collected per type, and written in
+chunks: one multi-row INSERT per table per chunk and one transaction per
+chunk, so a bad chunk only fails its own items.
+
+Duplicates are skipped rather than created twice: an item matches when the
+importing user already owns (or earlier in the same import added) one with
+the same title and content (system_prompt for agents). Records produced by
+export_service import as-is; their ids, counters and timestamps are ignored,
+and library references (tool_id / prompt_id) that don't exist here are
+dropped, keeping the inline copy.
+"""
+import codecs
+import hashlib
+import json
+import zlib
+from typing import Any, Iterable, Optional
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from .. import models, schemas
+from . import blob_service, duplicate_service, fuzzy_service, similarity_service, stats_service, version_service
+
+IMPORT_CHUNK_SIZE = 500
+MAX_REPORTED = 1000
+
+TYPES = {
+    "prompt": (schemas.PromptCreate, models.Prompt, "prompts"),
+    "tool": (schemas.ToolCreate, models.Tool, "tools"),
+    "agent": (schemas.AgentCreate, models.Agent, "agents"),
+}
+
+
+class ItemDecoder:
+    """Incremental decoder for NDJSON or a single top-level JSON array."""
+
+    def __init__(self, gzip: bool = False):
+        self._inflate = zlib.decompressobj(47) if gzip else None  # 47: gzip or zlib header
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._json = json.JSONDecoder()
+        self._buffer = ""
+        self._mode: Optional[str] = None
+        self._index = 0
+        self._closed = False
+
+    def feed(self, data: bytes, final: bool = False) -> list[tuple[int, Any]]:
+        """Return (index, item) pairs completed by `data`; item is an Exception when unparsable."""
+        if self._inflate is not None:
+            data = self._inflate.decompress(data) + (self._inflate.flush() if final else b"")
+        self._buffer += self._utf8.decode(data, final)
+
+        if self._mode is None:
+            stripped = self._buffer.lstrip()
+            if not stripped:
+                return []
+            self._mode = "array" if stripped[0] == "[" else "lines"
+            self._buffer = stripped[1:] if self._mode == "array" else stripped
+
+        return self._lines(final) if self._mode == "lines" else self._array(final)
+
+    def _next_index(self) -> int:
+        self._index += 1
+        return self._index - 1
+
+    def _lines(self, final: bool) -> list[tuple[int, Any]]:
+        *lines, self._buffer = self._buffer.split("\n")
+        if final:
+            lines.append(self._buffer)
+            self._buffer = ""
+
+        items = []
+        for line in lines:
+            if not line.strip():
+                continue
+            index = self._next_index()
+            try:
+                items.append((index, json.loads(line)))
+            except ValueError as exc:
+                items.append((index, exc))
+        return items
+
+    def _array(self, final: bool) -> list[tuple[int, Any]]:
+        items = []
+        buffer = self._buffer
+        pos = 0
+        while not self._closed:
+            while pos < len(buffer) and (buffer[pos].isspace() or buffer[pos] == ","):
+                pos += 1
+            if pos >= len(buffer):
+                break
+            if buffer[pos] == "]":
+                self._closed = True
+                pos += 1
+                break
+            try:
+                item, pos = self._json.raw_decode(buffer, pos)
+            except ValueError as exc:
+                if final:
+                    # Can't resync inside a broken array: report it and stop
+                    items.append((self._next_index(), exc))
+                    pos = len(buffer)
+                break  # otherwise wait for more data
+            items.append((self._next_index(), item))
+
+        self._buffer = buffer[pos:]
+        if final and not self._closed and not items:
+            items.append((self._next_index(), ValueError("Unterminated JSON array")))
+        return items
+
+
+def _digest(*parts: Optional[str]) -> str:
+    h = hashlib.sha1()
+    for part in parts:
+        h.update((part or "").encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _error_text(exc: Exception) -> str:
+    if isinstance(exc, ValidationError):
+        return "; ".join(
+            f"{'.'.join(str(p) for p in err['loc']) or 'item'}: {err['msg']}" for err in exc.errors()
+        )
+    return str(exc)
+
+
+class BulkImporter:
+    def __init__(
+        self,
+        db: Session,
+        user: models.User,
+        default_type: Optional[str] = None,
+        dedupe: bool = True,
+        chunk_size: int = IMPORT_CHUNK_SIZE,
+    ):
+        self.db = db
+        self.user = user
+        self.default_type = default_type
+        self.dedupe = dedupe
+        self.chunk_size = chunk_size
+
+        self._pending: dict[str, list[tuple[int, Any]]] = {t: [] for t in TYPES}
+        self._seen: set[tuple[str, str]] = set()
+        self.processed = 0
+        self.created = {entity: 0 for _, _, entity in TYPES.values()}
+        self.skipped_count = 0
+        self.failed_count = 0
+        self.skipped: list[dict] = []
+        self.errors: list[dict] = []
+
+    # ---- intake ----
+
+    def add_many(self, items: Iterable[tuple[int, Any]]) -> None:
+        for index, item in items:
+            self.add(index, item)
+
+    def add(self, index: int, item: Any) -> None:
+        self.processed += 1
+        if isinstance(item, Exception):
+            self._fail(index, None, f"Invalid JSON: {item}")
+            return
+        if not isinstance(item, dict):
+            self._fail(index, None, "Item must be a JSON object")
+            return
+
+        item_type = item.get("type", self.default_type)
+        if item_type not in TYPES:
+            self._fail(index, item_type, "Missing or unknown type (expected prompt, tool or agent)")
+            return
+
+        try:
+            payload = TYPES[item_type][0].model_validate(item)
+        except ValidationError as exc:
+            self._fail(index, item_type, _error_text(exc))
+            return
+
+        pending = self._pending[item_type]
+        pending.append((index, payload))
+        if len(pending) >= self.chunk_size:
+            self._flush(item_type)
+
+    def finish(self) -> dict:
+        for item_type in TYPES:
+            self._flush(item_type)
+        return self.report()
+
+    def report(self) -> dict:
+        return {
+            "processed": self.processed,
+            "created": self.created,
+            "skipped": self.skipped_count,
+            "failed": self.failed_count,
+            "duplicates": self.skipped,
+            "errors": self.errors,
+            "truncated": len(self.skipped) < self.skipped_count or len(self.errors) < self.failed_count,
+        }
+
+    def _fail(self, index: int, item_type: Optional[str], error: str) -> None:
+        self.failed_count += 1
+        if len(self.errors) < MAX_REPORTED:
+            self.errors.append({"index": index, "type": item_type, "error": error})
+
+    def _skip(self, index: int, item_type: str, existing_id: Optional[int]) -> None:
+        self.skipped_count += 1
+        if len(self.skipped) < MAX_REPORTED:
+            self.skipped.append({"index": index, "type": item_type, "existing_id": existing_id})
+
+    # ---- writing ----
+
+    def _flush(self, item_type: str) -> None:
+        batch = self._pending[item_type]
+        if not batch:
+            return
+        self._pending[item_type] = []
+
+        batch = self._dedupe(item_type, batch)
+        if not batch:
+            return
+
+        try:
+            writer = {"prompt": self._write_prompts, "tool": self._write_tools, "agent": self._write_agents}
+            writer[item_type]([payload for _, payload in batch])
+            self.db.commit()
+        except Exception as exc:
+            self.db.rollback()
+            for index, _ in batch:
+                self._fail(index, item_type, f"Chunk failed: {exc.__class__.__name__}: {str(exc)[:300]}")
+            return
+
+        self.created[TYPES[item_type][2]] += len(batch)
+
+    def _key(self, item_type: str, payload) -> str:
+        body = payload.system_prompt if item_type == "agent" else payload.content
+        return _digest(payload.title, body)
+
+    def _dedupe(self, item_type: str, batch: list) -> list:
+        if not self.dedupe:
+            return batch
+
+        model = TYPES[item_type][1]
+        body_column = model.system_prompt if item_type == "agent" else model.content
+        titles = {payload.title for _, payload in batch}
+        existing = {
+            _digest(title, body): row_id
+            for row_id, title, body in self.db.execute(
+                select(model.id, model.title, body_column).where(
+                    model.created_by == self.user.id, model.title.in_(titles)
+                )
+            )
+        }
+
+        kept = []
+        for index, payload in batch:
+            key = self._key(item_type, payload)
+            if key in existing:
+                self._skip(index, item_type, existing[key])
+            elif (item_type, key) in self._seen:
+                self._skip(index, item_type, None)
+            else:
+                self._seen.add((item_type, key))
+                kept.append((index, payload))
+        return kept
+
+    def _owner(self) -> dict:
+        return {"created_by": self.user.id, "creator_name": self.user.full_name}
+
+    def _insert_returning_ids(self, model, rows: list[dict]) -> list[int]:
+        if not rows:
+            return []
+        return list(self.db.scalars(insert(model).returning(model.id, sort_by_parameter_order=True), rows))
+
+    def _write_prompts(self, payloads: list) -> None:
+        # Bulk statements skip blob_service's flush hook, so hashes are stored here
+        hashes = blob_service.digests(p.content for p in payloads)
+        ids = self._insert_returning_ids(models.Prompt, [
+            {
+                "title": p.title,
+                "description": p.description,
+                "content": p.content,
+                "content_hash": h,
+                "tags": p.tags,
+                "category": p.category,
+                "recommended_model": p.recommended_model,
+                **self._owner(),
+            }
+            for p, h in zip(payloads, hashes)
+        ])
+        stats_service.bump(self.db, self.user.id, total_prompts=len(payloads))
+        version_service.mark_changed(self.db, "prompts")
+        similarity_service.mark_written(self.db, "prompts", zip(ids, payloads))
+        fuzzy_service.index_written(self.db, "prompts", zip(ids, payloads))
+        duplicate_service.index_written(self.db, "prompts", zip(ids, [p.content for p in payloads]))
+
+    def _write_tools(self, payloads: list) -> None:
+        hashes = blob_service.digests(t.content for t in payloads)
+        ids = self._insert_returning_ids(models.Tool, [
+            {
+                "title": t.title,
+                "description": t.description,
+                "content": t.content,
+                "content_hash": h,
+                "tags": t.tags or [],
+                "recommended_model": t.recommended_model,
+                "language": t.language,
+                "version": t.version,
+                "instructions": t.instructions,
+                **self._owner(),
+            }
+            for t, h in zip(payloads, hashes)
+        ])
+        stats_service.bump(self.db, self.user.id, total_tools=len(payloads))
+        version_service.mark_changed(self.db, "tools")
+        similarity_service.mark_written(self.db, "tools", zip(ids, payloads))
+        fuzzy_service.index_written(self.db, "tools", zip(ids, payloads))
+        duplicate_service.index_written(self.db, "tools", zip(ids, [t.content for t in payloads]))
+
+    def _existing_ids(self, model, ids: set) -> set:
+        ids.discard(None)
+        if not ids:
+            return set()
+        return set(self.db.scalars(select(model.id).where(model.id.in_(ids))))
+
+    def _write_agents(self, payloads: list) -> None:
+        # Same shape as agent_service.create_agent, one statement per table
+        agent_ids = self._insert_returning_ids(models.Agent, [
+            {
+                "title": a.title,
+                "description": a.description,
+                "system_prompt": a.system_prompt,
+                "model": a.model,
+                "temperature": a.temperature,
+                "max_tokens": a.max_tokens,
+                "visibility": a.visibility,
+                "tags": a.tags,
+                "instructions": a.instructions,
+                **self._owner(),
+            }
+            for a in payloads
+        ])
+
+        known_tools = self._existing_ids(models.Tool, {t.tool_id for a in payloads for t in a.tools})
+        known_prompts = self._existing_ids(models.Prompt, {p.prompt_id for a in payloads for p in a.prompts})
+
+        library_tools = [(a, t) for a in payloads for t in a.tools if t.save_to_library]
+        library_tool_hashes = blob_service.digests(t.code for _, t in library_tools)
+        library_tool_rows = [
+            {
+                "title": t.name,
+                "description": t.description,
+                "content": t.code,
+                "content_hash": h,
+                "tags": a.tags,
+                **self._owner(),
+            }
+            for (a, t), h in zip(library_tools, library_tool_hashes)
+        ]
+        new_tool_ids = self._insert_returning_ids(models.Tool, library_tool_rows)
+        library_tool_ids = iter(new_tool_ids)
+        library_prompts = [(a, p) for a in payloads for p in a.prompts if p.save_to_library]
+        library_prompt_hashes = blob_service.digests(p.content for _, p in library_prompts)
+        library_prompt_rows = [
+            {
+                "title": f"Prompt from {a.title}",
+                "description": f"Automated prompt extraction from {a.title}",
+                "content": p.content,
+                "content_hash": h,
+                "tags": a.tags,
+                **self._owner(),
+            }
+            for (a, p), h in zip(library_prompts, library_prompt_hashes)
+        ]
+        new_prompt_ids = self._insert_returning_ids(models.Prompt, library_prompt_rows)
+        library_prompt_ids = iter(new_prompt_ids)
+
+        # Agent children keep only the hash, like rows written through the ORM
+        tool_hashes = iter(blob_service.acquire(self.db, [t.code for a in payloads for t in a.tools]))
+        prompt_hashes = iter(blob_service.acquire(self.db, [p.content for a in payloads for p in a.prompts]))
+
+        tool_rows, prompt_rows = [], []
+        for agent_id, a in zip(agent_ids, payloads):
+            for t in a.tools:
+                tool_id = next(library_tool_ids) if t.save_to_library else t.tool_id
+                tool_rows.append({
+                    "agent_id": agent_id,
+                    "name": t.name,
+                    "description": t.description,
+                    "code_hash": next(tool_hashes),
+                    "enabled": t.enabled,
+                    "config": t.config,
+                    "tool_id": tool_id if t.save_to_library or tool_id in known_tools else None,
+                })
+            for p in a.prompts:
+                prompt_id = next(library_prompt_ids) if p.save_to_library else p.prompt_id
+                prompt_rows.append({
+                    "agent_id": agent_id,
+                    "role": p.role,
+                    "content_hash": next(prompt_hashes),
+                    "order": p.order,
+                    "prompt_id": prompt_id if p.save_to_library or prompt_id in known_prompts else None,
+                })
+
+        if tool_rows:
+            self.db.execute(insert(models.AgentTool), tool_rows)
+        if prompt_rows:
+            self.db.execute(insert(models.AgentPrompt), prompt_rows)
+
+        stats_service.bump(
+            self.db,
+            self.user.id,
+            total_agents=len(payloads),
+            total_tools=len(library_tools),
+            total_prompts=len(library_prompts),
+        )
+        version_service.mark_changed(self.db, "agents")
+        similarity_service.mark_written(self.db, "agents", zip(agent_ids, payloads))
+        similarity_service.mark_written(self.db, "tools", zip(new_tool_ids, library_tool_rows))
+        similarity_service.mark_written(self.db, "prompts", zip(new_prompt_ids, library_prompt_rows))
+        fuzzy_service.index_written(self.db, "agents", zip(agent_ids, payloads))
+        fuzzy_service.index_written(self.db, "tools", zip(new_tool_ids, library_tool_rows))
+        fuzzy_service.index_written(self.db, "prompts", zip(new_prompt_ids, library_prompt_rows))
+        duplicate_service.index_written(self.db, "tools", zip(new_tool_ids, [r["content"] for r in library_tool_rows]))
+        duplicate_service.index_written(
+            self.db, "prompts", zip(new_prompt_ids, [r["content"] for r in library_prompt_rows])
+        )
+        if library_tools:
+            version_service.mark_changed(self.db, "tools")
+        if library_prompts:
+            version_service.mark_changed(self.db, "prompts")
@@ -0,0 +1,213 @@
+# services/llm_telemetry.py
+"""
+Per-call model telemetry.
+
+Wrap a runner.run_async loop in track() and feed every event to
+call.observe(); when the block exits the call is written to llm_calls and
+added to the llm_* series on /metrics. Token counts come from the
+usage_metadata ADK copies onto model events, retries from LiteLLM's failure
+callbacks, cost from LiteLLM's price table.
+
+Telemetry never fails the request: a broken write is logged and dropped.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..core import metrics
+from ..database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+_current_call: ContextVar[Optional["LLMCallRecorder"]] = ContextVar("llm_call", default=None)
+_hook_installed = False
+
+
+class LLMCallRecorder:
+    def __init__(self, source: str, model: str, agent_id=None, user_id=None, agent_run_id=None):
+        self.source = source
+        self.model = model
+        self.agent_id = agent_id
+        self.user_id = user_id
+        self.agent_run_id = agent_run_id
+
+        self.started = time.perf_counter()
+        self.first_output: Optional[float] = None
+        self.prompt_tokens: Optional[int] = None
+        self.completion_tokens: Optional[int] = None
+        self.total_tokens: Optional[int] = None
+        self.failed_attempts = 0
+        self.error_class: Optional[str] = None
+        self.cost_usd: Optional[float] = None  # set by finish()
+
+    def observe(self, ev) -> None:
+        if self.first_output is None and _has_output(ev):
+            self.first_output = time.perf_counter()
+
+        # Partial (streamed) events repeat the running totals; count final ones.
+        # A run with tool calls makes several model calls, each with its own usage.
+        usage = getattr(ev, "usage_metadata", None)
+        if usage is None or getattr(ev, "partial", False):
+            return
+        self.prompt_tokens = (self.prompt_tokens or 0) + (usage.prompt_token_count or 0)
+        self.completion_tokens = (self.completion_tokens or 0) + (usage.candidates_token_count or 0)
+        self.total_tokens = (self.total_tokens or 0) + (usage.total_token_count or 0)
+
+    @property
+    def retries(self) -> int:
+        # The last failed attempt of a failed call isn't a retry
+        return max(self.failed_attempts - (1 if self.error_class else 0), 0)
+
+    def finish(self) -> None:
+        latency = time.perf_counter() - self.started
+        ttft = self.first_output - self.started if self.first_output is not None else None
+        cost = self.cost_usd = _estimate_cost(self.model, self.prompt_tokens, self.completion_tokens)
+        status = "error" if self.error_class else "ok"
+
+        metrics.LLM_CALLS.inc((self.model, self.source, status))
+        if self.prompt_tokens is not None:
+            metrics.LLM_TOKENS.inc((self.model, "prompt"), self.prompt_tokens)
+            metrics.LLM_TOKENS.inc((self.model, "completion"), self.completion_tokens or 0)
+        if cost:
+            metrics.LLM_COST.inc((self.model,), cost)
+        if ttft is not None:
+            metrics.LLM_TTFT_SECONDS.observe((self.model,), ttft)
+
+        db = SessionLocal()
+        try:
+            db.add(models.LLMCall(
+                agent_run_id=self.agent_run_id,
+                agent_id=self.agent_id,
+                user_id=self.user_id,
+                source=self.source,
+                model=self.model,
+                prompt_tokens=self.prompt_tokens,
+                completion_tokens=self.completion_tokens,
+                total_tokens=self.total_tokens,
+                cost_usd=cost,
+                ttft_ms=ttft * 1000 if ttft is not None else None,
+                latency_ms=latency * 1000,
+                retries=self.retries,
+                status=status,
+                error_class=self.error_class,
+            ))
+            db.commit()
+        except Exception:
+            db.rollback()
+            logger.exception("Could not record LLM call telemetry")
+        finally:
+            db.close()
+
+
+@contextmanager
+def track(source: str, model: str, *, agent_id=None, user_id=None, agent_run_id=None):
+    """
+    Usage:
+        with llm_telemetry.track("ai.installation_steps", model) as call:
+            async for ev in runner.run_async(...):
+                call.observe(ev)
+    """
+    _install_litellm_hook()
+    call = LLMCallRecorder(source, model, agent_id=agent_id, user_id=user_id, agent_run_id=agent_run_id)
+    token = _current_call.set(call)
+    try:
+        with metrics.llm_timer(source):
+            yield call
+    except BaseException as exc:
+        call.error_class = type(exc).__name__
+        raise
+    finally:
+        _current_call.reset(token)
+        call.finish()
+
+
+def _has_output(ev) -> bool:
+    content = getattr(ev, "content", None)
+    return any(getattr(part, "text", None) for part in (getattr(content, "parts", None) or []))
+
+
+def _estimate_cost(model: str, prompt_tokens: Optional[int], completion_tokens: Optional[int]) -> Optional[float]:
+    if prompt_tokens is None and completion_tokens is None:
+        return None
+    try:
+        import litellm  # already loaded by the time a model has answered
+
+        prompt_cost, completion_cost = litellm.cost_per_token(
+            model=model, prompt_tokens=prompt_tokens or 0, completion_tokens=completion_tokens or 0
+        )
+        return prompt_cost + completion_cost
+    except Exception:
+        # Model missing from LiteLLM's price table
+        return None
+
+
+def _install_litellm_hook() -> None:
+    """Count failed LiteLLM attempts against the call running in this context."""
+    global _hook_installed
+    if _hook_installed:
+        return
+    _hook_installed = True
+
+    try:
+        import litellm
+        from litellm.integrations.custom_logger import CustomLogger
+    except ImportError:
+        return
+
+    class _FailedAttempts(CustomLogger):
+        # ADK only uses acompletion, so the async hook is the one that fires
+        async def async_log_failure_event(self, kwargs, response_obj, start_time, end_time):
+            call = _current_call.get()
+            if call is not None:
+                call.failed_attempts += 1
+
+    litellm.callbacks.append(_FailedAttempts())
+
+
+# ---- aggregation ----
+
+GROUP_BY = {
+    "agent": models.LLMCall.agent_id,
+    "model": models.LLMCall.model,
+    "user": models.LLMCall.user_id,
+    "source": models.LLMCall.source,
+}
+
+
+def usage_summary(db: Session, group_by: str = "model", days: int = 7, sort: str = "cost", limit: int = 50) -> list[dict]:
+    key = GROUP_BY[group_by]
+    call = models.LLMCall
+    columns = {
+        "calls": func.count(call.id),
+        "errors": func.sum(case((call.status != "ok", 1), else_=0)),
+        "retries": func.sum(call.retries),
+        "prompt_tokens": func.sum(call.prompt_tokens),
+        "completion_tokens": func.sum(call.completion_tokens),
+        "cost_usd": func.sum(call.cost_usd),
+        "avg_latency_ms": func.avg(call.latency_ms),
+        "max_latency_ms": func.max(call.latency_ms),
+        "avg_ttft_ms": func.avg(call.ttft_ms),
+    }
+    order = {
+        "cost": columns["cost_usd"],
+        "latency": columns["avg_latency_ms"],
+        "tokens": func.sum(call.total_tokens),
+        "calls": columns["calls"],
+    }[sort]
+
+    rows = (
+        db.query(key.label("key"), *(c.label(name) for name, c in columns.items()))
+        .filter(call.created_at >= datetime.utcnow() - timedelta(days=days))
+        .group_by(key)
+        .order_by(order.desc().nulls_last())
+        .limit(limit)
+        .all()
+    )
+    return [row._asdict() for row in rows]
@@ -0,0 +1,267 @@
+# services/recommendation_service.py
+"""
+Personalized recommendations from the like tables (item-item collaborative
+filtering).
+
+Per entity, like_cooccurrence is the sparse matrix C = L^T L of the user x
+item like matrix L: C[i][j] is the number of users who liked both i and j,
+C[i][i] the number of likes of i. Two items are similar by the cosine
+C[i][j] / sqrt(C[i][i] * C[j][j]), and item_neighbors keeps the NEIGHBORS
+most similar items of each item.
+
+Keeping it current:
+- a like or unlike updates the affected row and column of C in the same
+  transaction (flush hook below), at a cost of one upsert per other item
+  the user liked, and marks those items stale;
+- `python -m App.cli recommendations refresh` (periodic) recomputes the
+  neighbors of stale items only; `... rebuild` recomputes C from the like
+  tables in one INSERT ... SELECT and then every neighbor list.
+
+recommend() sums the neighbor scores of a user's most recent likes, so a
+request reads at most RECENT_LIKES neighbor lists by primary key. Users
+without likes (or with too few neighbors) get trending items instead.
+"""
+import math
+from collections import Counter, defaultdict
+from sqlalchemy import bindparam, delete, event, func, insert, literal, select, update
+from sqlalchemy.orm import Session, aliased
+
+from .. import models
+from . import catalog_service, trending_service
+
+NEIGHBORS = 50
+RECENT_LIKES = 50
+MAX_RECOMMENDATIONS = 50
+REFRESH_BATCH_SIZE = 500
+
+# entity -> (item model, like model, item column of the like model)
+ENTITIES = {
+    "prompts": (models.Prompt, models.LikedPrompt, "prompt_id"),
+    "tools": (models.Tool, models.LikedTool, "tool_id"),
+    "agents": (models.Agent, models.LikedAgent, "agent_id"),
+}
+LIKES = {like: (entity, column) for entity, (_, like, column) in ENTITIES.items()}
+
+_cooccurrence = models.LikeCooccurrence.__table__
+_neighbors = models.ItemNeighbor.__table__
+_stale = models.StaleNeighbors.__table__
+
+
+def _insert_statement(dialect: str, table):
+    # ON CONFLICT exists on both supported databases, under a dialect-specific insert()
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    return dialect_insert(table)
+
+
+def _mark_stale(session: Session, entity: str, item_ids) -> None:
+    if not item_ids:
+        return
+    conn = session.connection()
+    conn.execute(
+        _insert_statement(conn.dialect.name, _stale).on_conflict_do_nothing(index_elements=["entity", "item_id"]),
+        [{"entity": entity, "item_id": item_id} for item_id in item_ids],
+    )
+
+
+def apply_delta(session: Session, entity: str, delta: Counter) -> None:
+    """Add {(item_id, other_id): change} to like_cooccurrence and mark the rows' items stale."""
+    delta = {pair: n for pair, n in delta.items() if n}
+    if not delta:
+        return
+    conn = session.connection()
+    added = [{"entity": entity, "item_id": i, "other_id": j, "count": n} for (i, j), n in delta.items() if n > 0]
+    if added:
+        stmt = _insert_statement(conn.dialect.name, _cooccurrence)
+        conn.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["entity", "item_id", "other_id"],
+                set_={"count": _cooccurrence.c.count + stmt.excluded.count},
+            ),
+            added,
+        )
+    removed = [{"b_item": i, "b_other": j, "b_delta": n} for (i, j), n in delta.items() if n < 0]
+    if removed:
+        conn.execute(
+            update(_cooccurrence)
+            .where(
+                _cooccurrence.c.entity == entity,
+                _cooccurrence.c.item_id == bindparam("b_item"),
+                _cooccurrence.c.other_id == bindparam("b_other"),
+            )
+            .values(count=_cooccurrence.c.count + bindparam("b_delta")),
+            removed,
+        )
+        conn.execute(delete(_cooccurrence).where(
+            _cooccurrence.c.entity == entity,
+            _cooccurrence.c.item_id.in_({row["b_item"] for row in removed}),
+            _cooccurrence.c.count <= 0,
+        ))
+    _mark_stale(session, entity, {i for i, _ in delta})
+
+
+# ---- neighbors ----
+
+def _compute_neighbors(db: Session, entity: str, item_ids: list[int]) -> None:
+    c, diag_i, diag_j = _cooccurrence, _cooccurrence.alias("diag_i"), _cooccurrence.alias("diag_j")
+    rows = db.execute(
+        select(c.c.item_id, c.c.other_id, c.c.count, diag_i.c.count, diag_j.c.count)
+        .join(diag_i, (diag_i.c.entity == c.c.entity) & (diag_i.c.item_id == c.c.item_id)
+              & (diag_i.c.other_id == c.c.item_id))
+        .join(diag_j, (diag_j.c.entity == c.c.entity) & (diag_j.c.item_id == c.c.other_id)
+              & (diag_j.c.other_id == c.c.other_id))
+        .where(c.c.entity == entity, c.c.item_id.in_(item_ids), c.c.other_id != c.c.item_id)
+    )
+    by_item = defaultdict(list)
+    for item_id, other_id, both, n_item, n_other in rows:
+        by_item[item_id].append((both / math.sqrt(n_item * n_other), other_id))
+
+    db.execute(delete(_neighbors).where(_neighbors.c.entity == entity, _neighbors.c.item_id.in_(item_ids)))
+    neighbors = []
+    for item_id, scored in by_item.items():
+        scored.sort(reverse=True)
+        neighbors += [
+            {"entity": entity, "item_id": item_id, "neighbor_id": other_id, "score": round(score, 6)}
+            for score, other_id in scored[:NEIGHBORS]
+        ]
+    if neighbors:
+        db.execute(insert(_neighbors), neighbors)
+    db.execute(delete(_stale).where(_stale.c.entity == entity, _stale.c.item_id.in_(item_ids)))
+
+
+def refresh(db: Session, entity: str, batch_size: int = REFRESH_BATCH_SIZE) -> int:
+    """Recompute the neighbors of items marked stale; returns how many."""
+    done = 0
+    while True:
+        item_ids = list(db.execute(
+            select(_stale.c.item_id).where(_stale.c.entity == entity).limit(batch_size)
+        ).scalars())
+        if not item_ids:
+            return done
+        _compute_neighbors(db, entity, item_ids)
+        db.commit()
+        done += len(item_ids)
+
+
+def rebuild(db: Session, entity: str, batch_size: int = REFRESH_BATCH_SIZE) -> int:
+    """Recompute like_cooccurrence from the like table, then every neighbor list."""
+    _, like, column = ENTITIES[entity]
+    a, b = aliased(like), aliased(like)
+    item_a, item_b = getattr(a, column), getattr(b, column)
+
+    for table in (_cooccurrence, _neighbors, _stale):
+        db.execute(delete(table).where(table.c.entity == entity))
+    # Self-join on user: every pair of items a user liked, the diagonal included
+    db.execute(insert(_cooccurrence).from_select(
+        ["entity", "item_id", "other_id", "count"],
+        select(literal(entity), item_a, item_b, func.count())
+        .select_from(a)
+        .join(b, b.user_id == a.user_id)
+        .group_by(item_a, item_b),
+    ))
+    db.execute(insert(_stale).from_select(
+        ["entity", "item_id"],
+        select(_cooccurrence.c.entity, _cooccurrence.c.item_id).where(
+            _cooccurrence.c.entity == entity, _cooccurrence.c.other_id == _cooccurrence.c.item_id
+        ),
+    ))
+    db.commit()
+    return refresh(db, entity, batch_size)
+
+
+# ---- recommendations ----
+
+def recommend(db: Session, user_id: int, entity: str, limit: int = 10) -> list[dict]:
+    """Cards of items for `user_id`, each with a "score" and the "reason" it was picked."""
+    model, like, column = ENTITIES[entity]
+    liked_ids = select(getattr(like, column)).where(like.user_id == user_id)
+    recent = [
+        item_id for item_id, in db.execute(
+            liked_ids.order_by(like.liked_at.desc(), like.id.desc()).limit(RECENT_LIKES)
+        )
+    ]
+
+    def candidates(query):
+        query = query.filter(model.created_by != user_id, model.id.notin_(liked_ids))
+        if entity == "agents":
+            query = query.filter(model.visibility != "private")
+        return query
+
+    picked = []
+    if recent:
+        total = func.sum(_neighbors.c.score).label("score")
+        hits = db.execute(
+            select(_neighbors.c.neighbor_id, total)
+            .where(_neighbors.c.entity == entity, _neighbors.c.item_id.in_(recent))
+            .group_by(_neighbors.c.neighbor_id)
+            .order_by(total.desc(), _neighbors.c.neighbor_id)
+            .limit(limit * 2 + len(recent))
+        ).all()
+        if hits:
+            cards = {
+                card["id"]: card
+                for card in catalog_service.to_cards(
+                    candidates(catalog_service.card_query(db, model))
+                    .filter(model.id.in_([item_id for item_id, _ in hits]))
+                    .all()
+                )
+            }
+            picked = [
+                {**cards[item_id], "score": round(score, 4), "reason": "liked_by_similar_users"}
+                for item_id, score in hits
+                if item_id in cards
+            ][:limit]
+
+    if len(picked) < limit:
+        # Cold start, or not enough co-likes yet: fill up from the trending ranking
+        query = candidates(trending_service.order_by_trending(catalog_service.card_query(db, model), entity))
+        seen = [card["id"] for card in picked]
+        if seen:
+            query = query.filter(model.id.notin_(seen))
+        trending = catalog_service.to_cards(
+            query.add_columns(models.TrendingRank.score.label("trending_score")).limit(limit - len(picked)).all()
+        )
+        for card in trending:
+            # Unranked items (most liked first) fill up when the ranking is short
+            score = card.pop("trending_score") or 0.0
+            picked.append({**card, "score": round(score, 4), "reason": "trending"})
+    return picked
+
+
+# ---- like writes ----
+
+@event.listens_for(Session, "after_flush")
+def _update_cooccurrence(session, flush_context):
+    # (entity, user) -> ([liked items], [unliked items]); new/deleted still hold the pre-flush state
+    changes = defaultdict(lambda: ([], []))
+    for obj in session.new:
+        spec = LIKES.get(type(obj))
+        if spec is not None:
+            changes[(spec[0], obj.user_id)][0].append(getattr(obj, spec[1]))
+    for obj in session.deleted:
+        spec = LIKES.get(type(obj))
+        if spec is not None:
+            changes[(spec[0], obj.user_id)][1].append(getattr(obj, spec[1]))
+    if not changes:
+        return
+
+    conn = session.connection()
+    deltas = defaultdict(Counter)
+    for (entity, user_id), (liked, unliked) in changes.items():
+        _, like, column = ENTITIES[entity]
+        after = set(conn.execute(select(getattr(like, column)).where(like.user_id == user_id)).scalars())
+        before = (after - set(liked)) | set(unliked)
+        delta = deltas[entity]
+        # Each pair once, even when several likes of one user are flushed together
+        for items, current, sign in ((liked, after, 1), (unliked, before, -1)):
+            done = set()
+            for item_id in items:
+                delta[(item_id, item_id)] += sign
+                for other_id in current - done - {item_id}:
+                    delta[(item_id, other_id)] += sign
+                    delta[(other_id, item_id)] += sign
+                done.add(item_id)
+    for entity, delta in deltas.items():
+        apply_delta(session, entity, delta)
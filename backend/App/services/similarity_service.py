@@ -0,0 +1,348 @@
+# services/similarity_service.py
+"""
+"Similar items" for prompts, tools and agents from a local vector index.
+
+Each item is embedded on the CPU as a hashed n-gram vector (word unigrams
+and bigrams of its text, character trigrams of title and tags, signed
+feature hashing into DIM buckets, sublinear term weights, L2-normalized),
+so cosine similarity is a dot product and no model or corpus statistics
+are needed.
+
+Vectors live in one float32 matrix per entity, memory-mapped from
+SIMILARITY_INDEX_DIR/<entity>.<DIM>.f32, with row i holding item id i (an
+all-zero row means "not indexed": deleted items and private agents). All
+workers map the same file. A top-k query is one matrix-vector product over
+the mapped file.
+
+Keeping it current:
+- ORM writes are picked up by the session hooks below and written after commit;
+- bulk statements (imports) register their rows with mark_written(), like
+  version_service.mark_changed();
+- rows with ids above the highest one indexed so far (an index created after
+  the data) are caught up on the next query;
+- `python -m App.cli similarity rebuild` re-embeds everything, e.g. after
+  restoring a database.
+
+NumPy is imported on first use, not while the app boots.
+"""
+import json
+import math
+import os
+import re
+import threading
+import zlib
+from collections import Counter
+from typing import Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from .. import models
+from . import catalog_service
+
+try:
+    import fcntl
+except ImportError:  # not on Windows: growing the file is then unlocked
+    fcntl = None
+
+DIM = 512
+ROW_BYTES = DIM * 4
+CATCH_UP_BATCH_SIZE = 500
+MAX_SIMILAR = 50
+# Unrelated texts still share hash buckets; cosines below this are noise at DIM=512
+MIN_SCORE = 0.1
+
+# entity -> (model, (field, weight), ...); agents also need visibility
+FIELDS = {
+    "prompts": (models.Prompt, (("title", 2.0), ("tags", 1.5), ("category", 1.0), ("description", 1.0), ("content", 1.0))),
+    "tools": (models.Tool, (("title", 2.0), ("tags", 1.5), ("language", 1.0), ("description", 1.0), ("content", 1.0))),
+    "agents": (models.Agent, (("title", 2.0), ("tags", 1.5), ("description", 1.0), ("system_prompt", 1.0), ("instructions", 1.0))),
+}
+ENTITY_OF = {model: entity for entity, (model, _) in FIELDS.items()}
+
+# Short fields where spelling variants matter; long bodies only get word features
+_CHAR_NGRAM_FIELDS = {"title", "tags"}
+_WORD_RE = re.compile(r"[a-z0-9_]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were will with you your"
+    .split()
+)
+
+_PENDING_KEY = "similarity_pending"
+
+
+# ---- embedding ----
+
+def _field_text(value) -> str:
+    if isinstance(value, list):
+        return " ".join(str(v) for v in value)
+    if isinstance(value, dict):
+        return " ".join(str(v) for v in value.values())
+    return str(value) if value is not None else ""
+
+
+def features(doc: dict, fields) -> Counter:
+    feats = Counter()
+    for field, weight in fields:
+        text = _field_text(doc.get(field)).lower()
+        if not text:
+            continue
+        words = [w for w in _WORD_RE.findall(text) if w not in _STOPWORDS]
+        for word in words:
+            feats["w:" + word] += weight
+        for first, second in zip(words, words[1:]):
+            feats[f"b:{first} {second}"] += weight
+        if field in _CHAR_NGRAM_FIELDS:
+            for word in words:
+                padded = f"^{word}$"
+                for i in range(len(padded) - 2):
+                    feats["c:" + padded[i:i + 3]] += weight * 0.5
+    return feats
+
+
+def embed(doc: dict, fields):
+    """Unit-length float32 vector for `doc`, or None if it has no text at all."""
+    import numpy as np
+
+    vec = np.zeros(DIM, dtype=np.float32)
+    for feature, tf in features(doc, fields).items():
+        weight = 1.0 + math.log(tf) if tf >= 1 else tf
+        h = zlib.crc32(feature.encode("utf-8"))
+        # The top bit picks the sign, so colliding features tend to cancel out
+        vec[h % DIM] += weight if h & 0x80000000 else -weight
+    norm = float(np.linalg.norm(vec))
+    if norm == 0.0:
+        return None
+    return vec / norm
+
+
+def _doc(entity: str, obj) -> Optional[dict]:
+    """Fields of a row, ORM object, payload or dict to embed; None if it must not be findable."""
+    get = obj.get if isinstance(obj, dict) else lambda name: getattr(obj, name, None)
+    if entity == "agents" and get("visibility") == "private":
+        return None
+    _, fields = FIELDS[entity]
+    return {field: get(field) for field, _ in fields}
+
+
+# ---- the memory-mapped matrix ----
+
+class VectorIndex:
+    def __init__(self, entity: str, directory: str):
+        self.entity = entity
+        self.path = os.path.join(directory, f"{entity}.{DIM}.f32")
+        self.meta_path = os.path.join(directory, f"{entity}.{DIM}.json")
+        self._lock = threading.Lock()
+        self._matrix = None
+        self._mapped = None
+
+    def _map(self, min_rows: int = 0):
+        """The matrix, grown to at least `min_rows` rows; remapped if another worker grew it."""
+        import numpy as np
+
+        with self._lock:
+            try:
+                stat = os.stat(self.path)
+                size, inode = stat.st_size, stat.st_ino
+            except FileNotFoundError:
+                size, inode = 0, None
+            if size < min_rows * ROW_BYTES:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with open(self.path, "ab") as f:
+                    if fcntl is not None:
+                        fcntl.flock(f, fcntl.LOCK_EX)
+                    # Re-check under the lock, and never shrink what another worker grew
+                    size = os.fstat(f.fileno()).st_size
+                    if size < min_rows * ROW_BYTES:
+                        rows = max(min_rows, 2 * size // ROW_BYTES, 1024)
+                        f.truncate(rows * ROW_BYTES)
+                        size = rows * ROW_BYTES
+                    inode = os.fstat(f.fileno()).st_ino
+            rows = size // ROW_BYTES
+            if rows == 0:
+                return None
+            # A rebuild (possibly in another process) replaces the file: map the new one
+            if self._matrix is None or (inode, rows) != self._mapped:
+                self._matrix = np.memmap(self.path, dtype=np.float32, mode="r+", shape=(rows, DIM))
+                self._mapped = (inode, rows)
+            return self._matrix
+
+    def put(self, vectors: dict) -> None:
+        """Write {id: vector or None}; None clears the row."""
+        if not vectors:
+            return
+        matrix = self._map(max(vectors) + 1)
+        for item_id, vector in vectors.items():
+            matrix[item_id] = 0.0 if vector is None else vector
+
+    def row(self, item_id: int):
+        matrix = self._map()
+        if matrix is None or item_id >= matrix.shape[0] or not matrix[item_id].any():
+            return None
+        return matrix[item_id].copy()
+
+    def search(self, vector, k: int, exclude: int) -> list[tuple[int, float]]:
+        import numpy as np
+
+        matrix = self._map()
+        if matrix is None:
+            return []
+        scores = matrix @ vector
+        if exclude < scores.shape[0]:
+            scores[exclude] = -1.0
+        k = min(k, scores.shape[0])
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top if scores[i] >= MIN_SCORE]
+
+    @property
+    def max_id(self) -> int:
+        try:
+            with open(self.meta_path) as f:
+                return json.load(f)["max_id"]
+        except (OSError, ValueError, KeyError):
+            return 0
+
+    @max_id.setter
+    def max_id(self, value: int) -> None:
+        tmp = f"{self.meta_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"max_id": value, "dim": DIM}, f)
+        os.replace(tmp, self.meta_path)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._matrix = None
+            for path in (self.path, self.meta_path):
+                if os.path.exists(path):
+                    os.unlink(path)
+
+
+_indexes: dict[str, VectorIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(entity: str) -> VectorIndex:
+    with _indexes_lock:
+        index = _indexes.get(entity)
+        if index is None:
+            directory = os.getenv("SIMILARITY_INDEX_DIR", "similarity_index")
+            index = _indexes[entity] = VectorIndex(entity, directory)
+        return index
+
+
+def catch_up(db: Session, entity: str, batch_size: int = CATCH_UP_BATCH_SIZE) -> int:
+    """Embed rows added since the highest indexed id (bulk inserts, or a fresh index)."""
+    model, fields = FIELDS[entity]
+    columns = [getattr(model, field) for field, _ in fields]
+    if entity == "agents":
+        columns.append(model.visibility)
+
+    index = get_index(entity)
+    last_id = index.max_id
+    done = 0
+    while True:
+        rows = (
+            db.query(model.id, *columns)
+            .filter(model.id > last_id)
+            .order_by(model.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            return done
+        vectors = {}
+        for row in rows:
+            doc = _doc(entity, row)
+            vectors[row.id] = embed(doc, fields) if doc is not None else None
+        index.put(vectors)
+        last_id = rows[-1].id
+        index.max_id = last_id
+        done += len(rows)
+
+
+def rebuild(db: Session, entity: str, batch_size: int = CATCH_UP_BATCH_SIZE) -> int:
+    get_index(entity).clear()
+    return catch_up(db, entity, batch_size)
+
+
+def similar(db: Session, entity: str, item, limit: int = 10) -> list[tuple[int, float]]:
+    """(id, cosine) of the items most similar to `item` (a loaded row), best first."""
+    catch_up(db, entity)
+    _, fields = FIELDS[entity]
+    index = get_index(entity)
+
+    vector = index.row(item.id)
+    if vector is None:
+        # Not in the index (a private agent, say): embed it just for this query
+        vector = embed({field: getattr(item, field) for field, _ in fields}, fields)
+        if vector is None:
+            return []
+    return index.search(vector, limit, exclude=item.id)
+
+
+def similar_cards(db: Session, entity: str, item, limit: int = 10) -> list[dict]:
+    """Cards (as in list views) of the most similar items, each with its cosine "score"."""
+    hits = similar(db, entity, item, limit)
+    if not hits:
+        return []
+    model, _ = FIELDS[entity]
+    query = catalog_service.card_query(db, model).filter(model.id.in_([item_id for item_id, _ in hits]))
+    if entity == "agents":
+        query = query.filter(model.visibility != "private")
+    # The index can still hold rows deleted by another worker's bulk statement
+    cards = {card["id"]: card for card in catalog_service.to_cards(query.all())}
+    return [{**cards[item_id], "score": round(score, 4)} for item_id, score in hits if item_id in cards]
+
+
+# ---- incremental updates from ORM writes ----
+
+def _changed_docs(session) -> dict:
+    pending = {}
+    for obj in list(session.new) + list(session.dirty):
+        entity = ENTITY_OF.get(type(obj))
+        if entity is None:
+            continue
+        _, fields = FIELDS[entity]
+        watched = [field for field, _ in fields] + (["visibility"] if entity == "agents" else [])
+        state = inspect(obj)
+        # Likes and views change rows all the time; only re-embed on text changes
+        if obj not in session.new and not any(state.attrs[f].history.has_changes() for f in watched):
+            continue
+        pending[(entity, obj.id)] = _doc(entity, obj)
+    for obj in session.deleted:
+        entity = ENTITY_OF.get(type(obj))
+        if entity is not None:
+            pending[(entity, obj.id)] = None
+    return pending
+
+
+def mark_written(session: Session, entity: str, items) -> None:
+    """Register (id, row-like) pairs written with bulk statements; embedded after commit."""
+    pending = session.info.setdefault(_PENDING_KEY, {})
+    for item_id, obj in items:
+        pending[(entity, item_id)] = _doc(entity, obj)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session, flush_context):
+    changed = _changed_docs(session)
+    if changed:
+        session.info.setdefault(_PENDING_KEY, {}).update(changed)
+
+
+@event.listens_for(Session, "after_commit")
+def _write_vectors(session):
+    # Only once committed: a rolled-back write must not become findable
+    pending = session.info.pop(_PENDING_KEY, {})
+    by_entity = {}
+    for (entity, item_id), doc in pending.items():
+        _, fields = FIELDS[entity]
+        by_entity.setdefault(entity, {})[item_id] = embed(doc, fields) if doc is not None else None
+    for entity, vectors in by_entity.items():
+        get_index(entity).put(vectors)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,121 @@
+# services/stats_service.py
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from typing import Optional
+from .. import models
+
+STAT_FIELDS = ("total_prompts", "total_tools", "total_agents", "total_likes", "total_views")
+
+# (model, count field) for every content type that contributes to a user's stats
+_CONTENT_MODELS = (
+    (models.Prompt, "total_prompts"),
+    (models.Tool, "total_tools"),
+    (models.Agent, "total_agents"),
+)
+
+
+def bump(db: Session, user_id: int, **deltas: int) -> None:
+    """
+    Apply counter deltas to a user's stats row inside the caller's transaction.
+
+    The UPDATE is a single `col = col + delta` statement so concurrent writers
+    don't lose increments. If the user has no row yet, the pending changes are
+    flushed and the row is rebuilt from the content tables instead.
+    """
+    deltas = {k: v for k, v in deltas.items() if v}
+    if not deltas:
+        return
+
+    unknown = set(deltas) - set(STAT_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown stat fields: {sorted(unknown)}")
+
+    updated = (
+        db.query(models.UserStats)
+        .filter(models.UserStats.user_id == user_id)
+        .update(
+            {getattr(models.UserStats, k): getattr(models.UserStats, k) + v for k, v in deltas.items()},
+            synchronize_session=False,
+        )
+    )
+
+    if not updated:
+        db.flush()
+        reconcile_user(db, user_id)
+
+
+def get_stats(db: Session, user_id: int) -> dict:
+    stats = db.get(models.UserStats, user_id)
+    if stats is None:
+        stats = reconcile_user(db, user_id)
+        db.commit()
+
+    return {field: getattr(stats, field) or 0 for field in STAT_FIELDS}
+
+
+def _aggregate(db: Session, user_ids: Optional[list[int]] = None) -> dict[int, dict]:
+    # 3 grouped queries in total, however many users are being rebuilt
+    totals: dict[int, dict] = {}
+
+    for model, count_field in _CONTENT_MODELS:
+        query = db.query(
+            model.created_by,
+            func.count(model.id),
+            func.coalesce(func.sum(model.likes), 0),
+            func.coalesce(func.sum(model.views), 0),
+        )
+        if user_ids is not None:
+            query = query.filter(model.created_by.in_(user_ids))
+
+        for user_id, count, likes, views in query.group_by(model.created_by).all():
+            row = totals.setdefault(user_id, dict.fromkeys(STAT_FIELDS, 0))
+            row[count_field] += count
+            row["total_likes"] += likes
+            row["total_views"] += views
+
+    return totals
+
+
+def reconcile_user(db: Session, user_id: int) -> models.UserStats:
+    values = _aggregate(db, [user_id]).get(user_id, dict.fromkeys(STAT_FIELDS, 0))
+
+    stats = db.get(models.UserStats, user_id)
+    if stats is None:
+        stats = models.UserStats(user_id=user_id)
+        db.add(stats)
+
+    for field, value in values.items():
+        setattr(stats, field, value)
+
+    db.flush()
+    return stats
+
+
+def reconcile_all(db: Session, batch_size: int = 500) -> int:
+    """
+    Rebuild every user's stats row from the content tables.
+
+    Run periodically (python -m App.cli reconcile-stats) to repair any drift
+    from writes that bypassed the API.
+    """
+    user_ids = [uid for (uid,) in db.query(models.User.id).order_by(models.User.id).all()]
+
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        totals = _aggregate(db, batch)
+        existing = {
+            s.user_id: s
+            for s in db.query(models.UserStats).filter(models.UserStats.user_id.in_(batch)).all()
+        }
+
+        for user_id in batch:
+            stats = existing.get(user_id)
+            if stats is None:
+                stats = models.UserStats(user_id=user_id)
+                db.add(stats)
+            for field, value in totals.get(user_id, dict.fromkeys(STAT_FIELDS, 0)).items():
+                setattr(stats, field, value)
+
+        db.commit()
+
+    return len(user_ids)
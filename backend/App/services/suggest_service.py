@@ -0,0 +1,430 @@
+# services/suggest_service.py
+"""
+Typeahead completions for the search bar, served from memory.
+
+The index is one sorted list of (word, kind, ref) triples: a word of every
+prompt/tool/agent title (ref = item id) and of every tag, prompt category,
+tool language and creator name (ref = the normalized value, weighted by how
+many items carry it). A prefix is two bisects into that list plus a scan of
+at most MAX_SCAN matches, so a lookup never touches the database.
+
+Keeping it current, per worker process:
+- ORM writes are applied after commit by the session hooks below;
+- every SYNC_INTERVAL seconds a lookup checks the entity versions
+  (services/version_service); when another worker or a bulk statement
+  changed something, rows updated since the last sync are re-read, and an
+  entity whose row count no longer matches is reloaded (deletes);
+- on first use the index is loaded from the gzip snapshot at
+  SUGGEST_SNAPSHOT (or from the database, writing the snapshot) and then
+  synced. `python -m App.cli suggest snapshot` refreshes the snapshot.
+Single items go in and out with bisect; loading or reloading a whole entity
+rebuilds the list with one sort instead.
+"""
+import bisect
+import gzip
+import heapq
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.orm import Session
+
+from .. import models
+from . import catalog_service
+
+MAX_SUGGESTIONS = 20
+MAX_SCAN = 1000
+# Answers to recent queries; short prefixes are asked constantly and are the costly ones
+RESULT_CACHE_SIZE = 4096
+SYNC_INTERVAL = 5.0
+# Rows committed out of order by other workers can carry slightly older updated_at values
+SYNC_OVERLAP = timedelta(seconds=60)
+SNAPSHOT_FORMAT = 1
+
+# entity -> (model, item kind, facet kind and column or None)
+ENTITIES = {
+    "prompts": (models.Prompt, "prompt", ("category", "category")),
+    "tools": (models.Tool, "tool", ("language", "language")),
+    "agents": (models.Agent, "agent", None),
+}
+ENTITY_OF = {model: entity for entity, (model, _, _) in ENTITIES.items()}
+KINDS = ("prompt", "tool", "agent", "tag", "category", "language", "creator")
+# Columns _record() reads; other changes (views, content...) leave the index alone
+WATCHED = {
+    entity: ["title", "tags", "creator_name", "likes"]
+    + ([facet[1]] if facet else [])
+    + (["visibility"] if entity == "agents" else [])
+    for entity, (_, _, facet) in ENTITIES.items()
+}
+
+_WORD_RE = re.compile(r"\w+")
+_PENDING_KEY = "suggest_pending"
+
+
+def normalize(text: Optional[str]) -> str:
+    return " ".join(_WORD_RE.findall((text or "").casefold()))
+
+
+def _record(entity: str, row) -> Optional[tuple]:
+    """(title, tags, facet value, creator, likes) of a row or ORM object; None if it must not be suggested."""
+    _, _, facet = ENTITIES[entity]
+    if entity == "agents" and row.visibility == "private":
+        return None
+    return (
+        row.title or "",
+        tuple(str(tag) for tag in catalog_service.normalize_tags(row.tags)),
+        getattr(row, facet[1]) if facet else None,
+        row.creator_name,
+        row.likes or 0,
+    )
+
+
+class SuggestIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._words: list[tuple[str, str, object]] = []
+        self._items: dict[tuple[str, int], tuple] = {}
+        self._counts: Counter = Counter()
+        self._facets: Counter = Counter()
+        self._labels: dict[tuple[str, str], str] = {}
+        # (kind, ref) -> normalized text, so lookups never re-normalize
+        self._normalized: dict[tuple[str, object], str] = {}
+        self._results: dict[tuple, list[dict]] = {}
+        self.watermark: Optional[datetime] = None
+        self.versions: dict[str, int] = {}
+        self.checked_at = 0.0
+
+    # ---- maintenance ----
+
+    def _insert_words(self, text: str, kind: str, ref) -> None:
+        for word in set(normalize(text).split()):
+            bisect.insort(self._words, (word, kind, ref))
+
+    def _remove_words(self, text: str, kind: str, ref) -> None:
+        for word in set(normalize(text).split()):
+            i = bisect.bisect_left(self._words, (word, kind, ref))
+            if i < len(self._words) and self._words[i] == (word, kind, ref):
+                del self._words[i]
+
+    def _facet_values(self, entity: str, record: tuple):
+        title, tags, facet_value, creator, _ = record
+        _, _, facet = ENTITIES[entity]
+        values = [("tag", tag) for tag in tags]
+        if facet and facet_value:
+            values.append((facet[0], facet_value))
+        if creator:
+            values.append(("creator", creator))
+        # Duplicate tags on one item count once
+        return list(dict.fromkeys((kind, value) for kind, value in values if normalize(value)))
+
+    def _rebuild_words(self) -> None:
+        """The word list from scratch: one sort instead of an insort per word."""
+        self._words = sorted(
+            (word, kind, ref)
+            for (kind, ref), text in self._normalized.items()
+            for word in set(text.split())
+        )
+
+    def _add_facet(self, kind: str, value: str, words: bool = True) -> None:
+        key = (kind, normalize(value))
+        self._facets[key] += 1
+        if self._facets[key] == 1:
+            self._labels[key] = value.strip()
+            self._normalized[key] = key[1]
+            if words:
+                self._insert_words(key[1], kind, key[1])
+
+    def _remove_facet(self, kind: str, value: str, words: bool = True) -> None:
+        key = (kind, normalize(value))
+        self._facets[key] -= 1
+        if self._facets[key] <= 0:
+            del self._facets[key]
+            self._labels.pop(key, None)
+            self._normalized.pop(key, None)
+            if words:
+                self._remove_words(key[1], kind, key[1])
+
+    def _put(self, entity: str, item_id: int, record: Optional[tuple], words: bool = True) -> None:
+        """Set or remove one item; words=False leaves the word list to _rebuild_words()."""
+        kind = ENTITIES[entity][1]
+        old = self._items.pop((kind, item_id), None)
+        if old is not None:
+            self._counts[kind] -= 1
+            self._normalized.pop((kind, item_id), None)
+            if words:
+                self._remove_words(old[0], kind, item_id)
+            for facet in self._facet_values(entity, old):
+                self._remove_facet(*facet, words=words)
+        if record is not None:
+            self._items[(kind, item_id)] = record
+            self._counts[kind] += 1
+            self._normalized[(kind, item_id)] = normalize(record[0])
+            if words:
+                self._insert_words(record[0], kind, item_id)
+            for facet in self._facet_values(entity, record):
+                self._add_facet(*facet, words=words)
+
+    def put_many(self, entity: str, records: dict) -> None:
+        """Apply {item id: record or None}; None removes the item."""
+        with self._lock:
+            self._results.clear()
+            for item_id, record in records.items():
+                self._put(entity, item_id, record)
+
+    def _replace(self, entity: str, records: dict) -> None:
+        kind = ENTITIES[entity][1]
+        self._results.clear()
+        for stale in [item_id for (k, item_id) in self._items if k == kind and item_id not in records]:
+            self._put(entity, stale, None, words=False)
+        for item_id, record in records.items():
+            self._put(entity, item_id, record, words=False)
+
+    def replace(self, entity: str, records: dict) -> None:
+        with self._lock:
+            self._replace(entity, records)
+            self._rebuild_words()
+
+    def count(self, entity: str) -> int:
+        return self._counts[ENTITIES[entity][1]]
+
+    # ---- lookups ----
+
+    def suggest(self, query: str, limit: int = 10, kinds: Optional[set] = None) -> list[dict]:
+        words = normalize(query).split()
+        if not words:
+            return []
+        # The last word is being typed; the ones before it must appear in the suggestion
+        prefix, required = words[-1], words[:-1]
+        phrase = " ".join(words)
+        key = (phrase, limit, frozenset(kinds) if kinds else None)
+
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is not None:
+                return cached
+            candidates = {}
+            start = bisect.bisect_left(self._words, (prefix,))
+            for word, kind, ref in self._words[start:start + MAX_SCAN]:
+                if not word.startswith(prefix):
+                    break
+                if kinds is None or kind in kinds:
+                    candidates[(kind, ref)] = None
+
+            ranked = []
+            for kind, ref in candidates:
+                if isinstance(ref, int):
+                    record = self._items[(kind, ref)]
+                    text, weight = record[0], record[4]
+                else:
+                    text, weight = self._labels[(kind, ref)], self._facets[(kind, ref)]
+                normalized = self._normalized[(kind, ref)]
+                if required and not all(word in normalized.split() for word in required):
+                    continue
+                # Whole-phrase prefix first, then popularity, then shorter text
+                rank = (normalized.startswith(phrase), weight, -len(normalized), text)
+                ranked.append((rank, kind, ref, text, weight))
+
+            best = heapq.nlargest(limit, ranked, key=lambda entry: entry[0])
+
+            suggestions = []
+            for _, kind, ref, text, weight in best:
+                if isinstance(ref, int):
+                    suggestions.append({"type": kind, "text": text, "id": ref, "likes": weight})
+                else:
+                    suggestions.append({"type": kind, "text": text, "count": weight})
+            if len(self._results) >= RESULT_CACHE_SIZE:
+                self._results.clear()
+            self._results[key] = suggestions
+        return suggestions
+
+    # ---- snapshot ----
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            items = {entity: [] for entity in ENTITIES}
+            kinds = {kind: entity for entity, (_, kind, _) in ENTITIES.items()}
+            for (kind, item_id), record in self._items.items():
+                items[kinds[kind]].append([item_id, *record])
+            return {
+                "format": SNAPSHOT_FORMAT,
+                "watermark": self.watermark.isoformat() if self.watermark else None,
+                "items": items,
+            }
+
+    def restore(self, data: dict) -> None:
+        with self._lock:
+            for entity, rows in data["items"].items():
+                self._replace(entity, {
+                    row[0]: (row[1], tuple(row[2]), row[3], row[4], row[5]) for row in rows
+                })
+            self._rebuild_words()
+        self.watermark = datetime.fromisoformat(data["watermark"]) if data["watermark"] else None
+
+
+# ---- loading and syncing from the database ----
+
+def _columns(entity: str):
+    model, _, facet = ENTITIES[entity]
+    columns = [model.id, model.title, model.tags, model.creator_name, model.likes, model.updated_at]
+    if facet:
+        columns.append(getattr(model, facet[1]))
+    if entity == "agents":
+        columns.append(model.visibility)
+    return columns
+
+
+def _load(db: Session, entity: str, since: Optional[datetime] = None) -> tuple[dict, Optional[datetime]]:
+    model = ENTITIES[entity][0]
+    query = select(*_columns(entity))
+    if since is not None:
+        query = query.where(model.updated_at >= since)
+    records, newest = {}, None
+    for row in db.execute(query):
+        records[row.id] = _record(entity, row)
+        if row.updated_at is not None:
+            stamp = row.updated_at.replace(tzinfo=None)
+            newest = stamp if newest is None or stamp > newest else newest
+    return records, newest
+
+
+def _row_count(db: Session, entity: str) -> int:
+    model = ENTITIES[entity][0]
+    query = select(func.count()).select_from(model)
+    if entity == "agents":
+        query = query.where(model.visibility != "private")
+    return db.execute(query).scalar()
+
+
+def _advance(index: SuggestIndex, newest: Optional[datetime]) -> None:
+    if newest is not None and (index.watermark is None or newest > index.watermark):
+        index.watermark = newest
+
+
+def sync(db: Session, index: SuggestIndex, force: bool = False) -> None:
+    """Catch up with writes made elsewhere (other workers, bulk statements)."""
+    versions = {
+        entity: version
+        for entity, version in db.execute(select(models.EntityVersion.entity, models.EntityVersion.version))
+    }
+    since = index.watermark - SYNC_OVERLAP if index.watermark else None
+    newest_seen = None
+    for entity in ENTITIES:
+        if not force and versions.get(entity, 0) == index.versions.get(entity, 0):
+            continue
+        records, newest = _load(db, entity, since)
+        index.put_many(entity, records)
+        if _row_count(db, entity) != index.count(entity):
+            # Rows were deleted (or never indexed): reload this entity
+            records, newest = _load(db, entity)
+            index.replace(entity, records)
+        if newest is not None and (newest_seen is None or newest > newest_seen):
+            newest_seen = newest
+    _advance(index, newest_seen)
+    index.versions = versions
+    index.checked_at = time.monotonic()
+
+
+def snapshot_path() -> str:
+    return os.getenv("SUGGEST_SNAPSHOT", "suggest_snapshot.json.gz")
+
+
+def write_snapshot(index: SuggestIndex, path: Optional[str] = None) -> str:
+    path = path or snapshot_path()
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with gzip.open(tmp, "wt", encoding="utf-8") as f:
+        json.dump(index.snapshot(), f, separators=(",", ":"))
+    os.replace(tmp, path)
+    return path
+
+
+def build(db: Session) -> SuggestIndex:
+    """A fresh index: from the snapshot when there is one, then synced with the database."""
+    index = SuggestIndex()
+    path = snapshot_path()
+    data = None
+    if os.path.exists(path):
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = None
+        if data is not None and data.get("format") != SNAPSHOT_FORMAT:
+            data = None
+    if data is not None:
+        index.restore(data)
+        sync(db, index, force=True)
+    else:
+        sync(db, index, force=True)
+        try:
+            write_snapshot(index, path)
+        except OSError:
+            pass  # read-only deploys still work, they just load from the database next time
+    return index
+
+
+_index: Optional[SuggestIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_index(db: Session) -> SuggestIndex:
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = build(db)
+    elif time.monotonic() - _index.checked_at > SYNC_INTERVAL:
+        # One reader syncs; the others keep answering from the current index
+        if _index_lock.acquire(blocking=False):
+            try:
+                sync(db, _index)
+            finally:
+                _index_lock.release()
+    return _index
+
+
+def suggest(db: Session, query: str, limit: int = 10, kinds: Optional[set] = None) -> list[dict]:
+    return get_index(db).suggest(query, limit, kinds)
+
+
+# ---- ORM writes ----
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session, flush_context):
+    # Records are taken now: after commit the objects are expired
+    pending = session.info.setdefault(_PENDING_KEY, {})
+    for obj in list(session.new) + list(session.dirty):
+        entity = ENTITY_OF.get(type(obj))
+        if entity is None:
+            continue
+        state = inspect(obj)
+        # Views, content edits etc. don't change what is suggested
+        if obj not in session.new and not any(state.attrs[f].history.has_changes() for f in WATCHED[entity]):
+            continue
+        pending[(entity, obj.id)] = _record(entity, obj)
+    for obj in session.deleted:
+        entity = ENTITY_OF.get(type(obj))
+        if entity is not None:
+            pending[(entity, obj.id)] = None
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_changes(session):
+    pending = session.info.pop(_PENDING_KEY, {})
+    if not pending or _index is None:
+        return
+    by_entity = {}
+    for (entity, item_id), record in pending.items():
+        by_entity.setdefault(entity, {})[item_id] = record
+    for entity, records in by_entity.items():
+        _index.put_many(entity, records)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,184 @@
+# services/tool_runtime_service.py
+"""
+Runs library tools and agent tools for real, in core/sandbox workers.
+
+A tool is Python source defining one or more functions. The one called (its
+entrypoint) is config["entrypoint"] when set, else the first public
+top-level function. Its parameters, annotations and docstring are read with
+ast, never by running the code in the API process, and cached by content
+hash; they become the function declaration the model sees.
+
+agent_tools() turns an agent's enabled tools into ADK function tools whose
+calls are awaited on the pool. ADK dispatches the function calls of one
+model turn concurrently, so independent tool calls run in parallel workers.
+Tools in other languages, or that don't parse, are left out of agents;
+/tools/{id}/run still has the model describe those.
+"""
+import ast
+import inspect
+import json
+import logging
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Iterable, Optional
+
+from ..core import sandbox
+
+logger = logging.getLogger(__name__)
+
+_TYPES = {"str": str, "int": int, "float": float, "bool": bool, "dict": dict, "Dict": dict, "list": list, "List": list}
+_MISSING = inspect.Parameter.empty
+
+
+@dataclass(frozen=True)
+class ToolSpec:
+    entrypoint: str
+    parameters: tuple  # ((name, annotation, default or _MISSING), ...)
+    doc: str
+
+    def signature(self) -> inspect.Signature:
+        return inspect.Signature([
+            inspect.Parameter(name, inspect.Parameter.KEYWORD_ONLY, annotation=annotation, default=default)
+            for name, annotation, default in self.parameters
+        ])
+
+    def missing(self, kwargs: dict) -> list[str]:
+        return [name for name, _, default in self.parameters if default is _MISSING and name not in kwargs]
+
+
+def is_python(language: Optional[str]) -> bool:
+    # Most tools leave language empty; the rest say "Python", "python ", "Python 3"...
+    return not language or language.strip().lower().startswith(("python", "py"))
+
+
+def _annotation(node) -> Any:
+    """A JSON-schema friendly type for an annotation; anything unknown is passed as a string."""
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        try:
+            node = ast.parse(node.value, mode="eval").body
+        except SyntaxError:
+            return str
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.BitOr):
+        # X | None
+        side = node.right if isinstance(node.left, ast.Constant) and node.left.value is None else node.left
+        return Optional[_annotation(side)]
+    if isinstance(node, ast.Subscript):
+        base = node.value.attr if isinstance(node.value, ast.Attribute) else getattr(node.value, "id", "")
+        if base == "Optional":
+            return Optional[_annotation(node.slice)]
+        if base in ("list", "List", "Sequence", "tuple", "Tuple", "set", "Set"):
+            inner = node.slice.elts[0] if isinstance(node.slice, ast.Tuple) else node.slice
+            return list[_annotation(inner)]
+        if base in ("dict", "Dict", "Mapping"):
+            return dict
+        return str
+    kind = _TYPES.get(getattr(node, "id", None), str)
+    # Arrays need an item type for the model's schema
+    return list[str] if kind is list else kind
+
+
+@lru_cache(maxsize=sandbox.CODE_CACHE_SIZE)
+def _parse(code_hash: str, source: str, entrypoint: Optional[str]) -> ToolSpec:
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError, RecursionError) as exc:
+        raise sandbox.SandboxError(f"Tool code does not parse: {exc}") from None
+    functions = [
+        node for node in tree.body
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))
+        and (node.name == entrypoint if entrypoint else not node.name.startswith("_"))
+    ]
+    if not functions:
+        raise sandbox.SandboxError(
+            f"Tool code defines no function {entrypoint!r}" if entrypoint else "Tool code defines no public function"
+        )
+    function = functions[0]
+
+    args = function.args
+    positional = args.posonlyargs + args.args
+    defaults = [_MISSING] * (len(positional) - len(args.defaults)) + list(args.defaults)
+    parameters = []
+    for arg, default in list(zip(positional, defaults)) + list(zip(args.kwonlyargs, args.kw_defaults)):
+        if arg.arg in ("self", "cls"):
+            continue
+        annotation = _annotation(arg.annotation)
+        if default is not _MISSING and default is not None:
+            try:
+                default = ast.literal_eval(default)
+            except (ValueError, TypeError, SyntaxError, RecursionError):
+                default = None  # e.g. Field(...): let the tool apply it
+        if default is not _MISSING:
+            # Nullable, so the parameter stays optional where ADK drops defaults from the schema
+            annotation = Optional[annotation]
+        parameters.append((arg.arg, annotation, default))
+    return ToolSpec(function.name, tuple(parameters), ast.get_docstring(function) or "")
+
+
+def spec(source: str, code_hash: Optional[str] = None, entrypoint: Optional[str] = None) -> ToolSpec:
+    return _parse(code_hash or sandbox.digest(source), source, entrypoint)
+
+
+async def run_async(source: str, kwargs: dict, entrypoint: Optional[str] = None, code_hash: Optional[str] = None) -> dict:
+    """Run a tool once in the sandbox; see core/sandbox.SandboxPool.run for the result."""
+    tool = spec(source, code_hash, entrypoint)
+    missing = tool.missing(kwargs)
+    if missing:
+        raise sandbox.SandboxError(f"Missing arguments: {', '.join(missing)}")
+    return await sandbox.get_pool().run_async(source, tool.entrypoint, kwargs, code_hash)
+
+
+def output_text(outcome: dict) -> str:
+    """stdout followed by the return value, as the text the old simulated runs returned."""
+    result = outcome["result"]
+    text = result if isinstance(result, str) else json.dumps(result, indent=2, default=str)
+    return (outcome["stdout"] + text) if result is not None else outcome["stdout"]
+
+
+# ---- ADK ----
+
+def _function_tool(tool: ToolSpec, source: str, code_hash: str, name: str, description: str):
+    from google.adk.tools import FunctionTool
+
+    defaults = {name for name, _, default in tool.parameters if default is not _MISSING and default is not None}
+
+    async def call(**kwargs):
+        # A null for an optional parameter means "use the tool's default"
+        kwargs = {k: v for k, v in kwargs.items() if v is not None or k not in defaults}
+        try:
+            outcome = await sandbox.get_pool().run_async(source, tool.entrypoint, kwargs, code_hash)
+        except sandbox.SandboxError as exc:
+            # Goes back to the model as the tool response, like any other failure
+            return {"error": str(exc)}
+        response = {"result": outcome["result"]}
+        if outcome["stdout"]:
+            response["stdout"] = outcome["stdout"]
+        return response
+
+    call.__name__ = name
+    call.__doc__ = tool.doc or description or f"Runs the {name} tool."
+    call.__signature__ = tool.signature()
+    return FunctionTool(call)
+
+
+def agent_tools(tools: Iterable) -> list:
+    """ADK function tools for AgentTool rows (or unsaved AgentTool objects); unrunnable ones are skipped."""
+    function_tools, names = [], set()
+    for agent_tool in tools:
+        source = agent_tool.display_code
+        if not agent_tool.enabled or not source:
+            continue
+        config = agent_tool.config or {}
+        code_hash = sandbox.digest(source)
+        try:
+            tool = spec(source, code_hash, config.get("entrypoint"))
+        except sandbox.SandboxError as exc:
+            logger.info("Skipping agent tool %r: %s", agent_tool.display_name, exc)
+            continue
+        # Function names must be unique identifiers within one agent
+        name = re.sub(r"\W", "_", tool.entrypoint)
+        while name in names:
+            name += "_"
+        names.add(name)
+        function_tools.append(_function_tool(tool, source, code_hash, name, agent_tool.display_description))
+    return function_tools
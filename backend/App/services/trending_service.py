@@ -0,0 +1,236 @@
+# services/trending_service.py
+"""
+Trending rankings from like and view events.
+
+refresh() is the periodic job (`python -m App.cli trending refresh`, from
+cron or with --every). Per entity it:
+
+1. rolls liked_* and *_views rows up into activity_hourly and activity_daily
+   (likes and views per item per UTC hour / day). Only buckets from the
+   start of the last rolled-up day on are recomputed, so a run reads about a
+   day of events, not the whole history;
+2. scores every item with activity in the last WINDOW_DAYS as
+       sum((LIKE_WEIGHT * likes + VIEW_WEIGHT * views) * 0.5 ** (age_hours / HALF_LIFE_HOURS))
+   over hourly buckets for the last HOURLY_DAYS days and daily buckets
+   before that;
+3. replaces that entity's trending_ranks with the TOP_N items overall
+   (category "") and per category, in one transaction.
+
+List endpoints with ?sort=trending outer-join trending_ranks and order by
+rank, so a page costs the same as any other; items without a rank follow by
+likes and recency.
+
+Likes are counted as the liked_* rows that still exist when their bucket is
+rolled up; an unlike after that no longer changes the bucket.
+"""
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Query, Session
+
+from .. import models
+from . import version_service
+
+LIKE_WEIGHT = 3.0
+VIEW_WEIGHT = 1.0
+HALF_LIFE_HOURS = 24.0
+WINDOW_DAYS = 30
+HOURLY_DAYS = 2
+DAILY_RETENTION_DAYS = 90
+TOP_N = 100
+
+# entity -> (model, category column or None, ((event model, item column, time column, counter), ...))
+SOURCES = {
+    "prompts": (models.Prompt, models.Prompt.category, (
+        (models.LikedPrompt, models.LikedPrompt.prompt_id, models.LikedPrompt.liked_at, "likes"),
+        (models.PromptView, models.PromptView.prompt_id, models.PromptView.viewed_at, "views"),
+    )),
+    "tools": (models.Tool, models.Tool.language, (
+        (models.LikedTool, models.LikedTool.tool_id, models.LikedTool.liked_at, "likes"),
+        (models.ToolView, models.ToolView.tool_id, models.ToolView.viewed_at, "views"),
+    )),
+    "agents": (models.Agent, None, (
+        (models.LikedAgent, models.LikedAgent.agent_id, models.LikedAgent.liked_at, "likes"),
+        (models.AgentView, models.AgentView.agent_id, models.AgentView.viewed_at, "views"),
+    )),
+}
+
+_hourly = models.HourlyActivity.__table__
+_daily = models.DailyActivity.__table__
+_ranks = models.TrendingRank.__table__
+
+
+def _hour(column, dialect: str):
+    if dialect == "postgresql":
+        return func.date_trunc("hour", column)
+    return func.strftime("%Y-%m-%d %H:00:00", column)
+
+
+def _as_datetime(value) -> datetime:
+    # strftime() hands back text on SQLite; date_trunc() a timestamp on Postgres
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.replace(tzinfo=None)
+
+
+def _day(value: datetime) -> datetime:
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def ranking_key(category: Optional[str]) -> str:
+    return (category or "").strip().lower()
+
+
+# ---- 1. rollups ----
+
+def roll_up(db: Session, entity: str) -> int:
+    """Recompute the hourly and daily buckets since the last rolled-up day; returns hourly rows written."""
+    _, _, sources = SOURCES[entity]
+    last = db.execute(select(func.max(_daily.c.bucket_start)).where(_daily.c.entity == entity)).scalar()
+    start = _day(_as_datetime(last)) if last is not None else None
+    dialect = db.get_bind().dialect.name
+
+    hourly = defaultdict(lambda: {"likes": 0, "views": 0})
+    for event_model, item_column, time_column, counter in sources:
+        bucket = _hour(time_column, dialect)
+        query = select(item_column, bucket, func.count()).group_by(item_column, bucket)
+        if start is not None:
+            query = query.where(time_column >= start)
+        for item_id, bucket_start, count in db.execute(query):
+            hourly[(item_id, _as_datetime(bucket_start))][counter] += count
+
+    daily = defaultdict(lambda: {"likes": 0, "views": 0})
+    for (item_id, bucket_start), counts in hourly.items():
+        day = daily[(item_id, _day(bucket_start))]
+        day["likes"] += counts["likes"]
+        day["views"] += counts["views"]
+
+    for table, buckets in ((_hourly, hourly), (_daily, daily)):
+        stale = delete(table).where(table.c.entity == entity)
+        if start is not None:
+            stale = stale.where(table.c.bucket_start >= start)
+        db.execute(stale)
+        if buckets:
+            db.execute(insert(table), [
+                {"entity": entity, "item_id": item_id, "bucket_start": bucket_start, **counts}
+                for (item_id, bucket_start), counts in buckets.items()
+            ])
+    return len(hourly)
+
+
+def prune(db: Session, entity: str, now: datetime) -> None:
+    hourly_from = _day(now) - timedelta(days=HOURLY_DAYS - 1)
+    db.execute(delete(_hourly).where(_hourly.c.entity == entity, _hourly.c.bucket_start < hourly_from))
+    db.execute(delete(_daily).where(
+        _daily.c.entity == entity,
+        _daily.c.bucket_start < _day(now) - timedelta(days=DAILY_RETENTION_DAYS),
+    ))
+
+
+# ---- 2. scores ----
+
+def scores(db: Session, entity: str, now: datetime) -> dict[int, float]:
+    hourly_from = _day(now) - timedelta(days=HOURLY_DAYS - 1)
+    window_start = _day(now) - timedelta(days=WINDOW_DAYS)
+    decay = math.log(2) / HALF_LIFE_HOURS
+
+    totals = defaultdict(float)
+    buckets = (
+        (_hourly, timedelta(minutes=30), _hourly.c.bucket_start >= hourly_from),
+        (_daily, timedelta(hours=12), (_daily.c.bucket_start >= window_start) & (_daily.c.bucket_start < hourly_from)),
+    )
+    for table, half_bucket, in_range in buckets:
+        rows = db.execute(
+            select(table.c.item_id, table.c.bucket_start, table.c.likes, table.c.views)
+            .where(table.c.entity == entity, in_range)
+        )
+        for item_id, bucket_start, likes, views in rows:
+            # Age of the bucket's midpoint; the current hour counts as fresh
+            age = max((now - _as_datetime(bucket_start) - half_bucket).total_seconds() / 3600, 0.0)
+            totals[item_id] += (LIKE_WEIGHT * likes + VIEW_WEIGHT * views) * math.exp(-decay * age)
+    return totals
+
+
+# ---- 3. rankings ----
+
+def rank(db: Session, entity: str, totals: dict[int, float], now: datetime) -> int:
+    """Replace the entity's rankings; returns how many items were ranked overall."""
+    model, category_column, _ = SOURCES[entity]
+    columns = [model.id] + ([category_column] if category_column is not None else [])
+    query = select(*columns).where(model.id.in_(list(totals)))
+    if entity == "agents":
+        query = query.where(model.visibility != "private")
+
+    by_category = defaultdict(list)
+    for row in db.execute(query) if totals else ():
+        item = (totals[row[0]], row[0])
+        by_category[""].append(item)
+        if category_column is not None and ranking_key(row[1]):
+            by_category[ranking_key(row[1])].append(item)
+
+    rows = []
+    for category, items in by_category.items():
+        items.sort(reverse=True)
+        rows += [
+            {
+                "entity": entity,
+                "category": category[:128],
+                "rank": position,
+                "item_id": item_id,
+                "score": round(score, 6),
+                "computed_at": now,
+            }
+            for position, (score, item_id) in enumerate(items[:TOP_N], start=1)
+        ]
+    db.execute(delete(_ranks).where(_ranks.c.entity == entity))
+    if rows:
+        db.execute(insert(_ranks), rows)
+    # Cached ?sort=trending pages must not outlive the ranking they came from
+    version_service.mark_changed(db, entity)
+    return min(len(by_category[""]), TOP_N)
+
+
+def refresh(db: Session, entity: str, now: Optional[datetime] = None) -> int:
+    now = now or datetime.utcnow()
+    roll_up(db, entity)
+    totals = scores(db, entity, now)
+    ranked = rank(db, entity, totals, now)
+    prune(db, entity, now)
+    db.commit()
+    return ranked
+
+
+def order_by_trending(query: Query, entity: str, category: Optional[str] = None) -> Query:
+    """
+    Order a list query by trending rank, best first. Items outside the
+    ranking (or every item, before the first refresh) follow by likes and
+    recency rather than being dropped.
+
+    `category`'s own ranking goes deeper than the overall top N, but it only
+    exists for exact category values; for any other filter (the list
+    endpoints match substrings) the overall ranking is used.
+    """
+    model, _, _ = SOURCES[entity]
+    rank_row = models.TrendingRank
+    key = ranking_key(category)
+    if key and query.session.scalar(
+        select(rank_row.rank).where(rank_row.entity == entity, rank_row.category == key).limit(1)
+    ) is None:
+        key = ""
+    if entity == "agents":
+        # Private agents are never ranked; keep them out of the unranked tail too
+        query = query.filter(func.coalesce(model.visibility, "public") != "private")
+    return query.outerjoin(
+        rank_row,
+        (rank_row.entity == entity)
+        & (rank_row.category == key)
+        & (rank_row.item_id == model.id),
+    ).order_by(
+        rank_row.rank.asc().nulls_last(),
+        func.coalesce(model.likes, 0).desc(),
+        model.created_at.desc(),
+        model.id.desc(),
+    )
@@ -0,0 +1,81 @@
+# services/version_service.py
+from sqlalchemy import event, update, insert
+from sqlalchemy.orm import Session
+from .. import models
+from ..core import response_cache
+
+# Which table-level version a changed row belongs to. Agent children count as
+# agent changes because they are part of the agent payloads and filters.
+TRACKED = {
+    models.Prompt: "prompts",
+    models.Tool: "tools",
+    models.Agent: "agents",
+    models.AgentTool: "agents",
+    models.AgentPrompt: "agents",
+}
+
+_INFO_KEY = "changed_entities"
+_COMMITTING_KEY = "committing_entities"
+
+
+def _entities_in(objects) -> set[str]:
+    return {TRACKED[type(o)] for o in objects if type(o) in TRACKED}
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session, flush_context):
+    # new/dirty/deleted still hold the pre-flush state here
+    changed = session.info.setdefault(_INFO_KEY, set())
+    changed |= _entities_in(session.new) | _entities_in(session.dirty) | _entities_in(session.deleted)
+
+
+@event.listens_for(Session, "before_commit")
+def _bump_on_commit(session):
+    # Commit flushes *after* this hook, so include still-pending objects too
+    changed = session.info.pop(_INFO_KEY, set())
+    changed |= _entities_in(session.new) | _entities_in(session.dirty) | _entities_in(session.deleted)
+    if changed:
+        bump(session, *changed)
+        session.info[_COMMITTING_KEY] = changed
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_caches(session):
+    # Only once the data is visible, or a concurrent reader could re-cache
+    # the old rows under the new generation
+    changed = session.info.pop(_COMMITTING_KEY, None)
+    if changed:
+        response_cache.bump_generation(*changed)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session):
+    session.info.pop(_INFO_KEY, None)
+    session.info.pop(_COMMITTING_KEY, None)
+
+
+def mark_changed(session: Session, *entities: str) -> None:
+    """Register writes the unit of work can't see (bulk insert/update statements)."""
+    session.info.setdefault(_INFO_KEY, set()).update(entities)
+
+
+def bump(session: Session, *entities: str) -> None:
+    table = models.EntityVersion.__table__
+    conn = session.connection()
+
+    for entity in sorted(set(entities)):
+        result = conn.execute(
+            update(table)
+            .where(table.c.entity == entity)
+            .values(version=table.c.version + 1)
+        )
+        if not result.rowcount:
+            conn.execute(insert(table).values(entity=entity, version=1))
+
+
+def get_version(db: Session, entity: str) -> int:
+    return (
+        db.query(models.EntityVersion.version)
+        .filter(models.EntityVersion.entity == entity)
+        .scalar()
+    ) or 0
@@ -0,0 +1,127 @@
+"""
+Benchmark of ?search= on the catalog list endpoints: the exact ILIKE path
+vs. trigram fuzzy matching (?fuzzy=true).
+
+Seeds a throwaway SQLite database with items whose titles and descriptions
+are drawn from a random vocabulary, builds the trigram postings, then for
+each of /prompts/, /tools/ and /agents/ measures per-request latency and how
+many queries find anything, for correctly spelled and misspelled words.
+The response cache is turned off so every request hits the database.
+
+Usage (from the backend directory):
+    python bench_fuzzy_search.py [--rows 10000] [--queries 200] [--limit 12]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--rows", type=int, default=10000)
+parser.add_argument("--queries", type=int, default=200)
+parser.add_argument("--limit", type=int, default=12)
+parser.add_argument("--words", type=int, default=3000, help="Vocabulary size")
+args = parser.parse_args()
+
+db_file = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{db_file}"
+os.environ["RESPONSE_CACHE_SIZE"] = "0"
+
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+
+from App import migrations, models
+from App.database import SessionLocal, engine
+from App.main import app
+from App.services import fuzzy_service
+
+rng = random.Random(47)
+LETTERS = "abcdefghijklmnopqrstuvwxyz"
+VOCABULARY = sorted({"".join(rng.choices(LETTERS, k=rng.randint(4, 10))) for _ in range(args.words)})
+
+
+def sentence(n: int) -> str:
+    return " ".join(rng.choices(VOCABULARY, k=n))
+
+
+def misspell(word: str) -> str:
+    i = rng.randrange(1, len(word) - 1)
+    kind = rng.choice(("drop", "swap", "replace"))
+    if kind == "drop":
+        return word[:i] + word[i + 1:]
+    if kind == "swap":
+        return word[:i - 1] + word[i] + word[i - 1] + word[i + 1:]
+    return word[:i] + rng.choice(LETTERS) + word[i + 1:]
+
+
+def seed(n: int):
+    migrations.upgrade(engine)
+    db = SessionLocal()
+    user = models.User(full_name="Bench", email="bench@example.com", hashed_password="x", phone="0")
+    db.add(user)
+    db.flush()
+    common = {"created_by": user.id, "creator_name": "Bench"}
+    db.execute(insert(models.Prompt), [
+        {"title": sentence(3), "description": sentence(30), "content": sentence(60), "tags": [sentence(1)],
+         "category": "general", "recommended_model": "gpt-4o-mini", **common}
+        for _ in range(n)
+    ])
+    db.execute(insert(models.Tool), [
+        {"title": sentence(3), "description": sentence(30), "content": sentence(60), "tags": [sentence(1)],
+         "language": "python", "instructions": sentence(10), **common}
+        for _ in range(n)
+    ])
+    db.execute(insert(models.Agent), [
+        {"title": sentence(3), "description": sentence(30), "system_prompt": sentence(30), "instructions": sentence(10),
+         "model": "gpt-4o-mini", "temperature": 0.7, "max_tokens": 2000, "tags": [sentence(1)], "likes": 0,
+         "views": 0, **common}
+        for _ in range(n)
+    ])
+    db.commit()
+
+    started = time.perf_counter()
+    for entity in fuzzy_service.FIELDS:
+        fuzzy_service.rebuild(db, entity)
+    postings = db.query(models.TrigramPosting).count()
+    print(f"  trigram postings: {postings} rows, built in {time.perf_counter() - started:.1f}s")
+    db.close()
+
+
+def run(client, path: str, terms: list[str], fuzzy: bool):
+    timings, found = [], 0
+    for term in terms:
+        url = f"{path}?search={term}&limit={args.limit}" + ("&fuzzy=true" if fuzzy else "")
+        started = time.perf_counter()
+        response = client.get(url)
+        timings.append((time.perf_counter() - started) * 1000)
+        found += bool(response.json()["data"])
+    timings.sort()
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    return statistics.median(timings), p95, found / len(terms)
+
+
+def bench_search():
+    client = TestClient(app)
+    words = rng.choices(VOCABULARY, k=args.queries)
+    typos = [misspell(word) for word in words]
+    print(f"{args.queries} single-word queries per row, limit={args.limit}")
+    print(f"  {'':<32} {'median':>9} {'p95':>9} {'found':>7}")
+    for path in ("/prompts/", "/tools/", "/agents/"):
+        for label, terms, fuzzy in (
+            ("ILIKE, exact word", words, False),
+            ("ILIKE, misspelled", typos, False),
+            ("fuzzy, exact word", words, True),
+            ("fuzzy, misspelled", typos, True),
+        ):
+            median, p95, found = run(client, path, terms, fuzzy)
+            print(f"  GET {path:<9} {label:<18} {median:7.2f}ms {p95:7.2f}ms {found:6.0%}")
+
+
+if __name__ == "__main__":
+    print(f"seeding {args.rows} rows per table into {db_file}")
+    seed(args.rows)
+    bench_search()
+    sys.exit(0)
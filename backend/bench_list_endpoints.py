@@ -0,0 +1,114 @@
+"""
+Throughput benchmark for the catalog list endpoints.
+
+Seeds a throwaway SQLite database, then measures:
+  1. serialization of one list page: Pydantic response_model validation +
+     stdlib json (the old path) vs FastJSONResponse straight from row dicts
+  2. end-to-end requests/sec for /prompts/, /tools/ and /agents/
+
+Usage (from the backend directory):
+    python bench_list_endpoints.py [--rows 2000] [--limit 50] [--seconds 3]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--rows", type=int, default=2000)
+parser.add_argument("--limit", type=int, default=50)
+parser.add_argument("--seconds", type=float, default=3.0)
+args = parser.parse_args()
+
+db_file = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{db_file}"
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.testclient import TestClient
+
+from App import migrations, models, schemas
+from App.core import responses
+from App.database import SessionLocal, engine
+from App.main import app
+from App.services import catalog_service
+
+
+def seed(n: int):
+    migrations.upgrade(engine)
+    db = SessionLocal()
+    user = models.User(full_name="Bench", email="bench@example.com", hashed_password="x", phone="0")
+    db.add(user)
+    db.flush()
+
+    body = "lorem ipsum dolor sit amet " * 200
+    for i in range(n):
+        db.add(models.Prompt(
+            title=f"Prompt {i}", description=body, content=body, tags=["bench", f"t{i % 10}"],
+            category="general", recommended_model="gpt-4o-mini", created_by=user.id, creator_name="Bench",
+        ))
+        db.add(models.Tool(
+            title=f"Tool {i}", description=body, content=body, tags=["bench"], language="python",
+            instructions=body, created_by=user.id, creator_name="Bench",
+        ))
+        db.add(models.Agent(
+            title=f"Agent {i}", description=body, system_prompt=body, instructions=body, model="gpt-4o-mini",
+            temperature=0.7, max_tokens=2000, tags=["bench"], likes=0, views=0, created_by=user.id,
+            creator_name="Bench",
+        ))
+    db.commit()
+    db.close()
+
+
+def rate(fn, seconds: float) -> float:
+    count = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        fn()
+        count += 1
+    return count / seconds
+
+
+def bench_serialization():
+    db = SessionLocal()
+    rows = (
+        catalog_service.card_query(db, models.Prompt)
+        .order_by(models.Prompt.id.desc())
+        .limit(args.limit)
+        .all()
+    )
+    payload = {"data": catalog_service.to_cards(rows), "total_pages": 1}
+    db.close()
+
+    def validated():
+        model = schemas.PromptCardListResponse.model_validate(payload)
+        json.dumps(jsonable_encoder(model)).encode("utf-8")
+
+    def fast():
+        responses.FastJSONResponse(payload)
+
+    print(f"serialization, {args.limit} prompt cards per page")
+    slow_rate = rate(validated, args.seconds)
+    fast_rate = rate(fast, args.seconds)
+    print(f"  pydantic + json      {slow_rate:10.0f} pages/s")
+    print(f"  FastJSONResponse     {fast_rate:10.0f} pages/s  ({fast_rate / slow_rate:.1f}x)")
+    print(f"  encoder: {'orjson' if responses.orjson else 'stdlib json'}")
+
+
+def bench_endpoints():
+    client = TestClient(app)
+    print(f"end-to-end, limit={args.limit}")
+    for path in ("/prompts/", "/tools/", "/agents/"):
+        url = f"{path}?limit={args.limit}"
+        size = len(client.get(url).content)
+        per_sec = rate(lambda: client.get(url), args.seconds)
+        print(f"  GET {path:<10} {per_sec:8.0f} req/s  {size:>8} bytes/page")
+
+
+if __name__ == "__main__":
+    print(f"seeding {args.rows} rows per table into {db_file}")
+    seed(args.rows)
+    bench_serialization()
+    bench_endpoints()
+    sys.exit(0)
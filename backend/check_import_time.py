@@ -0,0 +1,88 @@
+"""
+Import-time budget check for the API.
+
+Runs `python -X importtime -c "import App.main"` in a fresh interpreter and
+fails (exit 1) if:
+  - importing App.main takes longer than the budget (best of --runs), or
+  - any of the lazily loaded heavy stacks (ADK, google-genai, LiteLLM,
+    Firebase) got imported at module load again.
+
+Usage (from the backend directory):
+    python check_import_time.py [--budget-ms 1500] [--runs 3]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+ENTRY_MODULE = "App.main"
+
+# These must only be imported on first use, never while booting a worker
+DEFERRED_MODULES = ("google.adk", "google.genai", "litellm", "firebase_admin", "numpy")
+
+
+def measure() -> tuple[float, set[str]]:
+    env = dict(os.environ)
+    # Never touch the real database while measuring
+    env["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'importtime.db')}"
+
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {ENTRY_MODULE}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr)
+        raise SystemExit(f"importing {ENTRY_MODULE} failed")
+
+    total_us = None
+    imported = set()
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        if not cumulative.isdigit():
+            continue  # header row
+        imported.add(name)
+        if name == ENTRY_MODULE:
+            total_us = int(cumulative)
+
+    if total_us is None:
+        raise SystemExit(f"no importtime entry for {ENTRY_MODULE}")
+    return total_us / 1000, imported
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--budget-ms", type=float, default=1500)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    results = [measure() for _ in range(args.runs)]
+    best_ms = min(ms for ms, _ in results)
+    imported = set().union(*(mods for _, mods in results))
+
+    failures = []
+    if best_ms > args.budget_ms:
+        failures.append(f"import {ENTRY_MODULE} took {best_ms:.0f} ms (budget {args.budget_ms:.0f} ms)")
+
+    leaked = sorted(
+        prefix for prefix in DEFERRED_MODULES
+        if any(m == prefix or m.startswith(prefix + ".") for m in imported)
+    )
+    if leaked:
+        failures.append(f"deferred modules imported at startup: {', '.join(leaked)}")
+
+    print(f"import {ENTRY_MODULE}: {best_ms:.0f} ms (best of {args.runs}, budget {args.budget_ms:.0f} ms)")
+    if failures:
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()